@@ -38,7 +38,8 @@ __docformat__ = 'epytext en'
 ## Imports
 ######################################################################
 
-import types, re, os.path, pickle
+import types, re, os.path, pickle, sys
+from array import array
 from epydoc import log
 import epydoc
 import __builtin__
@@ -82,6 +83,19 @@ class DottedName:
     _ok_identifiers = set()
     """A cache of identifier strings that have been checked against
     _IDENTIFIER_RE and found to be acceptable."""
+
+    _interned = {}
+    """A dictionary mapping identifier tuples, and the strings that
+    were passed to L{intern()}, to the shared C{DottedName}s that
+    L{intern()} returns for them."""
+
+    _hash = None
+    """The hash value of this dotted name, or C{None} if it has not
+    been computed yet."""
+
+    _str = None
+    """The string form of this dotted name, or C{None} if it has not
+    been computed yet."""
     
     def __init__(self, *pieces, **options):
         """
@@ -128,6 +142,37 @@ class DottedName:
                                 'DottedName or str' % (piece,))
         self._identifiers = tuple(self._identifiers)
 
+    def intern(*pieces, **options):
+        """
+        Return a C{DottedName} for the given sequence of pieces, which
+        are interpreted as for the L{DottedName} constructor.  Only
+        one C{DottedName} is created for each identifier sequence:
+        later calls with the same pieces return the same object.  A
+        string that has been interned before is not split or checked
+        again.  Since C{DottedName}s are never modified, the shared
+        object can be used anywhere that a new C{DottedName} could
+        be; and equal interned names can be compared by identity.
+
+            >>> DottedName.intern('a.b') is DottedName.intern('a', 'b')
+            True
+        """
+        if len(pieces) == 1:
+            key = pieces[0]
+            if isinstance(key, DottedName):
+                key = key._identifiers
+            name = DottedName._interned.get(key)
+            if name is not None: return name
+        name = DottedName(*pieces, **options)
+        name = DottedName._interned.setdefault(name._identifiers, name)
+        if len(pieces) == 1 and isinstance(pieces[0], basestring):
+            DottedName._interned[pieces[0]] = name
+        return name
+    intern = staticmethod(intern)
+
+    def __getstate__(self):
+        # Don't pickle the cached hash value & string.
+        return {'_identifiers': self._identifiers}
+
     def __repr__(self):
         idents = [`ident` for ident in self._identifiers]
         return 'DottedName(' + ', '.join(idents) + ')'
@@ -140,7 +185,9 @@ class DottedName:
             >>> print DottedName('epydoc', 'api_doc', DottedName')
             epydoc.apidoc.DottedName
         """
-        return '.'.join(self._identifiers)
+        if self._str is None:
+            self._str = '.'.join(self._identifiers)
+        return self._str
 
     def __add__(self, other):
         """
@@ -148,9 +195,9 @@ class DottedName:
         by adding C{other}'s identifier sequence to C{self}'s.
         """
         if isinstance(other, (basestring, DottedName)):
-            return DottedName(self, other)
+            return DottedName.intern(self, other)
         else:
-            return DottedName(self, *other)
+            return DottedName.intern(self, *other)
 
     def __radd__(self, other):
         """
@@ -158,9 +205,9 @@ class DottedName:
         by adding C{self}'s identifier sequence to C{other}'s.
         """
         if isinstance(other, (basestring, DottedName)):
-            return DottedName(other, self)
+            return DottedName.intern(other, self)
         else:
-            return DottedName(*(list(other)+[self]))
+            return DottedName.intern(*(list(other)+[self]))
 
     def __getitem__(self, i):
         """
@@ -171,13 +218,15 @@ class DottedName:
         """
         if isinstance(i, types.SliceType):
             pieces = self._identifiers[i.start:i.stop]
-            if pieces: return DottedName(pieces)
+            if pieces: return DottedName.intern(pieces)
             else: return []
         else:
             return self._identifiers[i]
 
     def __hash__(self):
-        return hash(self._identifiers)
+        if self._hash is None:
+            self._hash = hash(self._identifiers)
+        return self._hash
 
     def __cmp__(self, other):
         """
@@ -186,6 +235,8 @@ class DottedName:
         Ordering between dotted names is lexicographic, in order of
         identifier from left to right.
         """
+        if self is other:
+            return 0
         if not isinstance(other, DottedName):
             return -1
         return cmp(self._identifiers, other._identifiers)
@@ -206,7 +257,7 @@ class DottedName:
         if len(self._identifiers) == 1:
             return None
         else:
-            return DottedName(*self._identifiers[:-1])
+            return DottedName.intern(self._identifiers[:-1])
 
     def dominates(self, name, strict=False):
         """
@@ -222,9 +273,13 @@ class DottedName:
 
         if (len_self > len_name) or (strict and len_self == len_name):
             return False
+        if self is name:
+            return True
         # The following is redundant (the first clause is implied by
-        # the second), but is done as an optimization.
-        return ((self._identifiers[0] == name._identifiers[0]) and
+        # the second), but is done as an optimization: names that
+        # share a prefix usually differ in their last identifiers, so
+        # compare those before building a slice of name.
+        return ((self._identifiers[-1] == name._identifiers[len_self-1]) and
                 self._identifiers == name._identifiers[:len_self])
 
     def contextualize(self, context):
@@ -286,6 +341,33 @@ UNKNOWN = _Sentinel('UNKNOWN')
 information about an object is unknown.  This is used as the
 default value for all instance variables."""
 
+######################################################################
+# Docstring Attributes
+######################################################################
+
+class _DocstringAttribute(object):
+    """
+    A descriptor for an C{APIDoc} attribute whose value is extracted
+    from the docstring.  If the attribute is read before it has been
+    set, and the parsing of the C{APIDoc}'s docstring was deferred
+    (see L{epydoc.docstringparser.defer_docstring_parsing()}), then
+    the docstring is parsed first.  Otherwise, the attribute's default
+    value is returned.
+
+    Since this is a non-data descriptor, it is only consulted when the
+    attribute is missing from the instance dictionary; so reading an
+    attribute that has been set is no slower than before.
+    """
+    def __init__(self, name, default):
+        self.name = name
+        self.default = default
+
+    def __get__(self, api_doc, cls=None):
+        if api_doc is not None:
+            api_doc._parse_deferred_docstring()
+            return api_doc.__dict__.get(self.name, self.default)
+        return self.default
+
 ######################################################################
 # API Documentation Objects: Abstract Base Classes
 ######################################################################
@@ -340,28 +422,29 @@ class APIDoc(object):
     #} end of "docstrings" group
 
     #{ Information Extracted from Docstrings
-    descr = UNKNOWN
+    descr = _DocstringAttribute('descr', UNKNOWN)
     """@ivar: A description of the documented item, extracted from its
        docstring.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
     
-    summary = UNKNOWN
+    summary = _DocstringAttribute('summary', UNKNOWN)
     """@ivar: A summary description of the documented item, extracted from
        its docstring.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
     
-    other_docs = UNKNOWN
+    other_docs = _DocstringAttribute('other_docs', UNKNOWN)
     """@ivar: A flag indicating if the entire L{docstring} body (except tags
        if any) is entirely included in the L{summary}.
        @type: C{bool}"""
     
-    metadata = UNKNOWN
+    metadata = _DocstringAttribute('metadata', UNKNOWN)
     """@ivar: Metadata about the documented item, extracted from fields in
        its docstring.  I{Currently} this is encoded as a list of tuples
        C{(field, arg, descr)}.  But that may change.
        @type: C{(str, str, L{ParsedDocstring<markup.ParsedDocstring>})}"""
     
-    extra_docstring_fields = UNKNOWN
+    extra_docstring_fields = _DocstringAttribute('extra_docstring_fields',
+                                                 UNKNOWN)
     """@ivar: A list of new docstring fields tags that are defined by the
        documented item's docstring.  These new field tags can be used by
        this item or by any item it contains.
@@ -426,6 +509,20 @@ class APIDoc(object):
         return pp_apidoc(self, doublespace, depth, exclude, include)
     __str__ = pp
 
+    def _parse_deferred_docstring(self):
+        """
+        If the parsing of this C{APIDoc}'s docstring was deferred (see
+        L{epydoc.docstringparser.defer_docstring_parsing()}), then
+        parse it now.
+        """
+        deferred = self.__dict__.pop('_deferred_docstring', None)
+        if deferred is not None:
+            from epydoc.docstringparser import parse_docstring
+            docindex, suppress_warnings = deferred
+            if suppress_warnings: suppress_warnings = [self]
+            else: suppress_warnings = []
+            parse_docstring(self, docindex, suppress_warnings)
+
     def specialize_to(self, cls):
         """
         Change C{self}'s class to C{cls}.  C{cls} must be a subclass
@@ -525,6 +622,39 @@ class APIDoc(object):
         # Return self.
         return self
 
+    def compact(self):
+        """
+        Reduce the memory used by this C{APIDoc}'s instance
+        dictionary.  Any attribute whose value is L{UNKNOWN}, and
+        whose default value is also C{UNKNOWN}, is removed from the
+        dictionary (reading it will still return C{UNKNOWN}); and the
+        dictionary's hash table is rebuilt at the smallest size that
+        can hold the remaining attributes.  (A dictionary never
+        shrinks as attributes are added, and the way it grows can
+        leave it with a table that is several times larger than it
+        needs to be.)
+
+        The dictionary is modified in place, so this C{APIDoc} keeps
+        its hash value, and any C{APIDoc}s that it has been merged
+        with continue to share its dictionary.  Attributes can still
+        be set after an C{APIDoc} has been compacted.
+        """
+        cls = self.__class__
+        items = [(attr, val) for (attr, val) in self.__dict__.items()
+                 if (val is not UNKNOWN or
+                     getattr(cls, attr, None) is not UNKNOWN)]
+        # A dictionary that is built by inserting one item at a time
+        # and one that is built by copying another dictionary can
+        # end up with different table sizes; use whichever is smaller.
+        inserted = dict(items)
+        presized = sys.getsizeof(inserted.copy()) < sys.getsizeof(inserted)
+        d = self.__dict__
+        d.clear()
+        if presized:
+            d.update(inserted)
+        else:
+            for (attr, val) in items: d[attr] = val
+
     def apidoc_links(self, **filters):
         """
         Return a list of all C{APIDoc}s that are directly linked from
@@ -608,7 +738,7 @@ class VariableDoc(APIDoc):
     #}
 
     #{ Information Extracted from Docstrings
-    type_descr = UNKNOWN 
+    type_descr = _DocstringAttribute('type_descr', UNKNOWN)
     """@ivar: A description of the variable's expected type, extracted from
        its docstring.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
@@ -841,6 +971,10 @@ class ValueDoc(APIDoc):
             # Construct the dictionary; leave out 'pyval'.
             self.__pickle_state = self.__dict__.copy()
             self.__pickle_state['pyval'] = UNKNOWN
+            # Don't pickle the caches used by select_variables() and
+            # by the docstring parser.
+            self.__pickle_state.pop('_variable_index', None)
+            self.__pickle_state.pop('_docfield_table', None)
 
         if not isinstance(self, GenericValueDoc):
             assert self.__pickle_state != {}
@@ -961,6 +1095,22 @@ class NamespaceDoc(ValueDoc):
        @type: C{dict} from C{str} to C{list} of L{VariableDoc}"""
     #} end of group "information about variables"
 
+    _variable_index = None
+    """The index used by L{select_variables()} to look up the results
+    of earlier calls.  It is a tuple C{(sorted_variables, length,
+    variable_groups, selections)}, where C{sorted_variables} and
+    C{variable_groups} are the lists that the results were selected
+    from; C{length} is the length of C{sorted_variables} at that time;
+    and C{selections} maps the arguments of each call to the list of
+    variables that it selected.  The index is rebuilt if
+    L{sorted_variables} or L{variable_groups} is replaced, or if a
+    variable is added to L{sorted_variables}."""
+
+    _docfield_table = None
+    """The table of docstring fields that can be used by this namespace
+    and by the objects it contains, which is cached by the docstring
+    parser.  See L{epydoc.docstringparser.user_docfields()}."""
+
     def __init__(self, **kwargs):
         kwargs.setdefault('variables', {})
         APIDoc.__init__(self, **kwargs)
@@ -1036,6 +1186,42 @@ class NamespaceDoc(ValueDoc):
         elts = [(v.name, v) for v in self.sorted_variables]
         self._unused_groups = dict([(n,set(i)) for (n,i) in self.group_specs])
         self.variable_groups = self._init_grouping(elts)
+        self.invalidate_variable_index()
+
+    def invalidate_variable_index(self):
+        """
+        Discard the variable selections that have been saved by
+        L{select_variables()}.  This must be called if an attribute
+        of one of this namespace's variables (such as C{is_public} or
+        C{value}) is modified after C{select_variables()} has been
+        used.  (Replacing L{sorted_variables} or L{variable_groups},
+        or adding variables to C{sorted_variables}, is detected
+        automatically.)
+        """
+        self.__dict__.pop('_variable_index', None)
+
+    def _indexed_variables(self, key, select, *args):
+        """
+        Return a new list containing the variables that are selected
+        by C{select(*args)}.  The result of C{select} is saved in
+        L{_variable_index}, under the key C{key}, so that it is only
+        computed once for each key.
+        """
+        if (self.sorted_variables is UNKNOWN or 
+            self.variable_groups is UNKNOWN):
+            raise ValueError('sorted_variables and variable_groups '
+                             'must be initialized first.')
+        index = self._variable_index
+        if (index is None or index[0] is not self.sorted_variables or
+            index[1] != len(self.sorted_variables) or
+            index[2] is not self.variable_groups):
+            index = self._variable_index = (
+                self.sorted_variables, len(self.sorted_variables),
+                self.variable_groups, {})
+        selected = index[3].get(key)
+        if selected is None:
+            selected = index[3][key] = select(*args)
+        return list(selected)
 
     def group_names(self):
         """
@@ -1199,12 +1385,21 @@ class ModuleDoc(NamespaceDoc):
             deserving (not deserving) a detailed informative box.
             If C{None}, don't care.
         @type detailed: C{bool}
+
+        The result of each combination of arguments is only computed
+        once; see L{invalidate_variable_index()}.
+        """
+        return self._indexed_variables(
+            (group, value_type, public, imported, detailed),
+            self._select_variables,
+            group, value_type, public, imported, detailed)
+
+    def _select_variables(self, group, value_type, public, imported,
+                          detailed):
+        """
+        Return the variables selected by L{select_variables()},
+        without using the index.
         """
-        if (self.sorted_variables is UNKNOWN or 
-            self.variable_groups is UNKNOWN):
-            raise ValueError('sorted_variables and variable_groups '
-                             'must be initialized first.')
-        
         if group is None: var_list = self.sorted_variables
         else:
             var_list = self.variable_groups.get(group, self.sorted_variables)
@@ -1417,12 +1612,21 @@ class ClassDoc(NamespaceDoc):
             deserving (not deserving) a detailed informative box.
             If C{None}, don't care.
         @type detailed: C{bool}
+
+        The result of each combination of arguments is only computed
+        once; see L{invalidate_variable_index()}.
+        """
+        return self._indexed_variables(
+            (group, value_type, inherited, public, imported, detailed),
+            self._select_variables,
+            group, value_type, inherited, public, imported, detailed)
+
+    def _select_variables(self, group, value_type, inherited, public,
+                          imported, detailed):
+        """
+        Return the variables selected by L{select_variables()},
+        without using the index.
         """
-        if (self.sorted_variables is UNKNOWN or 
-            self.variable_groups is UNKNOWN):
-            raise ValueError('sorted_variables and variable_groups '
-                             'must be initialized first.')
-        
         if group is None: var_list = self.sorted_variables
         else: var_list = self.variable_groups[group]
 
@@ -1534,7 +1738,7 @@ class RoutineDoc(ValueDoc):
     #} end of "decorators" group
 
     #{ Information Extracted from Docstrings
-    arg_descrs = UNKNOWN
+    arg_descrs = _DocstringAttribute('arg_descrs', UNKNOWN)
     """@ivar: A list of descriptions of the routine's
        arguments.  Each element of this list is a tuple C{(args,
        descr)}, where C{args} is a list of argument names; and
@@ -1542,20 +1746,20 @@ class RoutineDoc(ValueDoc):
        <epydoc.markup.ParsedDocstring>} describing the argument(s)
        specified by C{arg}.
        @type: C{list}"""
-    arg_types = UNKNOWN
+    arg_types = _DocstringAttribute('arg_types', UNKNOWN)
     """@ivar: Descriptions of the expected types for the
        routine's arguments, encoded as a dictionary mapping from
        argument names to type descriptions.
        @type: C{dict} from C{string} to L{ParsedDocstring
        <epydoc.markup.ParsedDocstring>}"""
-    return_descr = UNKNOWN
+    return_descr = _DocstringAttribute('return_descr', UNKNOWN)
     """@ivar: A description of the value returned by this routine.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
-    return_type = UNKNOWN
+    return_type = _DocstringAttribute('return_type', UNKNOWN)
     """@ivar: A description of expected type for the value
        returned by this routine.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
-    exception_descrs = UNKNOWN
+    exception_descrs = _DocstringAttribute('exception_descrs', UNKNOWN)
     """@ivar: A list of descriptions of exceptions
        that the routine might raise.  Each element of this list is a
        tuple C{(exc, descr)}, where C{exc} is a string contianing the
@@ -1639,7 +1843,7 @@ class PropertyDoc(ValueDoc):
        @type: L{RoutineDoc}"""
     #}
     #{ Information Extracted from Docstrings
-    type_descr = UNKNOWN
+    type_descr = _DocstringAttribute('type_descr', UNKNOWN)
     """@ivar: A description of the property's expected type, extracted
        from its docstring.
        @type: L{ParsedDocstring<epydoc.markup.ParsedDocstring>}"""
@@ -1753,18 +1957,16 @@ class DocIndex:
            @type: C{dict} from C{str} to L{ClassDoc} or C{list}"""
 
         self.callers = None
-        """A dictionary mapping from C{RoutineDoc}s in this index
-           to lists of C{RoutineDoc}s for the routine's callers.
-           This dictionary is initialized by calling
-           L{read_profiling_info()}.
-           @type: C{list} of L{RoutineDoc}"""
+        """A mapping from C{RoutineDoc}s in this index to lists of
+           C{RoutineDoc}s for the routine's callers.  This mapping is
+           initialized by calling L{read_profiling_info()}.
+           @type: L{AdjacencyMap}"""
         
         self.callees = None
-        """A dictionary mapping from C{RoutineDoc}s in this index
-           to lists of C{RoutineDoc}s for the routine's callees.
-           This dictionary is initialized by calling
-           L{read_profiling_info()}.
-           @type: C{list} of L{RoutineDoc}"""
+        """A mapping from C{RoutineDoc}s in this index to lists of
+           C{RoutineDoc}s for the routine's callees.  This mapping is
+           initialized by calling L{read_profiling_info()}.
+           @type: L{AdjacencyMap}"""
 
         self._funcid_to_doc = {}
         """A mapping from C{profile} function ids to corresponding
@@ -1772,12 +1974,39 @@ class DocIndex:
            C{(filename, lineno, funcname)}.  This is used to update
            the L{callers} and L{callees} variables."""
 
+        self._funcid_index = None
+        """A cache for L{_update_funcid_to_doc()}, mapping the
+           function id of every reachable C{RoutineDoc} to that
+           C{RoutineDoc}.  It is built the first time that profiling
+           information is read."""
+
         self._container_cache = {}
         """A cache for the L{container()} method, to increase speed."""
 
         self._get_cache = {}
         """A cache for the L{get_vardoc()} and L{get_valdoc()} methods,
-        to increase speed."""
+        to increase speed.  It maps identifier tuples to
+        C{(VariableDoc, ValueDoc)} pairs."""
+
+        self._root_trie = None
+        """A trie containing the canonical names of the C{ValueDoc}s in
+        L{root}, used by L{_get()} to find the root C{ValueDoc}s whose
+        names are prefixes of a given name.  Each node is a pair
+        C{(root_valdocs, children)}, where C{root_valdocs} lists the
+        root C{ValueDoc}s whose name ends at that node (in the order
+        that they appear in L{root}), and C{children} is a dictionary
+        mapping identifiers to child nodes.  The trie is built by
+        L{_build_root_trie()} when it is first needed, and rebuilt if
+        the length of L{root} changes."""
+
+        self._root_trie_size = None
+        """The length of L{root} when L{_root_trie} was built."""
+
+        self._reachable_cache = {}
+        """A cache for the L{reachable_valdocs()} method, mapping each
+        set of filters to the set of C{ValueDoc}s that it reaches.
+        This cache must be cleared (with L{invalidate_reachable_valdocs()})
+        whenever the links between the C{APIDoc}s are modified."""
 
     #////////////////////////////////////////////////////////////
     # Lookup methods
@@ -1812,33 +2041,61 @@ class DocIndex:
         """
         # Convert name to a DottedName, if necessary.
         if not isinstance(name, DottedName):
-            name = DottedName(name)
+            name = DottedName.intern(name)
+        return self._get_identifiers(name._identifiers)
 
+    def _get_identifiers(self, identifiers):
+        """
+        Return the C{(VariableDoc, ValueDoc)} pair for the name whose
+        identifiers are given by the tuple C{identifiers}.  Either or
+        both elements of the pair will be C{None} if they're not
+        found.
+        """
         # Check if the result is cached.
-        val = self._get_cache.get(name)
+        val = self._get_cache.get(identifiers)
         if val is not None: return val
 
-        # Look for an element in the root set whose name is a prefix
-        # of `name`.  If we can't find one, then return None.
-        for root_valdoc in self.root:
-            if root_valdoc.canonical_name.dominates(name):
+        # Look for the elements in the root set whose name is a prefix
+        # of `name`, shortest first.  (Their order matches the order
+        # of the root set, which is sorted by name length.)
+        if self._root_trie is None or self._root_trie_size != len(self.root):
+            self._build_root_trie()
+        node = self._root_trie
+        for depth in range(len(identifiers)+1):
+            for root_valdoc in node[0]:
                 # Starting at the root valdoc, walk down the variable/
                 # submodule chain until we find the requested item.
                 var_doc = None
                 val_doc = root_valdoc
-                for identifier in name[len(root_valdoc.canonical_name):]:
+                for identifier in identifiers[depth:]:
                     if val_doc is None: break
                     var_doc, val_doc = self._get_from(val_doc, identifier)
                 else:
                     # If we found it, then return.
                     if var_doc is not None or val_doc is not None:
-                        self._get_cache[name] = (var_doc, val_doc)
+                        self._get_cache[identifiers] = (var_doc, val_doc)
                         return var_doc, val_doc
+            if depth == len(identifiers): break
+            node = node[1].get(identifiers[depth])
+            if node is None: break
 
         # We didn't find it.
-        self._get_cache[name] = (None, None)
+        self._get_cache[identifiers] = (None, None)
         return None, None
 
+    def _build_root_trie(self):
+        """
+        Build L{_root_trie} from the canonical names of the
+        C{ValueDoc}s in L{root}.
+        """
+        self._root_trie = ([], {})
+        for root_valdoc in self.root:
+            node = self._root_trie
+            for identifier in root_valdoc.canonical_name:
+                node = node[1].setdefault(identifier, ([], {}))
+            node[0].append(root_valdoc)
+        self._root_trie_size = len(self.root)
+
     def _get_from(self, val_doc, identifier):
         if isinstance(val_doc, NamespaceDoc):
             child_var = val_doc.variables.get(identifier)
@@ -1882,30 +2139,30 @@ class DocIndex:
         if isinstance(name, basestring):
             name = re.sub(r'\(.*\)$', '', name.strip())
             if re.match('^([a-zA-Z_]\w*)(\.[a-zA-Z_]\w*)*$', name):
-                name = DottedName(name)
+                name = DottedName.intern(name)
             else:
                 if not_found_exception: raise ValueError(name)
                 return None
         elif not isinstance(name, DottedName):
             raise TypeError("'name' should be a string or DottedName")
         
-        if context is None or context.canonical_name is None:
-            container_name = []
+        if (context is None or
+            not isinstance(context.canonical_name, DottedName)):
+            container_name = ()
         else:
-            container_name = context.canonical_name
+            container_name = context.canonical_name._identifiers
 
         # Check for the name in all containing namespaces, starting
         # with the closest one.
         for i in range(len(container_name), -1, -1):
-            relative_name = container_name[:i]+name
+            var_doc, val_doc = self._get_identifiers(
+                container_name[:i]+name._identifiers)
             # Is `name` the absolute name of a documented value?
             # (excepting GenericValueDoc values.)
-            val_doc = self.get_valdoc(relative_name)
             if (val_doc is not None and
                 not isinstance(val_doc, GenericValueDoc)):
                 return val_doc
             # Is `name` the absolute name of a documented variable?
-            var_doc = self.get_vardoc(relative_name)
             if var_doc is not None: return var_doc
 
         # If the name begins with 'self', then try stripping that off
@@ -1988,6 +2245,10 @@ class DocIndex:
         """
         Return a list of all C{ValueDoc}s that can be reached,
         directly or indirectly from this C{DocIndex}'s root set.
+
+        The result for each set of filters is cached, so if the links
+        between the C{APIDoc}s are modified, then
+        L{invalidate_reachable_valdocs()} must be called.
         
         @param filters: A set of filters that can be used to prevent
             C{reachable_valdocs} from following specific link types
@@ -1995,7 +2256,25 @@ class DocIndex:
             root set.  See C{APIDoc.apidoc_links} for a more complete
             description.
         """
-        return reachable_valdocs(self.root, **filters)
+        key = tuple(sorted([(name, bool(val))
+                            for (name, val) in filters.items()]))
+        val_set = self._reachable_cache.get(key)
+        if val_set is None:
+            val_set = reachable_valdocs(self.root, **filters)
+            self._reachable_cache[key] = val_set
+        # Return a copy, since the caller may modify it.
+        return set(val_set)
+
+    def invalidate_reachable_valdocs(self):
+        """
+        Discard the results cached by L{reachable_valdocs()}.  This
+        should be called whenever the links between the C{APIDoc}s
+        reachable from this index are modified; for example, when
+        imported variables are linked to their values, when
+        canonical names are assigned, or when docstring fields add
+        or remove variables.
+        """
+        self._reachable_cache.clear()
 
     def container(self, api_doc):
         """
@@ -2030,27 +2309,44 @@ class DocIndex:
     def read_profiling_info(self, profile_stats):
         """
         Initialize the L{callers} and L{callees} variables, given a
-        C{Stat} object from the C{pstats} module.
+        C{Stat} object from the C{pstats} module.  If profiling
+        information has already been read, then the calls recorded by
+        C{profile_stats} are added to it.
         
         @warning: This method uses undocumented data structures inside
             of C{profile_stats}.
         """
-        if self.callers is None: self.callers = {}
-        if self.callees is None: self.callees = {}
-        
         # The Stat object encodes functions using `funcid`s, or
         # tuples of (filename, lineno, funcname).  Create a mapping
         # from these `funcid`s to `RoutineDoc`s.
         self._update_funcid_to_doc(profile_stats)
-        
+
+        # Number the routines, and collect the (caller, callee) pairs.
+        routines = []
+        routine_nums = {}
+        def routine_num(routine):
+            num = routine_nums.get(routine)
+            if num is None:
+                num = routine_nums[routine] = len(routines)
+                routines.append(routine)
+            return num
+        edges = []
+        if self.callees is not None:
+            for (caller, callee) in self.callees.edges():
+                edges.append( (routine_num(caller), routine_num(callee)) )
+        funcid_to_doc = self._funcid_to_doc
         for callee, (cc, nc, tt, ct, callers) in profile_stats.stats.items():
-            callee = self._funcid_to_doc.get(callee)
+            callee = funcid_to_doc.get(callee)
             if callee is None: continue
+            callee_num = routine_num(callee)
             for caller in callers:
-                caller = self._funcid_to_doc.get(caller)
+                caller = funcid_to_doc.get(caller)
                 if caller is None: continue
-                self.callers.setdefault(callee, []).append(caller)
-                self.callees.setdefault(caller, []).append(callee)
+                edges.append( (routine_num(caller), callee_num) )
+
+        self.callees = AdjacencyMap(routines, edges)
+        self.callers = AdjacencyMap(routines, [(callee, caller) for
+                                               (caller, callee) in edges])
 
     def _update_funcid_to_doc(self, profile_stats):
         """
@@ -2059,20 +2355,155 @@ class DocIndex:
         C{(filename, lineno, funcname)}.
         """
         # Maps (filename, lineno, funcname) -> RoutineDoc
+        if self._funcid_index is None:
+            self._funcid_index = self._build_funcid_index()
+        stats = profile_stats.stats
+        if len(self._funcid_index) < len(stats):
+            for funcid, val_doc in self._funcid_index.items():
+                if funcid in stats:
+                    self._funcid_to_doc[funcid] = val_doc
+        else:
+            for funcid in stats:
+                val_doc = self._funcid_index.get(funcid)
+                if val_doc is not None:
+                    self._funcid_to_doc[funcid] = val_doc
+
+    def _build_funcid_index(self):
+        """
+        Return a dictionary mapping the function id of each reachable
+        C{RoutineDoc} to that C{RoutineDoc}.  Each module's filename
+        is only normalized once.
+        """
+        funcid_index = {}
+        module_filenames = {}
         for val_doc in self.reachable_valdocs():
             # We only care about routines.
             if not isinstance(val_doc, RoutineDoc): continue
             # Get the filename from the defining module.
             module = val_doc.defining_module
             if module is UNKNOWN or module.filename is UNKNOWN: continue
-            # Normalize the filename.
-            filename = os.path.abspath(module.filename)
-            try: filename = py_src_filename(filename)
-            except: pass
-            # Look up the stat_func_id
+            filename = module_filenames.get(module.filename)
+            if filename is None:
+                # Normalize the filename.
+                filename = os.path.abspath(module.filename)
+                try: filename = py_src_filename(filename)
+                except: pass
+                module_filenames[module.filename] = filename
             funcid = (filename, val_doc.lineno, val_doc.canonical_name[-1])
-            if funcid in profile_stats.stats:
-                self._funcid_to_doc[funcid] = val_doc
+            funcid_index[funcid] = val_doc
+        return funcid_index
+
+######################################################################
+## Call Graph Adjacency Maps
+######################################################################
+
+class AdjacencyMap:
+    """
+    A read-only mapping from C{RoutineDoc}s to lists of C{RoutineDoc}s,
+    which is used for the L{DocIndex.callers} and L{DocIndex.callees}
+    call graphs.  Rather than storing a list for each routine, the
+    map stores its edges in compact adjacency arrays: the edges are
+    sorted by their source, and each source's targets are stored as
+    a contiguous run of routine numbers in a single array.
+
+        >>> f, g, h = [RoutineDoc(canonical_name=n) for n in 'fgh']
+        >>> callees = AdjacencyMap([f, g, h], [(0, 1), (0, 2), (1, 2),
+        ...                                    (0, 1)])
+        >>> callees[f]
+        [<RoutineDoc g>, <RoutineDoc h>]
+        >>> h in callees, callees.get(h, ())
+        (False, ())
+    """
+    def __init__(self, routines, edges):
+        """
+        Construct a new adjacency map.
+
+        @param routines: The routines connected by the map.
+        @type routines: C{list} of L{RoutineDoc}
+        @param edges: The map's edges, as C{(source, target)} pairs of
+            indices into C{routines}.  Duplicate edges are ignored.
+        """
+        self._routines = routines
+        """The routines connected by this map.  Routines are
+           identified by their index in this list."""
+
+        self._sources = array('i')
+        """The routines that have at least one edge, in order."""
+
+        self._offsets = array('i')
+        """The start of each source's run of targets in L{_targets};
+           the last element is the length of L{_targets}."""
+
+        self._targets = array('i')
+        """The targets of each source's edges, stored contiguously."""
+
+        self._source_index = None
+        """A dictionary mapping each source routine to its index in
+           L{_sources}.  It is built when it is first needed, and is
+           not pickled."""
+
+        # Pack each edge into a single integer, so the edges can be
+        # deduplicated and sorted cheaply.
+        keys = sorted(set([(src << 32) | dst for (src, dst) in edges]))
+        for key in keys:
+            src = key >> 32
+            if not self._sources or self._sources[-1] != src:
+                self._sources.append(src)
+                self._offsets.append(len(self._targets))
+            self._targets.append(key & 0xffffffff)
+        self._offsets.append(len(self._targets))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_source_index'] = None
+        return state
+
+    def _source_num(self, routine):
+        if self._source_index is None:
+            self._source_index = dict([(self._routines[src], i) for
+                                       (i, src) in enumerate(self._sources)])
+        return self._source_index.get(routine)
+
+    def get(self, routine, default=None):
+        """
+        Return the list of routines that C{routine} is connected to;
+        or C{default} if it is not connected to any routines.
+        """
+        i = self._source_num(routine)
+        if i is None: return default
+        return [self._routines[dst] for dst in
+                self._targets[self._offsets[i]:self._offsets[i+1]]]
+
+    def __getitem__(self, routine):
+        targets = self.get(routine)
+        if targets is None: raise KeyError(routine)
+        return targets
+
+    def __contains__(self, routine):
+        return self._source_num(routine) is not None
+
+    def __len__(self):
+        return len(self._sources)
+
+    def keys(self):
+        """Return a list of the routines that have at least one edge."""
+        return [self._routines[src] for src in self._sources]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        return [(routine, self[routine]) for routine in self.keys()]
+
+    def edges(self):
+        """
+        Return a list of C{(source, target)} pairs of routines, one for
+        each edge in this map.
+        """
+        routines, targets = self._routines, self._targets
+        return [(routines[src], routines[targets[j]]) for (i, src)
+                in enumerate(self._sources) for j in
+                range(self._offsets[i], self._offsets[i+1])]
 
 ######################################################################
 ## Pretty Printing
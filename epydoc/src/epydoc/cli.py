@@ -63,7 +63,7 @@ levels are currently defined as follows::
 """
 __docformat__ = 'epytext en'
 
-import sys, os, time, re, pickle, textwrap, tempfile, shutil
+import sys, os, time, re, pickle, textwrap, tempfile, shutil, gc
 from glob import glob
 from optparse import OptionParser, OptionGroup, SUPPRESS_HELP
 import optparse
@@ -85,7 +85,24 @@ try:
 except:
     xlink = None
 
+# The json module is used by --stats-file (it's new in Python 2.6)
+try: import json
+except ImportError:
+    try: import simplejson as json
+    except ImportError: json = None
+
+# The multiprocessing module is used to read pstat files in parallel
+# (it's new in Python 2.6)
+try: import multiprocessing
+except ImportError: multiprocessing = None
+
+# The resource module is used to find the peak memory use (unix only)
+try: import resource
+except ImportError: resource = None
+
 INHERITANCE_STYLES = ('grouped', 'listed', 'included', 'hidden')
+PARSER_BACKENDS = ('tokenize', 'ast')
+FUNCTION_BODY_MODES = ('all', 'init', 'none')
 GRAPH_TYPES = ('classtree', 'callgraph', 'umlclasstree')
 ACTIONS = ('html', 'text', 'latex', 'dvi', 'ps', 'pdf', 'check')
 DEFAULT_DOCFORMAT = 'epytext'
@@ -139,21 +156,28 @@ HELP_TOPICS['topics'] = wordwrap(
 
 DEFAULT_TARGET = dict(
     html='html', latex='latex', dvi='api.dvi', ps='api.ps',
-    pdf='api.pdf', pickle='api.pickle')
+    pdf='api.pdf', pickle='api.pickle', snapshot='api.snapshot')
 
 def option_defaults():
     return dict(
         actions=[], show_frames=True, docformat=DEFAULT_DOCFORMAT, 
         show_private=True, show_imports=False, inheritance="listed",
-        verbose=0, quiet=0, load_pickle=False, parse=True, introspect=True,
+        verbose=0, quiet=0, load_pickle=False, load_snapshot=False,
+        parse=True, introspect=True,
         debug=epydoc.DEBUG, profile=False, graphs=[],
         list_classes_separately=False, graph_font=None, graph_font_size=None,
         include_source_code=True, pstat_files=[], simple_term=False,
         fail_on=None, exclude=[], exclude_parse=[], exclude_introspect=[],
+        introspect_exports_only=[],
         external_api=[], external_api_file=[], external_api_root=[],
         redundant_details=False, src_code_tab_width=8, verbosity=0,
         include_timestamp=True, target={}, default_target=None,
-        pdfdriver='auto', show_submodule_list=True, inherit_from_object=False)
+        pdfdriver='auto', show_submodule_list=True, inherit_from_object=False,
+        jobs=1, isolate_imports=False, import_timeout=None,
+        lazy_docstrings=False,
+        parse_cache=None, parse_cache_size=64,
+        parser='tokenize', parse_function_bodies='all',
+        incremental=False, stats_file=None)
 
 # append_const is not defined in py2.3 or py2.4, so use a callback
 # instead, with the following function:
@@ -202,6 +226,13 @@ def parse_arguments():
         help="Do not try to use color or cursor control when displaying "
         "the progress bar, warnings, or errors.")
 
+    optparser.add_option("--stats-file",
+        dest="stats_file", metavar="FILE",
+        help="Write the time, CPU time, and memory used by each stage "
+        "of processing to FILE, in JSON format.  If FILE was written by "
+        "a previous run, then its timings are used to divide up the "
+        "progress bar.")
+
     action_group = OptionGroup(optparser, 'Actions')
     optparser.add_option_group(action_group)
 
@@ -237,6 +268,11 @@ def parse_arguments():
         action='callback', callback=add_action, 
         help="Write the documentation to a pickle file.")
 
+    action_group.add_option("--snapshot",
+        action='callback', callback=add_action, 
+        help="Write the documentation to a snapshot directory, which "
+        "can be loaded lazily, one top-level module at a time.")
+
     # Provide our own --help and --version options.
     action_group.add_option("--version",
         action='callback', callback=add_action, 
@@ -280,6 +316,59 @@ def parse_arguments():
         help="Exclude parsing of modules whose dotted name matches "
              "the regular expression PATTERN")
 
+    generation_group.add_option("--introspect-exports-only",
+        dest="introspect_exports_only", metavar="PATTERN", action="append",
+        help="Only introspect the variables that are exported by modules "
+             "whose dotted name matches the regular expression PATTERN "
+             "(i.e., the variables listed in __all__, or the public "
+             "variables if there is no __all__)")
+
+    generation_group.add_option("--jobs", "-j",
+        dest="jobs", metavar="N", type="int",
+        help="Parse the submodules of each package, and the docstrings, "
+        "and read the pstat files, using N worker processes.  (default: 1)")
+
+    generation_group.add_option("--isolate-imports",
+        action="store_true", dest="isolate_imports",
+        help="Import and introspect modules in separate worker processes "
+        "(up to N at a time, as given by --jobs), rather than in epydoc's "
+        "own process.")
+
+    generation_group.add_option("--import-timeout",
+        dest="import_timeout", metavar="SECONDS", type="float",
+        help="The maximum time that importing a single module may take.  "
+        "Modules that take longer are only documented by parsing their "
+        "source code.  The slowest imports are listed at the end of the "
+        "run.")
+
+    generation_group.add_option("--lazy-docstrings",
+        action="store_true", dest="lazy_docstrings",
+        help="Parse the docstrings of functions, methods, properties and "
+        "variables only when they are needed to write the output.")
+
+    generation_group.add_option("--parse-cache",
+        dest="parse_cache", metavar="PATH",
+        help="Save the results of parsing each module in the directory "
+        "PATH, and reuse them for modules that have not changed.")
+
+    generation_group.add_option("--parse-cache-size",
+        dest="parse_cache_size", metavar="MB", type="int",
+        help="The maximum size of the parse cache, in megabytes.  "
+        "(default: 64)")
+
+    generation_group.add_option("--parser",
+        dest="parser", metavar="BACKEND",
+        help="The backend that is used to parse source files.  BACKEND "
+        "should be one of: %s.  (default: tokenize)" %
+        ', '.join(PARSER_BACKENDS))
+
+    generation_group.add_option("--parse-function-bodies",
+        dest="parse_function_bodies", metavar="WHICH",
+        help="Which function bodies should be parsed, to find instance "
+        "variables that are documented by comments or docstrings.  "
+        "WHICH should be one of: %s.  (default: all)" %
+        ', '.join(FUNCTION_BODY_MODES))
+
     generation_group.add_option("--inheritance",
         dest="inheritance", metavar="STYLE",
         help="The format for showing inheritance objects.  STYLE "
@@ -407,6 +496,13 @@ def parse_arguments():
     output_group.add_option('--suppress-timestamp',
         action='store_false', dest='include_timestamp',
         help=("Do not include a timestamp in the generated output."))
+
+    output_group.add_option('--incremental',
+        action='store_true', dest='incremental',
+        help=("When generating HTML output, only rewrite the pages whose "
+              "inputs have changed since the last --incremental run, "
+              "and delete the pages of objects that are no longer "
+              "documented."))
     
     # The group of external API options.
     # Skip if the module couldn't be imported (usually missing docutils)
@@ -536,6 +632,11 @@ def parse_arguments():
                 optparser.error("When a pickle file is specified, no other "
                                "input files may be specified.")
             options.load_pickle = True
+        if name.endswith('.snapshot'):
+            if len(names) != 1:
+                optparser.error("When a snapshot is specified, no other "
+                               "input files may be specified.")
+            options.load_snapshot = True
     
     # Check to make sure all options are valid.
     if len(names) == 0:
@@ -552,6 +653,22 @@ def parse_arguments():
     if not options.parse and not options.introspect:
         optparser.error("Invalid option combination: --parse-only "
                         "and --introspect-only.")
+    if options.jobs < 1:
+        optparser.error("Bad number of jobs: %r" % options.jobs)
+    if options.introspect_exports_only:
+        try: re.compile('|'.join(options.introspect_exports_only))
+        except re.error, e:
+            optparser.error("Bad --introspect-exports-only pattern: %s" % e)
+    if options.import_timeout is not None and options.import_timeout <= 0:
+        optparser.error("Bad import timeout: %r" % options.import_timeout)
+    if options.parse_cache_size < 1:
+        optparser.error("Bad parse cache size: %r" % options.parse_cache_size)
+    if options.parser not in PARSER_BACKENDS:
+        optparser.error("Bad parser backend.  Valid options are " +
+                        ",".join(PARSER_BACKENDS))
+    if options.parse_function_bodies not in FUNCTION_BODY_MODES:
+        optparser.error("Bad --parse-function-bodies value.  Valid options "
+                        "are " + ",".join(FUNCTION_BODY_MODES))
 
     # Check the list of requested graph types to make sure they're
     # acceptable.
@@ -638,6 +755,8 @@ def parse_configfiles(configfiles, options, names):
             options.debug = _str_to_bool(val, optname)
         elif optname in ('simple-term', 'simple_term'):
             options.simple_term = _str_to_bool(val, optname)
+        elif optname in ('stats-file', 'stats_file'):
+            options.stats_file = val
 
         # Generation options
         elif optname == 'docformat':
@@ -652,6 +771,33 @@ def parse_configfiles(configfiles, options, names):
             options.exclude_parse.extend(_str_to_list(val))
         elif optname in ('exclude-introspect', 'exclude_introspect'):
             options.exclude_introspect.extend(_str_to_list(val))
+        elif optname in ('introspect-exports-only', 'introspect_exports_only'):
+            options.introspect_exports_only.extend(_str_to_list(val))
+        elif optname == 'jobs':
+            options.jobs = _str_to_int(val, optname)
+            if options.jobs < 1:
+                raise ValueError('"%s" option expected a positive int' %
+                                 optname)
+        elif optname in ('isolate-imports', 'isolate_imports'):
+            options.isolate_imports = _str_to_bool(val, optname)
+        elif optname in ('import-timeout', 'import_timeout'):
+            options.import_timeout = _str_to_float(val, optname)
+        elif optname in ('lazy-docstrings', 'lazy_docstrings'):
+            options.lazy_docstrings = _str_to_bool(val, optname)
+        elif optname in ('parse-cache', 'parse_cache'):
+            options.parse_cache = val
+        elif optname in ('parse-cache-size', 'parse_cache_size'):
+            options.parse_cache_size = _str_to_int(val, optname)
+        elif optname == 'parser':
+            if val.lower() not in PARSER_BACKENDS:
+                raise ValueError('"%s" expected one of: %s.' %
+                                 (optname, ', '.join(PARSER_BACKENDS)))
+            options.parser = val.lower()
+        elif optname in ('parse-function-bodies', 'parse_function_bodies'):
+            if val.lower() not in FUNCTION_BODY_MODES:
+                raise ValueError('"%s" expected one of: %s.' %
+                                 (optname, ', '.join(FUNCTION_BODY_MODES)))
+            options.parse_function_bodies = val.lower()
         elif optname == 'inheritance':
             if val.lower() not in INHERITANCE_STYLES:
                 raise ValueError('"%s" expected one of: %s.' %
@@ -697,6 +843,8 @@ def parse_configfiles(configfiles, options, names):
             options.src_code_tab_width = _str_to_int(val, optname)
         elif optname == 'timestamp':
             options.include_timestamp = _str_to_bool(val, optname)
+        elif optname == 'incremental':
+            options.incremental = _str_to_bool(val, optname)
 
         # External API
         elif optname in ('external-api', 'external_api'):
@@ -768,6 +916,12 @@ def _str_to_int(val, optname):
     except ValueError:
         raise ValueError('"%s" option expected an int' % optname)
 
+def _str_to_float(val, optname):
+    try:
+        return float(val)
+    except ValueError:
+        raise ValueError('"%s" option expected a number' % optname)
+
 def _str_to_list(val):
     return val.replace(',', ' ').split()
 
@@ -810,11 +964,12 @@ def main(options):
                   30,  # Parsing Docstrings
                   1,   # Inheriting documentation
                   2]   # Sorting & Grouping
-        if options.load_pickle:
+        if options.load_pickle or options.load_snapshot:
             stages = [30] # Loading pickled documentation
         if 'html' in options.actions: stages += [100]
         if 'check' in options.actions: stages += [10]
         if 'pickle' in options.actions: stages += [10]
+        if 'snapshot' in options.actions: stages += [10]
         if 'latex' in options.actions: stages += [60]
         if 'pdf' in options.actions: stages += [50]
         elif 'ps' in options.actions: stages += [40] # implied by pdf
@@ -825,10 +980,24 @@ def main(options):
             del stages[1] # no merging
         if options.introspect and not options.parse:
             del stages[1:3] # no merging or linking
+        # If a previous run recorded how long each stage took, then
+        # use those times instead.
+        if options.stats_file:
+            stages = read_stage_times(options.stats_file, options,
+                                      len(stages)) or stages
         logger = UnifiedProgressConsoleLogger(options.verbosity, stages)
         log.register_logger(logger)
         loggers.append(logger)
 
+    # Record per-stage statistics, if requested.
+    if options.stats_file:
+        if json is None:
+            log.error("--stats-file requires the json module")
+            sys.exit(1)
+        logger = StatsLogger(options.stats_file, options)
+        log.register_logger(logger)
+        loggers.append(logger)
+
     # Calculate the target directories/files.
     for (key, val) in DEFAULT_TARGET.items():
         if options.default_target is not None:
@@ -837,7 +1006,7 @@ def main(options):
             options.target.setdefault(key, val)
 
     # Add extensions to target filenames, where appropriate.
-    for action in ['pdf', 'ps', 'dvi', 'pickle']:
+    for action in ['pdf', 'ps', 'dvi', 'pickle', 'snapshot']:
         if action in options.target:
             if not options.target[action].endswith('.%s' % action):
                 options.target[action] += '.%s' % action
@@ -868,6 +1037,28 @@ def main(options):
     from epydoc import docstringparser
     docstringparser.DEFAULT_DOCFORMAT = options.docformat
 
+    # Select the parser backend, and which function bodies it parses.
+    from epydoc import docparser
+    docparser.PARSER_BACKEND = options.parser
+    docparser.PARSE_FUNCTION_BODIES = options.parse_function_bodies
+
+    # Limit the time that each import may take.
+    from epydoc import docintrospecter
+    docintrospecter.IMPORT_TIMEOUT = options.import_timeout
+
+    # Select the modules whose exports only are introspected.
+    if options.introspect_exports_only:
+        docintrospecter.EXPORTS_ONLY = re.compile(
+            '|'.join(options.introspect_exports_only))
+    else:
+        docintrospecter.EXPORTS_ONLY = None
+
+    # Set up the persistent parse cache
+    if options.parse_cache:
+        from epydoc import docparser
+        docparser.PARSE_CACHE_DIR = options.parse_cache
+        docparser.PARSE_CACHE_SIZE = options.parse_cache_size*1024*1024
+
     # Configure the external API linking
     if xlink is not None:
         try:
@@ -905,6 +1096,17 @@ def main(options):
         docindex = unpickler.load()
         log.debug('deserialization time: %.1f sec' % (time.time()-t0))
         log.end_progress()
+    elif options.load_snapshot:
+        assert len(options.names) == 1
+        from epydoc.snapshot import read_snapshot
+        log.start_progress('Loading snapshot')
+        log.progress(0.1, 'Loading %r' % options.names[0])
+        try:
+            docindex = read_snapshot(options.names[0])
+        except ValueError, e:
+            log.error(str(e))
+            docindex = None
+        log.end_progress()
     else:
         # Build docs for the named values.
         from epydoc.docbuilder import build_doc_index
@@ -917,7 +1119,10 @@ def main(options):
                                    add_submodules=(options.actions!=['text']),
                                    exclude_introspect=exclude_introspect,
                                    exclude_parse=exclude_parse,
-                                   inherit_from_object=inherit_from_object)
+                                   inherit_from_object=inherit_from_object,
+                                   jobs=options.jobs,
+                                   isolate_imports=options.isolate_imports,
+                                   lazy_docstrings=options.lazy_docstrings)
 
     if docindex is None:
         for logger in loggers:
@@ -933,9 +1138,8 @@ def main(options):
         except ImportError:
             log.error("Could not import pstats -- ignoring pstat files.")
         try:
-            profile_stats = pstats.Stats(options.pstat_files[0])
-            for filename in options.pstat_files[1:]:
-                profile_stats.add(filename)
+            profile_stats = read_pstat_files(options.pstat_files,
+                                             options.jobs)
         except KeyboardInterrupt:
             for logger in loggers: log.remove_logger(logger)
             raise
@@ -954,6 +1158,8 @@ def main(options):
         check_docs(docindex, options)
     if 'pickle' in options.actions:
         write_pickle(docindex, options)
+    if 'snapshot' in options.actions:
+        write_snapshot(docindex, options)
     if ('latex' in options.actions or 'dvi' in options.actions or
         'ps' in options.actions or 'pdf' in options.actions):
         write_latex(docindex, options)
@@ -979,6 +1185,17 @@ def main(options):
                 logger.print_times()
                 break
 
+    # Docstring parse memo statistics:
+    if options.verbosity >= 1:
+        from epydoc.markup import parse_memo_stats
+        hits, misses, size = parse_memo_stats()
+        print ('Docstring parse memo: %d hits, %d misses (%d entries)' %
+               (hits, misses, size))
+
+    # Slowest imports:
+    if options.verbosity >= 1 or options.import_timeout:
+        print_import_report(options)
+
     # If we encountered any message types that we were requested to
     # fail on, then exit with status 2.
     if options.fail_on is not None:
@@ -992,6 +1209,63 @@ def main(options):
     # Return the docindex, in case someone wants to use it programatically.
     return docindex
             
+def read_pstat_files(filenames, jobs=1):
+    """
+    Return a C{pstats.Stats} object that combines the profiling data
+    in the given pstat files.  If C{jobs} is greater than one, then
+    the files are divided between up to C{jobs} worker processes.
+    Each worker combines its share of the files, and writes the
+    result to a temporary pstat file; and those files are then
+    combined by this process.
+    """
+    if multiprocessing is None:
+        return _combine_pstat_files(filenames)
+    # Reading pstat files is CPU-bound, so there's no point in using
+    # more workers than CPUs; and each worker should combine at least
+    # two files, since its result has to be read again.
+    try: num_workers = min(jobs, multiprocessing.cpu_count())
+    except NotImplementedError: num_workers = jobs
+    num_workers = min(num_workers, len(filenames)//2)
+    if num_workers <= 1:
+        return _combine_pstat_files(filenames)
+
+    chunks = [filenames[i::num_workers] for i in range(num_workers)]
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        tmp_filenames = pool.map(_combine_pstat_files_in_worker, chunks)
+    finally:
+        # Don't use pool.terminate(); see docbuilder._stop_parse_workers().
+        pool.close()
+        pool.join()
+    try:
+        return _combine_pstat_files(tmp_filenames)
+    finally:
+        for tmp_filename in tmp_filenames:
+            os.unlink(tmp_filename)
+
+def _combine_pstat_files(filenames):
+    """
+    Return a C{pstats.Stats} object that combines the profiling data
+    in the given pstat files.
+    """
+    import pstats
+    profile_stats = pstats.Stats(filenames[0])
+    for filename in filenames[1:]:
+        profile_stats.add(filename)
+    return profile_stats
+
+def _combine_pstat_files_in_worker(filenames):
+    """
+    Combine the profiling data in the given pstat files, write it to
+    a temporary pstat file, and return the temporary file's name.
+    This is run by the worker processes of L{read_pstat_files()}.
+    """
+    profile_stats = _combine_pstat_files(filenames)
+    fd, tmp_filename = tempfile.mkstemp('.pstat', 'epydoc-')
+    os.close(fd)
+    profile_stats.dump_stats(tmp_filename)
+    return tmp_filename
+
 def write_html(docindex, options):
     from epydoc.docwriter.html import HTMLWriter
     html_writer = HTMLWriter(docindex, **options.__dict__)
@@ -1016,6 +1290,15 @@ def write_pickle(docindex, options):
     outfile.close()
     log.end_progress()
 
+def write_snapshot(docindex, options):
+    """Helper for writing output to a snapshot directory.  Unlike a
+    pickle file, a snapshot is read lazily: each top-level module's
+    documentation is only loaded when it is first used."""
+    from epydoc.snapshot import write_snapshot
+    log.start_progress('Writing snapshot to %r' % options.target['snapshot'])
+    write_snapshot(docindex, options.target['snapshot'])
+    log.end_progress()
+
 def pickle_persistent_id(obj):
     """Helper for pickling, which allows us to save and restore UNKNOWN,
     which is required to be identical to apidoc.UNKNOWN."""
@@ -1209,6 +1492,27 @@ def write_text(docindex, options):
 def check_docs(docindex, options):
     from epydoc.checker import DocChecker
     DocChecker(docindex).check()
+
+SLOW_IMPORTS = 10
+"""The number of modules that are listed by L{print_import_report()}."""
+
+def print_import_report(options):
+    """
+    Print the modules whose imports took the most time, along with
+    how much memory each of them used.
+    """
+    from epydoc.docintrospecter import import_stats
+    stats = import_stats()[:SLOW_IMPORTS]
+    if not stats: return
+    print 'Slowest imports:'
+    for (name, seconds, memory) in stats:
+        if memory is None: memory = '?'
+        else: memory = '%d KB' % memory
+        if options.import_timeout and seconds >= options.import_timeout:
+            note = '  (timed out)'
+        else:
+            note = ''
+        print '  %8.3f sec %10s  %s%s' % (seconds, memory, name, note)
                 
 def cli():
     """
@@ -1654,6 +1958,151 @@ class HTMLLogger(log.Logger):
             return '%d hours, %d minutes' % (secs/3600, secs%3600)
             
 
+class StatsLogger(log.Logger):
+    """
+    A logger used to record how long each stage of processing takes,
+    and how much memory it uses, and to write those statistics to a
+    JSON file (for the C{--stats-file} option).  Each stage is
+    delimited by a call to C{start_progress} and a call to
+    C{end_progress}.  Within a stage, the time between consecutive
+    progress messages is charged to the earlier message's item (such
+    as a module or an output file).
+
+    Memory use is measured with the process's peak resident set size,
+    which never decreases.  So each stage records how much it raised
+    that peak (C{peak_rss_increase_kb}), and the peak for the whole
+    run is recorded once (C{peak_rss_kb}).
+    """
+    SLOWEST_ITEMS = 10
+    """The number of slowest items that are listed for each stage."""
+
+    def __init__(self, filename, options):
+        self.filename = filename
+        self.options = options
+        self.stages = []
+        """A list of dictionaries, one for each completed stage."""
+        self._stage = None
+        self._item = None
+        self._item_times = []
+        self._start_times = self._times()
+        self._slowest_modules = []
+
+    def start_progress(self, header=None):
+        self._stage = (header or '', self._times(), self._peak_rss())
+        self._item = None
+        self._item_times = []
+
+    def progress(self, percent, message=''):
+        if message and message is not UNKNOWN:
+            self._end_item()
+            self._item = ('%s' % message, time.time())
+
+    def end_progress(self):
+        if self._stage is None: return
+        self._end_item()
+        (header, start_times, start_rss) = self._stage
+        end_times = self._times()
+        stats = self._time_deltas(start_times, end_times)
+        stats['name'] = header
+        end_rss = self._peak_rss()
+        if end_rss is None:
+            stats['peak_rss_increase_kb'] = None
+        else:
+            stats['peak_rss_increase_kb'] = end_rss - start_rss
+        stats['gc_objects'] = len(gc.get_objects())
+        self._item_times.sort(key=lambda item:-item[1])
+        stats['slowest_items'] = self._item_times[:self.SLOWEST_ITEMS]
+        # The slowest modules are the slowest items of the stage in
+        # which the modules are parsed & introspected, leaving out the
+        # time spent waiting for imports (which is reported by
+        # slowest_imports).
+        if header == 'Building documentation':
+            self._slowest_modules = [
+                item for item in self._item_times
+                if not item[0].startswith('Importing ')
+                ][:self.SLOWEST_ITEMS]
+        self.stages.append(stats)
+        self._stage = None
+
+    def close(self):
+        stats = self._time_deltas(self._start_times, self._times())
+        stats['epydoc_version'] = epydoc.__version__
+        stats['options'] = _stats_options(self.options)
+        stats['peak_rss_kb'] = self._peak_rss()
+        stats['stages'] = self.stages
+        stats['slowest_modules'] = self._slowest_modules
+        from epydoc.docintrospecter import import_stats
+        stats['slowest_imports'] = import_stats()[:self.SLOWEST_ITEMS]
+        try:
+            out = open(self.filename, 'w')
+            json.dump(stats, out, indent=2, sort_keys=True)
+            out.close()
+        except IOError, e:
+            log.error('Unable to write stats file %r: %s' %
+                      (self.filename, e))
+
+    def _end_item(self):
+        if self._item is not None:
+            (message, start_time) = self._item
+            self._item_times.append(
+                (message, round(time.time()-start_time, 4)) )
+            self._item = None
+
+    def _times(self):
+        """Return the current wall time, CPU time, and CPU time used
+        by (finished) child processes."""
+        times = os.times()
+        return (time.time(), times[0]+times[1], times[2]+times[3])
+
+    def _time_deltas(self, start_times, end_times):
+        (wall, cpu, child_cpu) = [round(end-start, 4) for (start, end)
+                                  in zip(start_times, end_times)]
+        return {'wall_time': wall, 'cpu_time': cpu,
+                'child_cpu_time': child_cpu}
+
+    def _peak_rss(self):
+        """Return the peak resident set size of this process in
+        kilobytes, or C{None} if it's not available."""
+        if resource is None: return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_rss /= 1024 # (reported in bytes, not kilobytes)
+        return peak_rss
+
+def _stats_options(options):
+    """
+    Return a dictionary describing the options that determine which
+    stages are run.  Stage times from a previous run are only reused
+    if they were recorded with the same options.
+    """
+    return {'actions': list(options.actions), 'parse': options.parse,
+            'introspect': options.introspect,
+            'load_pickle': options.load_pickle,
+            'load_snapshot': options.load_snapshot}
+
+def read_stage_times(filename, options, num_stages):
+    """
+    Return a list of the wall times of the stages recorded by a
+    previous run in the given stats file, for use as progress bar
+    weights; or C{None} if the file does not exist, or if it was
+    recorded with options that run a different set of stages.
+    """
+    if json is None or not os.path.exists(filename):
+        return None
+    try:
+        stats_file = open(filename)
+        try: stats = json.load(stats_file)
+        finally: stats_file.close()
+        if stats['options'] != _stats_options(options):
+            return None
+        times = [float(stage['wall_time']) for stage in stats['stages']]
+    except (IOError, ValueError, KeyError, TypeError), e:
+        log.debug('Ignoring stats file %r: %s' % (filename, e))
+        return None
+    if len(times) != num_stages or sum(times) <= 0:
+        return None
+    return times
+
 ######################################################################
 ## main
 ######################################################################
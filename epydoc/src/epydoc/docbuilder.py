@@ -48,6 +48,19 @@ perform individual steps in the creation of the documentation.
     _get_docs_from_*, _report_valdoc_progress
 @group Merging: *MERGE*, *merge*
 @group Linking: link_imports
+@group Parallel Parsing: _shared_apidocs, _pending_parses,
+    _parses_cancelled, *_parse_worker*,
+    _worker_*, _parse_in_worker, _register_shared_apidocs,
+    _reachable_apidocs, _apidoc_fingerprint, _new_subclasses,
+    _forget_worker_docs, _shared_apidoc_id, _shared_apidoc_load
+@group Isolated Introspection: INTROSPECT_WORKER_MODULES,
+    PICKLED_PYVAL_MAXSIZE,
+    _prefork_values, _introspect_worker_results, *introspect_worker*,
+    _introspect_in_worker*, _introspect_worker_value_key,
+    _value_with_name, _introspected_module_name, _picklable_pyval,
+    _pyval_stand_in, _PyvalRepr, _replace_merged_apidocs
+@group Parallel Docstring Parsing: _preparse_docstrings,
+    _can_preparse, _preparse_docstring_in_worker
 @group Naming: _name_scores, _unreachable_names, assign_canonical_names,
     _var_shadows_self, _fix_self_shadowing_var, _unreachable_name_for
 @group Inheritance: inherit_docs, _inherit_info
@@ -67,16 +80,24 @@ __docformat__ = 'epytext en'
 ## Imports
 ######################################################################
 
-import sys, os, os.path, __builtin__, imp, re, inspect
+import sys, os, os.path, __builtin__, imp, re, inspect, types, time
+import cPickle, cStringIO
 from epydoc.apidoc import *
 from epydoc.docintrospecter import introspect_docs
 from epydoc.docintrospecter import get_value_from_filename, get_value_from_name
 from epydoc.docparser import parse_docs, ParseError
-from epydoc.docstringparser import parse_docstring
+import epydoc.docparser, epydoc.docintrospecter, epydoc.docstringparser
+import epydoc.markup, epydoc.markup.pyval_repr
+from epydoc.docstringparser import parse_docstring, get_docformat
+from epydoc.docstringparser import defer_docstring_parsing
 from epydoc import log
 from epydoc.util import *
 from epydoc.compat import * # Backwards compatibility
 
+# Used to parse modules in parallel (requires Python 2.6+)
+try: import multiprocessing
+except ImportError: multiprocessing = None
+
 ######################################################################
 ## 1. build_doc()
 ######################################################################
@@ -87,12 +108,16 @@ class BuildOptions:
     """
     def __init__(self, introspect=True, parse=True,
                  exclude_introspect=None, exclude_parse=None,
-                 add_submodules=True):
+                 add_submodules=True, jobs=1, lazy_docstrings=False,
+                 isolate_imports=False):
         self.introspect = introspect
         self.parse = parse
         self.exclude_introspect = exclude_introspect
         self.exclude_parse = exclude_parse
         self.add_submodules = add_submodules
+        self.jobs = jobs
+        self.lazy_docstrings = lazy_docstrings
+        self.isolate_imports = isolate_imports
 
         # Test for pattern syntax and compile them into pattern objects.
         try:
@@ -148,7 +173,8 @@ class BuildOptions:
 
 def build_doc(item, introspect=True, parse=True, add_submodules=True,
               exclude_introspect=None, exclude_parse=None,
-              inherit_from_object=False):
+              inherit_from_object=False, jobs=1, lazy_docstrings=False,
+              isolate_imports=False):
     """
     Build API documentation for a given item, and return it as
     an L{APIDoc} object.
@@ -168,16 +194,26 @@ def build_doc(item, introspect=True, parse=True, add_submodules=True,
         specified items.  Otherwise, just use parsing.
     @param parse: If true, then use parsing to examine the specified
         items.  Otherwise, just use introspection.
+    @param jobs: The number of worker processes that should be used
+        to parse package submodules.  See L{build_doc_index()}.
+    @param lazy_docstrings: If true, then parse docstrings when they
+        are first used.  See L{build_doc_index()}.
+    @param isolate_imports: If true, then import modules in worker
+        processes.  See L{build_doc_index()}.
     """
     docindex = build_doc_index([item], introspect, parse, add_submodules,
                                exclude_introspect=exclude_introspect,
                                exclude_parse=exclude_parse,
-                               inherit_from_object=inherit_from_object)
+                               inherit_from_object=inherit_from_object,
+                               jobs=jobs, lazy_docstrings=lazy_docstrings,
+                               isolate_imports=isolate_imports)
     return docindex.root[0]
 
 def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
                     exclude_introspect=None, exclude_parse=None,
-                    inherit_from_object=False):
+                    inherit_from_object=False, jobs=1,
+                    lazy_docstrings=False, isolate_imports=False,
+                    compact=False):
     """
     Build API documentation for the given list of items, and
     return it in the form of a L{DocIndex}.
@@ -197,18 +233,54 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
         specified items.  Otherwise, just use parsing.
     @param parse: If true, then use parsing to examine the specified
         items.  Otherwise, just use introspection.
+    @param jobs: The number of worker processes that should be used
+        to parse the submodules of each package, and the docstrings.
+        If C{jobs} is greater than one (and the C{multiprocessing}
+        module is available), then each package's submodules and the
+        docstrings are parsed in parallel; the resulting docs are
+        identical to the docs that would be built by parsing them one
+        at a time.
+    @param lazy_docstrings: If true, then the docstrings of functions,
+        methods, properties and variables are not parsed while
+        building the index.  Instead, each one is parsed the first
+        time that the information extracted from it (such as its
+        C{descr}, C{summary} or C{metadata}) is used.  See
+        L{defer_docstring_parsing()}.
+    @param isolate_imports: If true, then the modules and packages
+        that are specified by filename are imported and introspected
+        by worker processes (up to C{jobs} at a time), rather than by
+        this process.  Each worker imports a few modules, sends their
+        docs back to this process, and exits.  This keeps modules that
+        misbehave when they are imported from affecting the rest of
+        the build, and limits the memory that is used by the imported
+        modules.  See L{_introspect_in_workers()}.
+    @param compact: If true, then L{compact <APIDoc.compact>} each
+        C{ValueDoc} and C{VariableDoc} once the index has been built,
+        to reduce the memory that the finished index uses.  This
+        happens after every other step, so it does not reduce the
+        peak memory use (RSS) of the build; and since the
+        C{APIDoc}s' instance dictionaries are only a small part of
+        that memory, the saving is small (see
+        C{tools/bench_memory.py}).
     """
     try:
         options = BuildOptions(parse=parse, introspect=introspect,
             exclude_introspect=exclude_introspect, exclude_parse=exclude_parse,
-            add_submodules=add_submodules)
+            add_submodules=add_submodules, jobs=jobs,
+            lazy_docstrings=lazy_docstrings, isolate_imports=isolate_imports)
     except Exception, e:
         # log.error already reported by constructor.
         return None
 
     # Get the basic docs for each item.
     log.start_progress('Building documentation')
-    if introspect:
+    if introspect and options.isolate_imports and multiprocessing:
+        # Import & introspect the modules in worker processes.  Any
+        # items that the workers can't handle are imported here, as
+        # usual.
+        _import_docs_from_items(_introspect_in_workers(items, options),
+                                options)
+    elif introspect:
         # Import everything before we introspect anything.
         _import_docs_from_items(items, options)
     doc_pairs = _get_docs_from_items(items, options)
@@ -252,6 +324,7 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
         for i, val_doc in enumerate(valdocs):
             _report_valdoc_progress(i, val_doc, valdocs)
             link_imports(val_doc, docindex)
+        docindex.invalidate_reachable_valdocs()
         log.end_progress()
 
     # Assign canonical names.
@@ -259,6 +332,7 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
     for i, val_doc in enumerate(docindex.root):
         log.progress(float(i)/len(docindex.root), val_doc.canonical_name)
         assign_canonical_names(val_doc, val_doc.canonical_name, docindex)
+    docindex.invalidate_reachable_valdocs()
     log.end_progress()
 
     # Set overrides pointers
@@ -270,6 +344,7 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
             percent = float(i)/len(valdocs)
             log.progress(percent, val_doc.canonical_name)
             find_overrides(val_doc)
+    docindex.invalidate_reachable_valdocs()
     log.end_progress()
     
     # Parse the docstrings for each object.
@@ -278,21 +353,32 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
         docindex.reachable_valdocs(
             imports=False, submodules=False, packages=False, subclasses=False,
             bases=False, overrides=True))
-    for i, val_doc in enumerate(valdocs):
-        _report_valdoc_progress(i, val_doc, valdocs)
-        # the value's docstring
-        parse_docstring(val_doc, docindex, suppress_warnings)
-        # the value's variables' docstrings
-        if (isinstance(val_doc, NamespaceDoc) and
-            val_doc.variables not in (None, UNKNOWN)):
-            for var_doc in val_doc.variables.values():
-                # Now we have a chance to propagate the defining module
-                # to objects for which introspection is not possible,
-                # such as properties.
-                if (isinstance(var_doc.value, ValueDoc)
-                    and var_doc.value.defining_module is UNKNOWN):
-                    var_doc.value.defining_module = val_doc.defining_module
-                parse_docstring(var_doc, docindex, suppress_warnings)
+    if options.lazy_docstrings:
+        process_docstring = defer_docstring_parsing
+    else:
+        process_docstring = parse_docstring
+        _preparse_docstrings(valdocs, docindex, options)
+    try:
+        for i, val_doc in enumerate(valdocs):
+            _report_valdoc_progress(i, val_doc, valdocs)
+            # the value's docstring
+            process_docstring(val_doc, docindex, suppress_warnings)
+            # the value's variables' docstrings
+            if (isinstance(val_doc, NamespaceDoc) and
+                val_doc.variables not in (None, UNKNOWN)):
+                for var_doc in val_doc.variables.values():
+                    # Now we have a chance to propagate the defining
+                    # module to objects for which introspection is not
+                    # possible, such as properties.
+                    if (isinstance(var_doc.value, ValueDoc)
+                        and var_doc.value.defining_module is UNKNOWN):
+                        var_doc.value.defining_module = \
+                            val_doc.defining_module
+                    process_docstring(var_doc, docindex, suppress_warnings)
+    finally:
+        epydoc.docstringparser._preparsed_docstrings.clear()
+    # Docstring fields can add and remove variables.
+    docindex.invalidate_reachable_valdocs()
     log.end_progress()
 
     # Take care of inheritance.
@@ -302,6 +388,7 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
             percent = float(i)/len(valdocs)
             log.progress(percent, val_doc.canonical_name)
             inherit_docs(val_doc, inherit_from_object)
+    docindex.invalidate_reachable_valdocs()
     log.end_progress()
 
     # Initialize the groups & sortedvars attributes.
@@ -315,6 +402,13 @@ def build_doc_index(items, introspect=True, parse=True, add_submodules=True,
             if isinstance(val_doc, ModuleDoc):
                 val_doc.init_submodule_groups()
             val_doc.report_unused_groups()
+    if compact:
+        for val_doc in valdocs:
+            val_doc.compact()
+            if (isinstance(val_doc, NamespaceDoc) and
+                val_doc.variables not in (None, UNKNOWN)):
+                for var_doc in val_doc.variables.values():
+                    var_doc.compact()
     log.end_progress()
 
     return docindex
@@ -463,6 +557,11 @@ def _get_docs_from_items(items, options):
             doc_pairs += _get_docs_from_submodules(
                 item, doc_pairs[-1], options, progress_estimator)
 
+    # The parse workers are all finished; so there's no need to keep
+    # track of the docs that they shared with us.
+    _shared_apidocs.clear()
+    _introspect_worker_results.clear()
+
     return doc_pairs
 
 def _get_docs_from_pyobject(obj, options, progress_estimator):
@@ -575,13 +674,7 @@ def _get_docs_from_module_file(filename, options, progress_estimator,
         the second element is the parent from parsing.
     """
     # Record our progress.
-    modulename = os.path.splitext(os.path.split(filename)[1])[0]
-    if modulename == '__init__':
-        modulename = os.path.split(os.path.split(filename)[0])[1]
-    if parent_docs[0]:
-        modulename = DottedName(parent_docs[0].canonical_name, modulename)
-    elif parent_docs[1]:
-        modulename = DottedName(parent_docs[1].canonical_name, modulename)
+    modulename = _module_name_for_file(filename, parent_docs)
     if options.must_introspect(modulename) or options.must_parse(modulename):
         log.progress(progress_estimator.progress(),
                      '%s (%s)' % (modulename, filename))
@@ -602,16 +695,20 @@ def _get_docs_from_module_file(filename, options, progress_estimator,
     introspect_error = parse_error = None
     if options.must_introspect(modulename):
         try:
-            introspect_doc = introspect_docs(
-                filename=filename, context=parent_docs[0])
+            introspect_doc = _collect_introspect_worker_docs(filename)
+            if introspect_doc is None:
+                introspect_doc = introspect_docs(
+                    filename=filename, context=parent_docs[0])
             if introspect_doc.canonical_name is UNKNOWN:
                 introspect_doc.canonical_name = modulename
         except ImportError, e:
             introspect_error = str(e)
     if src_file_available and options.must_parse(modulename):
         try:
-            parse_doc = parse_docs(
-                filename=filename, context=parent_docs[1])
+            parse_doc = _collect_parse_worker_docs(filename, parent_docs[1])
+            if parse_doc is None:
+                parse_doc = parse_docs(
+                    filename=filename, context=parent_docs[1])
         except (ParseError, ImportError, IOError, OSError), e:
             parse_error = str(e)
 
@@ -622,6 +719,21 @@ def _get_docs_from_module_file(filename, options, progress_estimator,
     # Return the docs we found.
     return (introspect_doc, parse_doc)
 
+def _module_name_for_file(filename, parent_docs):
+    """
+    Return the dotted name of the module with the given filename,
+    whose containing package is described by C{parent_docs}.  (See
+    L{_get_docs_from_module_file()} for the format of C{parent_docs}.)
+    """
+    modulename = os.path.splitext(os.path.split(filename)[1])[0]
+    if modulename == '__init__':
+        modulename = os.path.split(os.path.split(filename)[0])[1]
+    if parent_docs[0]:
+        modulename = DottedName(parent_docs[0].canonical_name, modulename)
+    elif parent_docs[1]:
+        modulename = DottedName(parent_docs[1].canonical_name, modulename)
+    return modulename
+
 def _get_docs_from_submodules(item, pkg_docs, options, progress_estimator):
     # Extract the package's __path__.
     if isinstance(pkg_docs[0], ModuleDoc) and pkg_docs[0].is_package:
@@ -653,10 +765,14 @@ def _get_docs_from_submodules(item, pkg_docs, options, progress_estimator):
                                        subpackage_dirs)
 
     docs = [pkg_docs]
-    for module_filename in module_filenames.values():
-        d = _get_docs_from_module_file(
-            module_filename, options, progress_estimator, pkg_docs)
-        docs.append(d)
+    pool = _start_parse_workers(module_filenames.values(), pkg_docs, options)
+    try:
+        for module_filename in module_filenames.values():
+            d = _get_docs_from_module_file(
+                module_filename, options, progress_estimator, pkg_docs)
+            docs.append(d)
+    finally:
+        _stop_parse_workers(pool)
     for subpackage_dir in subpackage_dirs:
         subpackage_file = os.path.join(subpackage_dir, '__init__')
         docs.append(_get_docs_from_module_file(
@@ -687,6 +803,1061 @@ def _report_errors(name, introspect_doc, parse_doc,
         log.end_block()
 
 
+#/////////////////////////////////////////////////////////////////
+# Parallel Parsing
+#/////////////////////////////////////////////////////////////////
+
+_shared_apidocs = {}
+"""A dictionary mapping from C{id}s to the C{APIDoc}s that existed
+when the most recent pool of parse workers was started.  Since the
+workers are forked from the main process, these C{id}s identify the
+same objects in every process; so the workers pickle references to
+these C{APIDoc}s, rather than copies of them.
+@type: C{dict}"""
+
+_pending_parses = {}
+"""A dictionary mapping from the filenames of modules that are being
+parsed by worker processes to the C{AsyncResult}s that will hold
+their results.
+@type: C{dict}"""
+
+_parses_cancelled = None
+"""A C{multiprocessing.Event} that is set when the most recent pool of
+parse workers is stopped.  Workers skip the modules that are still
+queued once it is set, since their results would be discarded."""
+
+_worker_cache_keys = None
+"""In a parse worker process, a tuple containing the sets of keys
+that the parser's and the introspecter's caches had when the worker
+was started."""
+
+_worker_is_dirty = False
+"""In a parse worker process, true if parsing some module modified
+the shared docs in a way that the worker can not undo.  Once this
+happens, the worker leaves all remaining modules to the main
+process."""
+
+def _start_parse_workers(filenames, pkg_docs, options):
+    """
+    Start parsing the given module files (which are contained in the
+    package described by C{pkg_docs}) in a pool of worker processes,
+    and return the pool.  The docs for each module are collected by
+    L{_collect_parse_worker_docs()} when the build reaches it.  If
+    the modules should not be parsed in parallel, then return
+    C{None}.
+    """
+    if multiprocessing is None or options.jobs <= 1 or not options.parse:
+        return None
+    # The workers refer to the shared APIDocs by id(), which is only
+    # meaningful if they are forked from this process.
+    if not hasattr(os, 'fork'):
+        return None
+    # If the parser follows imports, then parsing a module can modify
+    # the docs of the modules that it imports.
+    if epydoc.docparser.IMPORT_HANDLING != 'link':
+        return None
+
+    # Decide which files should be parsed.
+    filenames_to_parse = []
+    for filename in filenames:
+        if not options.must_parse(_module_name_for_file(filename, pkg_docs)):
+            continue
+        filename = os.path.normpath(os.path.abspath(filename))
+        try: filename = py_src_filename(filename)
+        except ValueError: continue
+        if filename not in epydoc.docparser._moduledoc_cache:
+            filenames_to_parse.append(filename)
+    if len(filenames_to_parse) < 2:
+        return None
+
+    # The workers will inherit our docs when they are forked.
+    _register_shared_apidocs()
+    if pkg_docs[1] is None: context_id = None
+    else: context_id = id(pkg_docs[1])
+
+    global _parses_cancelled
+    _parses_cancelled = multiprocessing.Event()
+    pool = multiprocessing.Pool(min(options.jobs, len(filenames_to_parse)),
+                                _init_parse_worker)
+    for filename in filenames_to_parse:
+        _pending_parses[filename] = pool.apply_async(
+            _parse_in_worker, (filename, context_id))
+    pool.close()
+    return pool
+
+def _stop_parse_workers(pool):
+    """
+    Shut down a pool of parse workers that was created by
+    L{_start_parse_workers()}, and discard any results that were not
+    collected.  Modules that the workers have not started parsing yet
+    are skipped.
+    """
+    if pool is None: return
+    _pending_parses.clear()
+    # The pool is already closed, so its workers exit once they have
+    # finished their tasks; and they skip the queued modules once
+    # _parses_cancelled is set.  (So if the build is interrupted, we
+    # only wait for the modules that are being parsed.)  Don't use
+    # pool.terminate(): in python 2, it can deadlock if a worker is
+    # waiting for a task while holding the task queue's lock.
+    _parses_cancelled.set()
+    pool.join()
+
+def _collect_parse_worker_docs(filename, context):
+    """
+    If the module with the given filename was parsed by a worker
+    process, then add its C{ModuleDoc} to the parser's cache and to
+    C{context}'s list of submodules, report any messages that were
+    logged while parsing it, and return it.  In other words, do
+    everything that L{parse_docs()} would have done if the module was
+    parsed by this process.  Otherwise, return C{None}.
+    """
+    result = _pending_parses.pop(filename, None)
+    if result is None: return None
+    pickled_result = result.get()
+    # If the worker could not parse the module independently, or if
+    # the module was already parsed (e.g., because it was needed to
+    # find some other module's base classes), then use parse_docs.
+    if (pickled_result is None or
+        filename in epydoc.docparser._moduledoc_cache):
+        return None
+
+    unpickler = cPickle.Unpickler(cStringIO.StringIO(pickled_result))
+    unpickler.persistent_load = _shared_apidoc_load
+    module_doc, subclasses, messages = unpickler.load()
+    
+    epydoc.docparser._moduledoc_cache[filename] = module_doc
+    if context is not None:
+        context.submodules.append(module_doc)
+    for (base_doc, new_subclasses) in subclasses:
+        base_doc.subclasses.extend(new_subclasses)
+    log.replay_messages(messages)
+    return module_doc
+
+def _register_shared_apidocs():
+    """
+    Add every C{APIDoc} that can be reached from the parser's and the
+    introspecter's caches to L{_shared_apidocs}.
+    """
+    for val_doc in _reachable_apidocs(
+        epydoc.docparser._moduledoc_cache.values() +
+        epydoc.docintrospecter._valuedoc_cache.values()):
+        _shared_apidocs[id(val_doc)] = val_doc
+
+def _reachable_apidocs(roots):
+    """
+    Return a list of the C{APIDoc}s that can be reached from the
+    given list of values, by following C{APIDoc} attributes, but
+    not passing through any of the L{_shared_apidocs}.
+    """
+    apidocs = {}
+    queue = list(roots)
+    while queue:
+        val = queue.pop()
+        if isinstance(val, APIDoc):
+            if id(val) in apidocs or id(val) in _shared_apidocs: continue
+            apidocs[id(val)] = val
+            for attrib, attrib_val in val.__dict__.items():
+                # These can be large, and never contain APIDocs.
+                if attrib not in ('pyval', 'toktree'):
+                    queue.append(attrib_val)
+        elif isinstance(val, (list, tuple, set)):
+            queue.extend(val)
+        elif isinstance(val, dict):
+            queue.extend(val.values())
+    return apidocs.values()
+
+def _init_parse_worker():
+    """
+    Initialize a parse worker process.  Any messages that are logged
+    by the worker are recorded, and reported by the main process, so
+    that they're reported in the same order as for a serial build.
+    """
+    global _worker_cache_keys
+    del log._loggers[:]
+    _worker_cache_keys = (set(epydoc.docparser._moduledoc_cache),
+                          set(epydoc.docintrospecter._valuedoc_cache))
+
+def _parse_in_worker(filename, context_id):
+    """
+    Parse the module with the given filename (in a worker process),
+    and return a pickled tuple C{(module_doc, subclasses, messages)},
+    where C{subclasses} is a list of C{(base_doc, new_subclasses)}
+    pairs for the shared base classes that the module's classes
+    registered themselves with, and C{messages} is the list of
+    messages that were logged while parsing it.  If the module could
+    not be parsed independently of the rest of the build, then
+    return C{None}; in that case, the main process will parse it
+    itself.  Also return C{None} if the workers have been stopped
+    (see L{_parses_cancelled}).
+    """
+    global _worker_is_dirty
+    if _worker_is_dirty or _parses_cancelled.is_set(): return None
+    
+    moduledoc_cache = epydoc.docparser._moduledoc_cache
+    valuedoc_cache = epydoc.docintrospecter._valuedoc_cache
+    num_moduledocs, num_valuedocs = len(moduledoc_cache), len(valuedoc_cache)
+    context = _shared_apidocs.get(context_id)
+    # The shared docs that a module can look up by name, and so
+    # modify (e.g., with "Exception.x = 1").
+    builtins = introspect_docs(__builtin__)
+    watched_docs = [builtins, context] + [var_doc.value for var_doc in
+                                          builtins.variables.values()]
+    watched_docs = [d for d in watched_docs if isinstance(d, APIDoc)]
+    fingerprints = map(_apidoc_fingerprint, watched_docs)
+    
+    recorder = log.RecordingLogger()
+    log.register_logger(recorder)
+    try:
+        try:
+            module_doc = parse_docs(filename=filename, context=context)
+            if map(_apidoc_fingerprint, watched_docs) != fingerprints:
+                _worker_is_dirty = True
+                return None
+            # If parsing the module required parsing or introspecting
+            # any other values, then its docs would refer to our
+            # copies of them; so leave it to the main process.
+            if (len(moduledoc_cache) != num_moduledocs+1 or
+                len(valuedoc_cache) != num_valuedocs):
+                return None
+            out = cStringIO.StringIO()
+            pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = _shared_apidoc_id
+            pickler.dump( (module_doc, _new_subclasses([module_doc]),
+                           recorder.messages) )
+            return out.getvalue()
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            # The main process will report the error when it parses
+            # the module itself.
+            return None
+    finally:
+        log.remove_logger(recorder)
+        _forget_worker_docs()
+
+def _apidoc_fingerprint(api_doc):
+    """
+    Return a value that will change if any of the given C{APIDoc}'s
+    attributes are modified; except for C{subclasses} (see
+    L{_new_subclasses()}) and C{submodules} (which only changes when
+    a new module is parsed).
+    """
+    fingerprint = []
+    for attrib, val in api_doc.__dict__.items():
+        if attrib in ('subclasses', 'submodules'):
+            continue
+        elif isinstance(val, dict):
+            fingerprint.append( (attrib, [(k, id(v)) for k,v in val.items()]) )
+        elif isinstance(val, list):
+            fingerprint.append( (attrib, map(id, val)) )
+        else:
+            fingerprint.append( (attrib, id(val)) )
+    fingerprint.sort()
+    return fingerprint
+
+def _new_subclasses(module_docs):
+    """
+    Return a list of C{(base_doc, new_subclasses)} pairs, where
+    C{base_doc} is a shared C{ClassDoc}, and C{new_subclasses} are
+    the classes from the given modules that have registered
+    themselves as its subclasses.
+    """
+    base_docs = {}
+    for val_doc in _reachable_apidocs(module_docs):
+        if isinstance(val_doc, ClassDoc) and val_doc.bases is not UNKNOWN:
+            for base_doc in val_doc.bases:
+                if (id(base_doc) in _shared_apidocs and
+                    isinstance(base_doc, ClassDoc) and
+                    base_doc.subclasses not in (None, UNKNOWN)):
+                    base_docs[id(base_doc)] = base_doc
+    return [(base_doc, [c for c in base_doc.subclasses
+                        if id(c) not in _shared_apidocs])
+            for base_doc in base_docs.values()]
+
+def _forget_worker_docs():
+    """
+    Restore a parse worker's state, by removing any docs that it
+    created from the parser's and introspecter's caches, and from
+    the C{submodules} and C{subclasses} lists of shared docs.  This
+    ensures that each module parsed by the worker only refers to the
+    shared docs, and not to the docs that were created while parsing
+    some other module.
+    """
+    new_docs = []
+    caches = (epydoc.docparser._moduledoc_cache,
+              epydoc.docintrospecter._valuedoc_cache)
+    for cache, initial_keys in zip(caches, _worker_cache_keys):
+        if len(cache) == len(initial_keys): continue
+        for key in cache.keys():
+            if key not in initial_keys:
+                new_docs.append(cache.pop(key))
+    
+    for val_doc in new_docs:
+        package = getattr(val_doc, 'package', None)
+        if (isinstance(package, ModuleDoc) and
+            package.submodules not in (None, UNKNOWN)):
+            package.submodules[:] = [m for m in package.submodules
+                                     if id(m) in _shared_apidocs]
+    for (base_doc, new_subclasses) in _new_subclasses(new_docs):
+        base_doc.subclasses[:] = [c for c in base_doc.subclasses
+                                  if id(c) in _shared_apidocs]
+
+def _shared_apidoc_id(obj):
+    """
+    The C{persistent_id} function for pickling a parse worker's
+    results.  Shared C{APIDoc}s (and L{UNKNOWN}) are pickled by
+    reference.
+    """
+    if obj is UNKNOWN:
+        return 'UNKNOWN'
+    if isinstance(obj, APIDoc):
+        if id(obj) in _shared_apidocs:
+            return id(obj)
+        # Don't let ValueDoc.__getstate__() compute (and pickle) the
+        # value's repr -- it depends on settings that the docwriters
+        # change, so it should be computed when the docs are written.
+        if (isinstance(obj, ValueDoc) and
+            '_ValueDoc__pickle_state' not in obj.__dict__):
+            state = obj.__dict__.copy()
+            state['pyval'] = UNKNOWN
+            obj._ValueDoc__pickle_state = state
+    return None
+
+def _shared_apidoc_load(identifier):
+    """
+    The C{persistent_load} function for unpickling a parse worker's
+    results.  See L{_shared_apidoc_id()}.
+    """
+    if identifier == 'UNKNOWN':
+        return UNKNOWN
+    try:
+        return _shared_apidocs[identifier]
+    except KeyError:
+        raise cPickle.UnpicklingError('Invalid persistent id')
+
+#/////////////////////////////////////////////////////////////////
+# Isolated Introspection
+#/////////////////////////////////////////////////////////////////
+
+INTROSPECT_WORKER_MODULES = 20
+"""The maximum number of modules that each introspection worker
+process imports before it exits (see L{_introspect_in_workers()}).
+Smaller values use less memory, since the imported modules are
+released when their worker exits; but more modules are imported more
+than once (e.g., each worker imports the packages of the modules that
+it introspects)."""
+
+_prefork_values = {}
+"""A dictionary mapping from C{id}s to the module-level values that
+existed when the introspection workers were started.  These values
+have the same C{id} in every worker, so their docs can be merged even
+if they can't be found by name (e.g., C{types.ClassType}); and their
+docs' C{pyval}s can be restored.
+@type: C{dict}"""
+
+_introspect_worker_results = {}
+"""A dictionary mapping from the filenames of modules that were
+introspected by worker processes to tuples C{(module_doc, error,
+messages)}, where C{module_doc} is the module's C{ModuleDoc} (or
+C{None} if it could not be imported), C{error} is the import error
+message, and C{messages} is the list of messages that were logged
+while introspecting it.
+@type: C{dict}"""
+
+def _introspect_in_workers(items, options):
+    """
+    Import and introspect the modules and packages in C{items} that
+    are specified by filename in worker processes; and record their
+    docs in L{_introspect_worker_results}, where
+    L{_get_docs_from_module_file()} will find them.  Items that are
+    specified by name or value are introspected by this process, as
+    usual; and so is everything if this platform can't C{fork}, since
+    the workers refer to this process's docs by C{id}.
+
+    @return: A list of the items that were not handled by the workers,
+        which should be imported by this process before they are
+        introspected (see L{_import_docs_from_items()}).
+
+    Each worker is forked from this process, imports a few modules
+    (at most L{INTROSPECT_WORKER_MODULES}), sends their pickled docs
+    back to this process, and exits.  The C{APIDoc}s that this process
+    already had when the workers were started (such as the docs for
+    builtins) are sent by reference; and so are the C{ValueDoc}s that
+    belong to some other module that is being introspected by the
+    workers, which are linked to that module's docs by their
+    canonical name (see L{_link_introspect_worker_docs()}).  If a
+    worker dies while it is importing a module, then that module's
+    import fails, and a new worker is started for its remaining
+    modules.
+    """
+    import multiprocessing.queues
+    if not hasattr(os, 'fork'):
+        return items
+    tasks = []
+    other_items = []
+    for item in items:
+        if not isinstance(item, basestring):
+            other_items.append(item)
+        elif is_module_file(item):
+            tasks += _introspect_worker_tasks(item, False, options)
+        elif is_package_dir(item):
+            tasks += _introspect_worker_tasks(os.path.join(item, '__init__'),
+                                              options.add_submodules, options)
+        else:
+            other_items.append(item)
+    if not tasks: return other_items
+
+    # The workers will inherit our docs when they are forked.
+    _register_shared_apidocs()
+    for module in sys.modules.values():
+        if module is not None:
+            for value in module.__dict__.values():
+                _prefork_values[id(value)] = value
+
+    jobs = max(1, options.jobs)
+    chunk_size = max(1, min(INTROSPECT_WORKER_MODULES,
+                            (len(tasks)+jobs-1) // jobs))
+    chunks = [tasks[i:i+chunk_size] for i in range(0, len(tasks), chunk_size)]
+    chunks.reverse()
+    module_names = set([modulename for (filename, modulename) in tasks])
+    # Results are written synchronously to a SimpleQueue, so the
+    # results that a worker sent before it died are never lost.
+    result_queue = multiprocessing.queues.SimpleQueue()
+    workers = {} # maps worker ids to (process, remaining tasks)
+    pickled_results = []
+    try:
+        while chunks or workers:
+            # Start new workers, if there's work for them to do.
+            while chunks and len(workers) < jobs:
+                chunk = chunks.pop()
+                worker = multiprocessing.Process(
+                    target=_introspect_in_worker,
+                    args=(id(chunk), chunk, module_names, result_queue))
+                worker.start()
+                workers[id(chunk)] = (worker, chunk)
+            # Wait for the next result.
+            if result_queue.empty():
+                _check_introspect_workers(workers, result_queue, chunks,
+                                          pickled_results)
+                time.sleep(0.05)
+                continue
+            (worker_id, filename, result) = result_queue.get()
+            _record_introspect_worker_result(workers, worker_id, filename,
+                                             result, pickled_results)
+            log.progress(float(len(pickled_results))/len(tasks),
+                         'Importing %s' % dict(tasks)[filename])
+    finally:
+        for (worker, chunk) in workers.values():
+            worker.terminate()
+            worker.join()
+
+    # Link the results in the order that this process would have
+    # imported the modules, so that e.g. subclasses are listed in
+    # the same order.
+    task_order = dict([(filename, i) for (i, (filename, modulename))
+                       in enumerate(tasks)])
+    pickled_results.sort(key=lambda result: task_order[result[0]])
+    try: _link_introspect_worker_docs(pickled_results)
+    finally: _prefork_values.clear()
+    return other_items
+
+def _introspect_worker_tasks(filename, add_submodules, options):
+    """
+    Return a list of C{(filename, modulename)} tuples for the module
+    with the given filename, and (if C{add_submodules} is true) for
+    the submodules of the package that it defines, that should be
+    introspected.  Each filename is normalized in the same way as by
+    L{_get_docs_from_module_file()}.
+    """
+    filename = os.path.normpath(os.path.abspath(filename))
+    try: filename = py_src_filename(filename)
+    except ValueError: pass
+
+    # Find the module's name, assuming the default __path__ for its
+    # containing packages (as get_value_from_filename() does).
+    basedir, modulename = os.path.split(os.path.splitext(filename)[0])
+    if modulename == '__init__':
+        basedir, modulename = os.path.split(basedir)
+    while is_package_dir(basedir):
+        basedir, pkg_name = os.path.split(basedir)
+        modulename = '%s.%s' % (pkg_name, modulename)
+
+    tasks = []
+    if options.must_introspect(modulename):
+        tasks.append( (filename, modulename) )
+    if add_submodules and os.path.split(filename)[1].startswith('__init__.'):
+        package_dir = os.path.split(filename)[0]
+        subpackage_dirs = []
+        for name in sorted(os.listdir(package_dir)):
+            subfilename = os.path.join(package_dir, name)
+            if (is_module_file(subfilename) and
+                os.path.splitext(name)[0] != '__init__'):
+                tasks += _introspect_worker_tasks(subfilename, False, options)
+            elif is_package_dir(subfilename):
+                subpackage_dirs.append(os.path.join(subfilename, '__init__'))
+        for subpackage_file in subpackage_dirs:
+            tasks += _introspect_worker_tasks(subpackage_file, True, options)
+
+    # Modules may be found under several file names (e.g., x.py and
+    # x.pyc); only keep the first.
+    seen = set()
+    return [task for task in tasks
+            if task[0] not in seen and not seen.add(task[0])]
+
+def _check_introspect_workers(workers, result_queue, chunks, pickled_results):
+    """
+    Check for introspection workers that have exited.  If a worker
+    exited before it sent back the results for all of its modules,
+    then record an import error for the module that it was importing,
+    and schedule its remaining modules to be introspected by a new
+    worker.
+    """
+    for worker_id, (worker, chunk) in workers.items():
+        if worker.is_alive(): continue
+        worker.join()
+        # Collect any results that it sent before it exited.
+        while not result_queue.empty():
+            (result_worker_id, filename, result) = result_queue.get()
+            _record_introspect_worker_result(workers, result_worker_id,
+                                             filename, result, pickled_results)
+        if worker_id not in workers: continue
+        del workers[worker_id]
+        if chunk:
+            error = ('The import worker process exited with code %s.' %
+                     worker.exitcode)
+            pickled_results.append( (chunk[0][0], (None, error, [])) )
+            if chunk[1:]: chunks.append(chunk[1:])
+
+def _record_introspect_worker_result(workers, worker_id, filename, result,
+                                     pickled_results):
+    """
+    Record the result for one module that was sent back by an
+    introspection worker, and the statistics for the imports that it
+    did.
+    """
+    (pickled_docs, error, messages, import_stats) = result
+    epydoc.docintrospecter._import_stats.update(import_stats)
+    pickled_results.append( (filename, (pickled_docs, error, messages)) )
+    worker, chunk = workers[worker_id]
+    del chunk[0]
+    if not chunk:
+        worker.join()
+        del workers[worker_id]
+
+def _introspect_in_worker(worker_id, tasks, module_names, result_queue):
+    """
+    The main function of an introspection worker process.  Import and
+    introspect each of the given modules, and put a tuple
+    C{(worker_id, filename, result)} for each of them on the
+    C{result_queue}, where C{result} is a tuple C{(pickled_docs,
+    error, messages, import_stats)}.  C{pickled_docs} contains the
+    module's C{ModuleDoc}, followed by the list of C{ValueDoc}s that
+    were introspected (rather than just referred to) by this worker.
+    C{import_stats} contains the statistics for the imports that were
+    done while introspecting the module (see
+    L{epydoc.docintrospecter.import_stats()}).
+    """
+    del log._loggers[:]
+    for (filename, modulename) in tasks:
+        recorder = log.RecordingLogger()
+        log.register_logger(recorder)
+        epydoc.docintrospecter.clear_import_stats()
+        pickled_docs = error = None
+        try:
+            try:
+                module_doc = introspect_docs(filename=filename)
+                pickled_docs = _pickle_introspect_worker_docs(
+                    module_doc, modulename, module_names)
+            except KeyboardInterrupt:
+                raise
+            except ImportError, e:
+                error = str(e)
+            except Exception, e:
+                error = '%s: %s' % (e.__class__.__name__, e)
+        finally:
+            log.remove_logger(recorder)
+        result_queue.put( (worker_id, filename,
+                           (pickled_docs, error, recorder.messages,
+                            epydoc.docintrospecter._import_stats)) )
+
+def _pickle_introspect_worker_docs(module_doc, modulename, module_names):
+    """
+    Return a pickled copy of the given C{ModuleDoc}, followed by a
+    list of C{(val_doc, key, is_introspected)} tuples for the
+    C{ValueDoc}s in that copy, where C{key} is the value's key (see
+    L{_introspect_worker_value_key()}), and C{is_introspected} is
+    true if the value was introspected by this worker (rather than
+    just referred to); and by the list of names in the module's
+    C{__all__} (or C{None}).  See L{_introspect_in_workers()}.
+    """
+    valuedoc_cache = epydoc.docintrospecter._valuedoc_cache
+    introspected_values = epydoc.docintrospecter._introspected_values
+    copied_docs = {}
+    copied_doc_list = [] # in the order they were pickled
+    
+    def persistent_id(obj):
+        if obj is UNKNOWN:
+            return 'UNKNOWN'
+        if not isinstance(obj, APIDoc):
+            return None
+        if id(obj) in _shared_apidocs:
+            return id(obj)
+        if isinstance(obj, ValueDoc) and id(obj) not in copied_docs:
+            owner = _introspected_module_name(obj.canonical_name,
+                                              module_names)
+            if (owner not in (None, modulename) and
+                _introspect_worker_value_key(obj) == obj.canonical_name):
+                return ('name', str(obj.canonical_name))
+            # The pyval itself can't be sent; so send a picklable
+            # stand-in for it, and let this process compute its
+            # reprs (with the settings that the docwriter uses).
+            state = obj.__getstate__()
+            if not isinstance(obj, (NamespaceDoc, RoutineDoc, PropertyDoc)):
+                state['pyval'] = _picklable_pyval(obj.pyval)
+                if state['pyval'] is not UNKNOWN:
+                    state.pop('_ValueDoc__pyval_repr', None)
+                    state.pop('_ValueDoc__summary_pyval_repr', None)
+            copied_docs[id(obj)] = obj
+            copied_doc_list.append(obj)
+        return None
+
+    out = cStringIO.StringIO()
+    pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(module_doc)
+    docs = []
+    for val_doc in copied_doc_list:
+        is_introspected = (id(val_doc.pyval) in introspected_values and
+                           valuedoc_cache.get(id(val_doc.pyval)) is val_doc)
+        docs.append( (val_doc, _introspect_worker_value_key(val_doc),
+                      is_introspected) )
+    pickler.dump(docs)
+    # The module's public names are needed to set the public/private
+    # status of any submodules that it hasn't imported.
+    public_names = None
+    try:
+        public_names = [str(name) for name in
+                        sys.modules[modulename].__all__]
+    except KeyboardInterrupt: raise
+    except: pass
+    pickler.dump(public_names)
+    for val_doc in copied_doc_list:
+        del val_doc._ValueDoc__pickle_state
+    return out.getvalue()
+
+def _introspect_worker_value_key(val_doc):
+    """
+    Return a key that identifies the value described by C{val_doc} in
+    every introspection worker, or C{None} if there is none.  The key
+    is:
+      - The value's canonical name, if looking up that name gives the
+        value.
+      - C{('id', id(value))}, if the value existed before the workers
+        were started (see L{_prefork_values}).
+      - For functions and classes, a tuple describing where they are
+        defined.  (This identifies e.g. nested classes, whose canonical
+        name does not lead back to them.)
+    """
+    pyval = val_doc.pyval
+    if pyval is UNKNOWN: return None
+    name = val_doc.canonical_name
+    if isinstance(name, DottedName) and _value_with_name(name) is pyval:
+        return name
+    if id(pyval) in _prefork_values:
+        return ('id', id(pyval))
+    try:
+        if isinstance(pyval, types.FunctionType):
+            code = pyval.func_code
+            return ('function', code.co_filename, code.co_firstlineno,
+                    code.co_name)
+        if isinstance(pyval, (type, types.ClassType)):
+            return ('class', str(pyval.__module__), str(pyval.__name__),
+                    tuple(sorted(pyval.__dict__)))
+    except KeyboardInterrupt: raise
+    except: pass
+    return None
+
+def _value_with_name(name):
+    """
+    Return the value that has the given dotted name, by looking up
+    the longest prefix of C{name} that names a module in
+    C{sys.modules}, and then looking up the rest of the name's
+    identifiers as attributes; or return C{None} if no value has
+    that name.
+    """
+    for i in range(len(name), 0, -1):
+        value = sys.modules.get(str(name[:i]))
+        if value is not None:
+            try:
+                for identifier in name[i:]:
+                    value = getattr(value, identifier)
+            except KeyboardInterrupt: raise
+            except: return None
+            return value
+    return None
+
+def _introspected_module_name(name, module_names):
+    """
+    Return the longest prefix of C{name} that is in C{module_names};
+    or C{None} if there is none.
+    """
+    if not isinstance(name, DottedName): return None
+    for i in range(len(name), 0, -1):
+        prefix = str(name[:i])
+        if prefix in module_names:
+            return prefix
+    return None
+
+PICKLED_PYVAL_MAXSIZE = 10000
+"""The maximum number of elements in a value (including the elements
+of nested containers) that an introspection worker sends a stand-in
+for (see L{_picklable_pyval()})."""
+
+def _picklable_pyval(pyval):
+    """
+    Return a picklable value that can stand in for C{pyval} in the
+    docs that an introspection worker sends back; or C{UNKNOWN} if
+    C{pyval} has more than L{PICKLED_PYVAL_MAXSIZE} elements.  Plain
+    data (numbers, strings and regexps) is sent as-is; the builtin
+    containers are copied; and any other value is replaced by a
+    L{_PyvalRepr} of its C{repr}.  So C{colorize_pyval()} gives the
+    same result for the stand-in as for the value itself.
+    """
+    try:
+        return _pyval_stand_in(pyval, [PICKLED_PYVAL_MAXSIZE])
+    except ValueError:
+        return UNKNOWN
+
+def _pyval_stand_in(pyval, budget):
+    """
+    Helper for L{_picklable_pyval()}: return a stand-in for
+    C{pyval}, or raise a C{ValueError} if it has more elements than
+    C{budget[0]}.  Subclasses of the builtin types are not copied,
+    since C{colorize_pyval()} uses their C{repr}.
+    """
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise ValueError('value too large')
+    pyval_type = type(pyval)
+    if (pyval_type in (str, unicode, int, long, float, complex, bool,
+                       type(None)) or
+        epydoc.markup.pyval_repr.is_re_pattern(pyval)):
+        return pyval
+    elif pyval_type in (list, tuple, set, frozenset):
+        return pyval_type([_pyval_stand_in(elt, budget) for elt in pyval])
+    elif pyval_type is dict:
+        return dict([(_pyval_stand_in(key, budget),
+                      _pyval_stand_in(val, budget))
+                     for (key, val) in pyval.items()])
+    try:
+        pyval_repr = repr(pyval)
+        if not isinstance(pyval_repr, (str, unicode)):
+            pyval_repr = unicode(pyval_repr)
+    except KeyboardInterrupt: raise
+    except: pyval_repr = None
+    return _PyvalRepr(pyval_repr)
+
+class _PyvalRepr(object):
+    """
+    A stand-in for a value that an introspection worker can't send
+    back, whose C{repr} is the value's C{repr} (or that raises a
+    C{ValueError} if the value's C{repr} failed).
+    """
+    def __init__(self, pyval_repr):
+        self.pyval_repr = pyval_repr
+    def __repr__(self):
+        if self.pyval_repr is None:
+            raise ValueError('repr failed')
+        return self.pyval_repr
+
+def _link_introspect_worker_docs(pickled_results):
+    """
+    Unpickle the docs that were sent back by the introspection
+    workers, link them together, and record them in
+    L{_introspect_worker_results}.
+
+    Each worker sends its own copies of the C{ValueDoc}s that don't
+    belong to the module that it introspected (e.g., for values that
+    are imported from modules that are not being documented); and
+    refers to the C{ValueDoc}s that belong to the other introspected
+    modules by name.  These copies and references are merged into a
+    single C{ValueDoc} for each value, preferring the docs that were
+    introspected over the ones that were just referred to.  (Values
+    are identified by the keys described in
+    L{_pickle_introspect_worker_docs()}; values that have no key, such
+    as decorated functions whose canonical name does not lead back to
+    them, are not merged.)  Every merged doc is then replaced by the
+    main doc that it was merged with, so that each value is described
+    by a single object.  Finally, the C{submodules} and C{subclasses}
+    lists, which each worker could only update in its own copies, are
+    updated.
+    """
+    references = {}
+    def persistent_load(identifier):
+        if isinstance(identifier, tuple):
+            name = identifier[1]
+            if name not in references:
+                references[name] = ValueDoc(canonical_name=DottedName(name),
+                                            docs_extracted_by='introspecter')
+            return references[name]
+        return _shared_apidoc_load(identifier)
+
+    copied_docs = []
+    public_names = {} # maps module names to their __all__ lists
+    for (filename, (pickled_docs, error, messages)) in pickled_results:
+        if pickled_docs is None:
+            _introspect_worker_results[filename] = (None, error, messages)
+            continue
+        unpickler = cPickle.Unpickler(cStringIO.StringIO(pickled_docs))
+        unpickler.persistent_load = persistent_load
+        module_doc = unpickler.load()
+        copied_docs += unpickler.load()
+        public_names[str(module_doc.canonical_name)] = unpickler.load()
+        _introspect_worker_results[filename] = (module_doc, None, messages)
+
+    # Merge the docs for the same value.  The values that existed
+    # before the workers were started are also available here; so
+    # restore their pyvals.
+    docs_by_key = {}
+    for introspected in (True, False):
+        for (val_doc, key, is_introspected) in copied_docs:
+            if key is not None and is_introspected == introspected:
+                main_doc = docs_by_key.setdefault(key, val_doc)
+                main_doc.merge_and_overwrite(val_doc, ignore_hash_conflict=True)
+                if isinstance(key, tuple) and key[0] == 'id':
+                    main_doc.pyval = _prefork_values[key[1]]
+    for (name, val_doc) in references.items():
+        main_doc = docs_by_key.get(DottedName(name))
+        if main_doc is not None:
+            main_doc.merge_and_overwrite(val_doc, ignore_hash_conflict=True)
+
+    # The merged docs share their instance dictionary; but they are
+    # still distinct objects, and some checks (e.g., whether a value
+    # is its container's variable's value) compare docs by identity.
+    # So replace every merged doc by its main doc.
+    main_docs = {}
+    for main_doc in docs_by_key.values():
+        main_docs.setdefault(id(main_doc.__dict__), main_doc)
+    roots = [module_doc for (module_doc, error, messages)
+             in _introspect_worker_results.values()]
+    roots += [val_doc for (val_doc, key, is_introspected) in copied_docs]
+    _replace_merged_apidocs(roots, main_docs)
+    for filename, (module_doc, error, messages) in \
+            _introspect_worker_results.items():
+        if module_doc is not None:
+            module_doc = main_docs.get(id(module_doc.__dict__), module_doc)
+            _introspect_worker_results[filename] = (module_doc, error,
+                                                    messages)
+
+    # Update the submodules and subclasses lists.  A package's
+    # submodules are also variables of the package (once they have
+    # been imported); but a worker may not have imported them.  As
+    # when they are introspected, their public/private status is
+    # given by the package's __all__.
+    listed = {}
+    def add_to_list(val_doc, val_docs):
+        ids = listed.get(id(val_docs))
+        if ids is None:
+            ids = listed[id(val_docs)] = set([id(d.__dict__) for d in val_docs])
+        if id(val_doc.__dict__) not in ids:
+            ids.add(id(val_doc.__dict__))
+            val_docs.append(val_doc)
+    for (val_doc, key, is_introspected) in copied_docs:
+        val_doc = main_docs.get(id(val_doc.__dict__), val_doc)
+        if (isinstance(val_doc, ModuleDoc) and
+            isinstance(val_doc.package, ModuleDoc) and
+            isinstance(val_doc.package.submodules, list)):
+            add_to_list(val_doc, val_doc.package.submodules)
+            package_vars = val_doc.package.variables
+            name = val_doc.canonical_name
+            if (isinstance(package_vars, dict) and
+                isinstance(name, DottedName) and name[-1] not in package_vars):
+                var_doc = package_vars[name[-1]] = VariableDoc(
+                    name=name[-1], value=val_doc, is_imported=True,
+                    container=val_doc.package,
+                    docs_extracted_by='introspecter')
+                package_public_names = public_names.get(
+                    str(val_doc.package.canonical_name))
+                if package_public_names is not None:
+                    var_doc.is_public = name[-1] in package_public_names
+                    if var_doc.is_public:
+                        var_doc.is_imported = False
+        if isinstance(val_doc, ClassDoc) and isinstance(val_doc.bases, list):
+            for base_doc in val_doc.bases:
+                if (isinstance(base_doc, ClassDoc) and
+                    isinstance(base_doc.subclasses, list)):
+                    add_to_list(val_doc, base_doc.subclasses)
+
+def _replace_merged_apidocs(roots, main_docs):
+    """
+    Replace each C{APIDoc} that can be reached from the given list of
+    values (by following C{APIDoc} attributes and the lists, tuples
+    and dictionaries that contain them, but not passing through any
+    of the L{_shared_apidocs}) by the main doc that it was merged
+    with, if any.
+    
+    @param main_docs: A dictionary mapping from the C{id} of each
+        main doc's instance dictionary to the main doc.
+    """
+    def replacement(val):
+        if isinstance(val, APIDoc):
+            return main_docs.get(id(val.__dict__), val)
+        elif isinstance(val, tuple):
+            new_val = tuple([replacement(elt) for elt in val])
+            if [e1 for (e1, e2) in zip(val, new_val) if e1 is not e2]:
+                return new_val
+        return val
+    
+    seen = set()
+    queue = list(roots)
+    while queue:
+        val = queue.pop()
+        if id(val) in seen or id(val) in _shared_apidocs: continue
+        seen.add(id(val))
+        if isinstance(val, APIDoc):
+            # The pyval & toktree can be large, and never contain
+            # APIDocs; and the mergeset must list every merged doc.
+            items = [(attrib, attrib_val) for (attrib, attrib_val)
+                     in val.__dict__.items()
+                     if attrib not in ('pyval', 'toktree',
+                                       '_APIDoc__mergeset')]
+            container = val.__dict__
+        elif isinstance(val, list):
+            items = list(enumerate(val))
+            container = val
+        elif isinstance(val, dict):
+            items = val.items()
+            container = val
+        elif isinstance(val, tuple):
+            queue.extend(val)
+            continue
+        else:
+            continue
+        for (key, elt) in items:
+            new_elt = replacement(elt)
+            if new_elt is not elt:
+                container[key] = new_elt
+            queue.append(new_elt)
+
+def _collect_introspect_worker_docs(filename):
+    """
+    If the module with the given filename was introspected by a worker
+    process, then report any messages that were logged while
+    introspecting it, and return its C{ModuleDoc}; or raise an
+    C{ImportError} if it could not be imported.  Otherwise, return
+    C{None}.
+    """
+    result = _introspect_worker_results.pop(filename, None)
+    if result is None: return None
+    module_doc, error, messages = result
+    log.replay_messages(messages)
+    if module_doc is None:
+        raise ImportError(error)
+    return module_doc
+
+#/////////////////////////////////////////////////////////////////
+# Parallel Docstring Parsing
+#/////////////////////////////////////////////////////////////////
+
+def _preparse_docstrings(valdocs, docindex, options):
+    """
+    Use a pool of worker processes to parse the docstrings of the
+    given values and of their variables, and store the results in
+    L{epydoc.docstringparser._preparsed_docstrings}, where
+    L{parse_docstring()} will find them.  The workers only run the
+    markup parser; everything that depends on the rest of the docs
+    (processing fields, extracting summaries, and reporting errors)
+    is still done by the main process, in the same order as for a
+    serial build.  If the docstrings should not be parsed in
+    parallel, then do nothing.
+    """
+    if multiprocessing is None or options.jobs <= 1:
+        return
+
+    # Decide which docstrings should be parsed.  These are the same
+    # (docstring, docformat) pairs that parse_docstring() will pass to
+    # the markup parser; if we guess wrong, then parse_docstring()
+    # just parses the docstring itself.
+    keys = []
+    seen = set()
+    docformats = {}
+    for val_doc in valdocs:
+        api_docs = [(val_doc, val_doc)]
+        if (isinstance(val_doc, NamespaceDoc) and
+            val_doc.variables not in (None, UNKNOWN)):
+            for var_doc in val_doc.variables.values():
+                api_docs.append( (var_doc, var_doc) )
+                # The value may get its defining module from val_doc.
+                if (isinstance(var_doc.value, ValueDoc) and
+                    var_doc.value.defining_module is UNKNOWN):
+                    api_docs.append( (var_doc.value, val_doc) )
+        for (api_doc, docformat_source) in api_docs:
+            docformat = get_docformat(docformat_source, docindex)
+            if docformat not in docformats:
+                docformats[docformat] = _can_preparse(docformat)
+            if not docformats[docformat]: continue
+            key = epydoc.docstringparser._parse_key(api_doc, docformat)
+            if key is not None and key not in seen:
+                seen.add(key)
+                keys.append(key)
+    if len(keys) < 2:
+        return
+
+    pool = multiprocessing.Pool(min(options.jobs, len(keys)),
+                                _init_parse_worker)
+    try:
+        results = pool.map(_preparse_docstring_in_worker, keys)
+    finally:
+        # Don't use pool.terminate(); see _stop_parse_workers().
+        pool.close()
+        pool.join()
+    preparsed_docstrings = epydoc.docstringparser._preparsed_docstrings
+    for (key, pickled_result) in zip(keys, results):
+        if pickled_result is not None:
+            preparsed_docstrings[key] = pickled_result
+
+def _can_preparse(docformat):
+    """
+    Return true if docstrings written in the given markup language
+    can be parsed by worker processes.  This is the case if the
+    markup language is supported, and its parser can be imported.
+    Otherwise, the main process parses those docstrings itself, so
+    that it can report the problem.
+    """
+    parse_func = epydoc.markup._markup_language_registry.get(docformat)
+    if isinstance(parse_func, basestring):
+        try: __import__(parse_func)
+        except KeyboardInterrupt: raise
+        except: return False
+    return parse_func is not None
+
+def _preparse_docstring_in_worker( (docstring, docformat) ):
+    """
+    Parse the given docstring (in a worker process), and return a
+    pickled tuple C{(descr, fields, parse_errors, messages)}, where
+    C{messages} is the list of messages that were logged while
+    parsing it.  If the docstring could not be parsed, then return
+    C{None}; in that case, the main process will parse it itself.
+    """
+    recorder = log.RecordingLogger()
+    log.register_logger(recorder)
+    try:
+        try:
+            parse_errors = []
+            parsed_docstring = epydoc.markup.parse(docstring, docformat,
+                                                   parse_errors)
+            descr, fields = parsed_docstring.split_fields(parse_errors)
+            return cPickle.dumps( (descr, fields, parse_errors,
+                                   recorder.messages),
+                                  cPickle.HIGHEST_PROTOCOL )
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            return None
+    finally:
+        log.remove_logger(recorder)
+
 #/////////////////////////////////////////////////////////////////
 # Progress Estimation (for Documentation Generation)
 #/////////////////////////////////////////////////////////////////
@@ -808,7 +1979,10 @@ def register_attribute_mergefunc(attrib, mergefunc):
     If the merge function needs to call C{merge_docs}, then it should
     pass C{cyclecheck} and C{path} back in.  (When appropriate, a
     suffix should be added to C{path} to describe the path taken to
-    the merged values.)
+    the merged values.)  In that case, C{merge_docs} returns the
+    C{APIDoc} that the two values will be merged into, but their
+    attributes may not be merged until the outermost call to
+    C{merge_docs} returns.
     """
     _attribute_mergefunc_registry[attrib] = mergefunc
 
@@ -846,6 +2020,14 @@ def merge_docs(introspect_doc, parse_doc, cyclecheck=None, path=None):
     the value of L{DEFAULT_MERGE_PRECEDENCE}.  The two input
     C{APIDoc}s will not be merged or modified in any way.
 
+    Merging uses an explicit worklist rather than recursion: when an
+    attribute merge function calls C{merge_docs()} for a pair of
+    contained C{APIDoc}s, the pair is checked for compatibility
+    immediately, but its attributes are merged later, by the
+    outermost call.  So the depth of the documented code does not
+    affect the depth of the Python stack, and each pair of
+    C{APIDoc}s is visited exactly once.
+
     @param cyclecheck, path: These arguments should only be provided
         when C{merge_docs()} is called by an attribute merge
         function.  See L{register_attribute_mergefunc()} for more
@@ -854,93 +2036,167 @@ def merge_docs(introspect_doc, parse_doc, cyclecheck=None, path=None):
     assert isinstance(introspect_doc, APIDoc)
     assert isinstance(parse_doc, APIDoc)
 
-    if cyclecheck is None:
-        cyclecheck = set()
+    # If we're being called from an attribute merge function, then
+    # just queue the pair; the outermost call will merge it.
+    if isinstance(cyclecheck, _MergeWorklist):
+        return cyclecheck.add_pair(introspect_doc, parse_doc, path)
+
+    if path is None:
         if introspect_doc.canonical_name not in (None, UNKNOWN):
-            path = '%s' % introspect_doc.canonical_name
+            path = _MergePath(introspect_doc.canonical_name)
         elif parse_doc.canonical_name not in (None, UNKNOWN):
-            path = '%s' % parse_doc.canonical_name
+            path = _MergePath(parse_doc.canonical_name)
         else:
-            path = '??'
+            path = _MergePath('??')
 
-    # If we've already examined this pair, then there's nothing
-    # more to do.  The reason that we check id's here is that we
-    # want to avoid hashing the APIDoc objects for now, so we can
-    # use APIDoc.merge_and_overwrite() later.
-    if (id(introspect_doc), id(parse_doc)) in cyclecheck:
-        return introspect_doc
-    cyclecheck.add( (id(introspect_doc), id(parse_doc)) )
+    worklist = _MergeWorklist(cyclecheck or ())
+    merged_doc = worklist.add_pair(introspect_doc, parse_doc, path)
+    worklist.run()
+    if cyclecheck is not None:
+        cyclecheck.update(worklist)
+    return merged_doc
 
-    # If these two are already merged, then we're done.  (Two
-    # APIDoc's compare equal iff they are identical or have been
-    # merged.)
-    if introspect_doc == parse_doc:
-        return introspect_doc
+class _MergeWorklist(set):
+    """
+    The C{cyclecheck} value used by L{merge_docs()}.  This is the set
+    of C{(id(introspect_doc), id(parse_doc))} pairs that have already
+    been examined, along with a stack of compatible pairs whose
+    attributes have not been merged yet.  (Pairs are identified by
+    id, since we want to avoid hashing the APIDoc objects, so we can
+    use APIDoc.merge_and_overwrite() later.)
+    """
+    def __init__(self, pairs=()):
+        set.__init__(self, pairs)
+        self.pending = []
+        """A list of C{(introspect_doc, parse_doc, path)} tuples for
+        the pairs whose attributes still need to be merged."""
 
-    # If both values are GenericValueDoc, then we don't want to merge
-    # them.  E.g., we don't want to merge 2+2 with 4.  So just copy
-    # the parse_doc's parse_repr to introspect_doc, & return it.
-    # (In particular, do *not* call merge_and_overwrite.)
-    if type(introspect_doc) == type(parse_doc) == GenericValueDoc:
-        if parse_doc.parse_repr is not UNKNOWN:
-            introspect_doc.parse_repr = parse_doc.parse_repr
-        introspect_doc.docs_extracted_by = 'both'
-        return introspect_doc
+    def add_pair(self, introspect_doc, parse_doc, path):
+        """
+        Check whether C{introspect_doc} and C{parse_doc} can be
+        merged; and if so, add them to the stack of pending pairs.
+        
+        @return: The C{APIDoc} that will describe the object once the
+            worklist has been run.
+        """
+        # If we've already examined this pair, then there's nothing
+        # more to do.
+        pair = (id(introspect_doc), id(parse_doc))
+        if pair in self:
+            return introspect_doc
+        self.add(pair)
 
-    # Perform several sanity checks here -- if we accidentally
-    # merge values that shouldn't get merged, then bad things can
-    # happen.
-    mismatch = None
-    if (introspect_doc.__class__ != parse_doc.__class__ and
-        not (issubclass(introspect_doc.__class__, parse_doc.__class__) or
-             issubclass(parse_doc.__class__, introspect_doc.__class__))):
-        mismatch = ("value types don't match -- i=%r, p=%r." %
-                    (introspect_doc.__class__, parse_doc.__class__))
-    if (isinstance(introspect_doc, ValueDoc) and
-        isinstance(parse_doc, ValueDoc)):
-        if (introspect_doc.pyval is not UNKNOWN and
-            parse_doc.pyval is not UNKNOWN and
-            introspect_doc.pyval is not parse_doc.pyval):
-            mismatch = "values don't match."
-        elif (introspect_doc.canonical_name not in (None, UNKNOWN) and
-            parse_doc.canonical_name not in (None, UNKNOWN) and
-            introspect_doc.canonical_name != parse_doc.canonical_name):
-            mismatch = "canonical names don't match."
-    if mismatch is not None:
-        log.info("Not merging the parsed & introspected values of %s, "
-                 "since their %s" % (path, mismatch))
-        if DEFAULT_MERGE_PRECEDENCE == 'introspect':
+        # If these two are already merged, then we're done.  (Two
+        # APIDoc's compare equal iff they are identical or have been
+        # merged.)
+        if introspect_doc.__dict__ is parse_doc.__dict__:
             return introspect_doc
-        else:
-            return parse_doc
-
-    # If one apidoc's class is a superclass of the other's, then
-    # specialize it to the more specific class.
-    if introspect_doc.__class__ is not parse_doc.__class__:
-        if issubclass(introspect_doc.__class__, parse_doc.__class__):
-            parse_doc.specialize_to(introspect_doc.__class__)
-        if issubclass(parse_doc.__class__, introspect_doc.__class__):
-            introspect_doc.specialize_to(parse_doc.__class__)
-    assert introspect_doc.__class__ is parse_doc.__class__
-
-    # The posargs and defaults are tied together -- if we merge
-    # the posargs one way, then we need to merge the defaults the
-    # same way.  So check them first.  (This is a minor hack)
-    if (isinstance(introspect_doc, RoutineDoc) and
-        isinstance(parse_doc, RoutineDoc)):
-        _merge_posargs_and_defaults(introspect_doc, parse_doc, path)
-    
-    # Merge the two api_doc's attributes.
-    for attrib in set(introspect_doc.__dict__.keys() +
-                      parse_doc.__dict__.keys()):
-        # Be sure not to merge any private attributes (especially
-        # __mergeset or __has_been_hashed!)
-        if attrib.startswith('_'): continue
-        merge_attribute(attrib, introspect_doc, parse_doc,
-                             cyclecheck, path)
-
-    # Set the dictionaries to be shared.
-    return introspect_doc.merge_and_overwrite(parse_doc)
+
+        # If both values are GenericValueDoc, then we don't want to
+        # merge them.  E.g., we don't want to merge 2+2 with 4.  So
+        # just copy the parse_doc's parse_repr to introspect_doc, &
+        # return it.  (In particular, do *not* call
+        # merge_and_overwrite.)
+        if type(introspect_doc) == type(parse_doc) == GenericValueDoc:
+            if parse_doc.parse_repr is not UNKNOWN:
+                introspect_doc.parse_repr = parse_doc.parse_repr
+            introspect_doc.docs_extracted_by = 'both'
+            return introspect_doc
+
+        # Perform several sanity checks here -- if we accidentally
+        # merge values that shouldn't get merged, then bad things can
+        # happen.
+        mismatch = None
+        if (introspect_doc.__class__ != parse_doc.__class__ and
+            not (issubclass(introspect_doc.__class__, parse_doc.__class__) or
+                 issubclass(parse_doc.__class__, introspect_doc.__class__))):
+            mismatch = ("value types don't match -- i=%r, p=%r." %
+                        (introspect_doc.__class__, parse_doc.__class__))
+        if (isinstance(introspect_doc, ValueDoc) and
+            isinstance(parse_doc, ValueDoc)):
+            if (introspect_doc.pyval is not UNKNOWN and
+                parse_doc.pyval is not UNKNOWN and
+                introspect_doc.pyval is not parse_doc.pyval):
+                mismatch = "values don't match."
+            elif (introspect_doc.canonical_name not in (None, UNKNOWN) and
+                parse_doc.canonical_name not in (None, UNKNOWN) and
+                introspect_doc.canonical_name != parse_doc.canonical_name):
+                mismatch = "canonical names don't match."
+        if mismatch is not None:
+            log.info("Not merging the parsed & introspected values of %s, "
+                     "since their %s" % (path, mismatch))
+            if DEFAULT_MERGE_PRECEDENCE == 'introspect':
+                return introspect_doc
+            else:
+                return parse_doc
+
+        # If one apidoc's class is a superclass of the other's, then
+        # specialize it to the more specific class.
+        if introspect_doc.__class__ is not parse_doc.__class__:
+            if issubclass(introspect_doc.__class__, parse_doc.__class__):
+                parse_doc.specialize_to(introspect_doc.__class__)
+            if issubclass(parse_doc.__class__, introspect_doc.__class__):
+                introspect_doc.specialize_to(parse_doc.__class__)
+        assert introspect_doc.__class__ is parse_doc.__class__
+
+        # The posargs and defaults are tied together -- if we merge
+        # the posargs one way, then we need to merge the defaults the
+        # same way.  So check them first.  (This is a minor hack)
+        if (isinstance(introspect_doc, RoutineDoc) and
+            isinstance(parse_doc, RoutineDoc)):
+            _merge_posargs_and_defaults(introspect_doc, parse_doc, path)
+
+        # The two docs will be merged into introspect_doc once their
+        # attributes have been merged.
+        self.pending.append( (introspect_doc, parse_doc, path) )
+        return introspect_doc
+
+    def run(self):
+        """
+        Merge the attributes of each pending pair, until no pairs
+        are left.  Attribute merge functions may add new pairs to
+        the worklist while it is running.
+        """
+        pending = self.pending
+        while pending:
+            introspect_doc, parse_doc, path = pending.pop()
+
+            # Merge the two api_doc's attributes.
+            for attrib in set(introspect_doc.__dict__.keys() +
+                              parse_doc.__dict__.keys()):
+                # Be sure not to merge any private attributes (especially
+                # __mergeset or __has_been_hashed!)
+                if attrib.startswith('_'): continue
+                merge_attribute(attrib, introspect_doc, parse_doc,
+                                self, path)
+
+            # Set the dictionaries to be shared.
+            introspect_doc.merge_and_overwrite(parse_doc)
+
+class _MergePath(object):
+    """
+    The C{path} value used by L{merge_docs()}: a description of the
+    path taken from the root to the docs being merged, which is only
+    converted to a string if it's used in a log message.  Adding a
+    string to a C{_MergePath} returns a new C{_MergePath} in constant
+    time, without copying the path.
+    """
+    __slots__ = ('parent', 'suffix')
+    def __init__(self, suffix, parent=None):
+        self.suffix = suffix
+        self.parent = parent
+    def __add__(self, suffix):
+        return _MergePath(suffix, self)
+    def __str__(self):
+        pieces = []
+        path = self
+        while path is not None:
+            pieces.append('%s' % path.suffix)
+            path = path.parent
+        pieces.reverse()
+        return ''.join(pieces)
+    def __repr__(self):
+        return '<_MergePath %s>' % self
 
 def _merge_posargs_and_defaults(introspect_doc, parse_doc, path):
     # If either is unknown, then let merge_attrib handle it.
@@ -969,20 +2225,17 @@ def merge_attribute(attrib, introspect_doc, parse_doc, cyclecheck, path):
     precedence = MERGE_PRECEDENCE.get(attrib, DEFAULT_MERGE_PRECEDENCE)
     if precedence not in ('parse', 'introspect'):
         raise ValueError('Bad precedence value %r' % precedence)
-    
-    if (getattr(introspect_doc, attrib) is UNKNOWN and
-        getattr(parse_doc, attrib) is not UNKNOWN):
-        setattr(introspect_doc, attrib, getattr(parse_doc, attrib))
-    elif (getattr(introspect_doc, attrib) is not UNKNOWN and
-          getattr(parse_doc, attrib) is UNKNOWN):
-        setattr(parse_doc, attrib, getattr(introspect_doc, attrib))
-    elif (getattr(introspect_doc, attrib) is UNKNOWN and
-          getattr(parse_doc, attrib) is UNKNOWN):
+
+    introspect_val = getattr(introspect_doc, attrib)
+    parse_val = getattr(parse_doc, attrib)
+    if introspect_val is UNKNOWN and parse_val is not UNKNOWN:
+        setattr(introspect_doc, attrib, parse_val)
+    elif introspect_val is not UNKNOWN and parse_val is UNKNOWN:
+        setattr(parse_doc, attrib, introspect_val)
+    elif introspect_val is UNKNOWN and parse_val is UNKNOWN:
         pass
     else:
         # Both APIDoc objects have values; we need to merge them.
-        introspect_val = getattr(introspect_doc, attrib)
-        parse_val = getattr(parse_doc, attrib)
         if attrib in _attribute_mergefunc_registry:
             handler = _attribute_mergefunc_registry[attrib]
             merged_val = handler(introspect_val, parse_val, precedence,
@@ -1213,7 +2466,7 @@ def assign_canonical_names(val_doc, name, docindex, score=0):
     if isinstance(val_doc, NamespaceDoc):
         for var_doc in val_doc.variables.values():
             # Set the variable's canonical name.
-            varname = DottedName(name, var_doc.name)
+            varname = DottedName.intern(name, var_doc.name)
             var_doc.canonical_name = varname
 
             # If the value is unknown, or is a generic value doc, then
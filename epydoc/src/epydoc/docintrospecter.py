@@ -25,7 +25,7 @@ __docformat__ = 'epytext en'
 ## Imports
 ######################################################################
 
-import inspect, re, sys, os.path, imp
+import inspect, re, sys, os.path, imp, time, signal
 # API documentation encoding:
 from epydoc.apidoc import *
 # Type comparisons:
@@ -36,6 +36,8 @@ from epydoc import log
 from epydoc.util import *
 # For extracting encoding for docstrings:
 import epydoc.docparser
+# For finding docstring line numbers:
+from epydoc.sourcecache import get_source_file
 # Builtin values
 import __builtin__
 # Backwards compatibility
@@ -59,6 +61,24 @@ _introspected_values = {}
 """A record which values we've introspected, encoded as a dictionary from
 pyid to C{bool}."""
 
+_name_index = {}
+"""A reverse index from values to their canonical names, which is
+used by L{get_canonical_name()}.  It maps the pyid of each class and
+function that is defined at the top level of an introspected module
+to a tuple C{(value, module, name, canonical_name)}, where C{name}
+is the variable that the module uses for the value (and the value's
+C{__name__}).  See L{_index_module_names()}."""
+
+_globals_index = {}
+"""An index from the pyid of each module's C{__dict__} to the module,
+which is used by L{_find_function_module()} to find the module that
+defines a function from the function's globals.  It is updated by
+L{_index_module_globals()} when new modules are imported."""
+
+_globals_index_size = [0]
+"""The number of entries in C{sys.modules} when L{_globals_index} was
+last updated."""
+
 def clear_cache():
     """
     Discard any cached C{APIDoc} values that have been computed for
@@ -66,6 +86,9 @@ def clear_cache():
     """
     _valuedoc_cache.clear()
     _introspected_values.clear()
+    _name_index.clear()
+    _globals_index.clear()
+    _globals_index_size[0] = 0
 
 ######################################################################
 ## Introspection
@@ -181,6 +204,19 @@ def _get_valuedoc(value):
 # Module Introspection
 #////////////////////////////////////////////////////////////
 
+EXPORTS_ONLY = None
+"""A regular expression matching the dotted names of the modules
+whose exports are the only variables that should be introspected; or
+C{None} to introspect all variables of all modules.  In these modules,
+and in the classes that they define, a variable's value is only
+introspected if the variable is listed in its container's C{__all__}
+attribute, or (if there is no C{__all__}) if the variable's name is
+public.  The other variables get placeholder C{ValueDoc}s (see
+L{_get_placeholder_valuedoc()}), which are not introspected unless the
+same value is introspected elsewhere (e.g., as a base class, or as a
+variable that another module exports).
+@type: C{regexp} or C{str}"""
+
 #: A list of module variables that should not be included in a
 #: module's API documentation.
 UNDOCUMENTED_MODULE_VARS = (
@@ -214,6 +250,10 @@ def introspect_module(module, module_doc, module_name=None, preliminary=False):
     module_doc.variables = {}
     if preliminary: return
 
+    # Index the names of the classes & functions that the module
+    # defines, for get_canonical_name().
+    _index_module_names(module)
+
     # Record the module's docstring
     if hasattr(module, '__doc__'):
         module_doc.docstring = get_docstring(module)
@@ -260,6 +300,7 @@ def introspect_module(module, module_doc, module_name=None, preliminary=False):
 
     # Record the module's variables.
     module_doc.variables = {}
+    exports_only = _exports_only(dotted_name)
     for child_name in dir(module):
         if child_name in UNDOCUMENTED_MODULE_VARS: continue
         child = getattr(module, child_name)
@@ -267,7 +308,21 @@ def introspect_module(module, module_doc, module_name=None, preliminary=False):
         # Create a VariableDoc for the child, and introspect its
         # value if it's defined in this module.
         container = get_containing_module(child)
-        if (((container is not None and
+        if exports_only and not _is_export(child_name, public_names):
+            # Don't introspect stuff "from __future__"
+            if container is None and is_future_feature(child): continue
+
+            # Unexported variable: use a placeholder value.
+            child_val_doc = _get_placeholder_valuedoc(child)
+            child_var_doc = VariableDoc(name=child_name,
+                                        value=child_val_doc,
+                                        container=module_doc,
+                                        docs_extracted_by='introspecter')
+            if inspect.ismodule(child):
+                child_var_doc.is_imported = True
+            elif container is not None:
+                child_var_doc.is_imported = (container != name_without_primes)
+        elif (((container is not None and
               container == name_without_primes) or
              (public_names is not None and
               child_name in public_names))
@@ -391,6 +446,7 @@ def introspect_class(cls, class_doc, module_name=None):
         
     # Record the class's local variables.
     class_doc.variables = {}
+    exports_only = _exports_only(module_name)
     if hasattr(cls, '__dict__'):
         private_prefix = '_%s__' % getattr(cls, '__name__', '<none>')
         for child_name, child in cls.__dict__.items():
@@ -401,8 +457,12 @@ def introspect_class(cls, class_doc, module_name=None):
             if child_name.startswith(private_prefix):
                 child_name = child_name[len(private_prefix)-2:]
             if child_name in UNDOCUMENTED_CLASS_VARS: continue
-            val_doc = introspect_docs(child, context=class_doc,
-                                      module_name=module_name)
+            if exports_only and not _is_export(child_name, public_names):
+                # Unexported variable: use a placeholder value.
+                val_doc = _get_placeholder_valuedoc(child)
+            else:
+                val_doc = introspect_docs(child, context=class_doc,
+                                          module_name=module_name)
             var_doc = VariableDoc(name=child_name, value=val_doc,
                                   container=class_doc,
                                   docs_extracted_by='introspecter')
@@ -412,6 +472,43 @@ def introspect_class(cls, class_doc, module_name=None):
 
     return class_doc
 
+def _exports_only(module_name):
+    """
+    @return: True if only the exports of the module with the given
+        name (and of the classes that it defines) should be
+        introspected.  See L{EXPORTS_ONLY}.
+    """
+    if EXPORTS_ONLY is None or module_name in (None, UNKNOWN):
+        return False
+    return bool(re.search(EXPORTS_ONLY, str(module_name)))
+
+def _get_placeholder_valuedoc(value):
+    """
+    Return a C{ValueDoc} for a variable that is not exported by a
+    module whose exports only are introspected (see L{EXPORTS_ONLY}).
+    Values that are introspected as C{GenericValueDoc}s (such as
+    constants) are introspected as usual, since that is cheap; other
+    values (such as classes and routines) get a C{ValueDoc} from
+    L{_get_valuedoc()}, which will be introspected (and specialized)
+    if L{introspect_docs()} is called for the same value later.
+    """
+    if _get_introspecter(value) is introspect_other:
+        return introspect_docs(value)
+    else:
+        return _get_valuedoc(value)
+
+def _is_export(name, public_names):
+    """
+    @return: True if the variable with the given name is exported by
+        its module or class: i.e., if it is listed in C{public_names}
+        (the container's C{__all__}); or, if C{public_names} is
+        C{None}, if its name is public (using the same rule as
+        L{VariableDoc.is_public}).
+    """
+    if public_names is not None:
+        return name in public_names
+    return not name.startswith('_') or name.endswith('_')
+
 #////////////////////////////////////////////////////////////
 # Routine Introspection
 #////////////////////////////////////////////////////////////
@@ -610,6 +707,10 @@ def get_canonical_name(value, strict=False):
     """
     if not hasattr(value, '__name__'): return UNKNOWN
 
+    # Check the reverse index of names.
+    dotted_name = _indexed_name(value)
+    if dotted_name is not None: return dotted_name
+
     # Get the name via introspection.
     if isinstance(value, ModuleType):
         try:
@@ -674,6 +775,47 @@ def verify_name(value, dotted_name):
     else:
         return UNKNOWN
 
+def _index_module_names(module):
+    """
+    Add the classes and functions that are defined at the top level
+    of the given module to L{_name_index}.  A value is only indexed if
+    its canonical name would be the module's name followed by the
+    value's C{__name__}, and the module's variable with that name is
+    bound to the value.
+    """
+    module_name = getattr(module, '__name__', None)
+    if (not isinstance(module_name, basestring) or
+        module_name == '__builtin__' or
+        sys.modules.get(module_name) is not module):
+        return
+    for (name, value) in module.__dict__.items():
+        if not (isclass(value) or isinstance(value, FunctionType)):
+            continue
+        try:
+            if value.__name__ != name or value.__module__ != module_name:
+                continue
+        except KeyboardInterrupt: raise
+        except: continue
+        if name.startswith('<') or '.' in name: continue
+        try: canonical_name = DottedName(module_name, name, strict=True)
+        except DottedName.InvalidDottedName: continue
+        _name_index[id(value)] = (value, module, name, canonical_name)
+
+def _indexed_name(value):
+    """
+    @return: The canonical name of C{value}, if it is listed in
+        L{_name_index} (and the module that defines it is still in
+        C{sys.modules}, and still binds it to the same name); or
+        C{None} otherwise.
+    """
+    entry = _name_index.get(id(value))
+    if entry is None or entry[0] is not value: return None
+    (value, module, name, canonical_name) = entry
+    if (sys.modules.get(module.__name__) is not module or
+        module.__dict__.get(name) is not value):
+        return None
+    return canonical_name
+
 # [xx] not used:
 def value_repr(value):
     try:
@@ -725,13 +867,24 @@ def _find_function_module(func):
     # a couple special cases (including using epydoc to document
     # itself).  In particular, if a module gets loaded twice, using
     # two different names for the same file, then this helps.
-    for module in sys.modules.values():
-        if (hasattr(module, '__dict__') and
-            hasattr(func, 'func_globals') and
-            func.func_globals is module.__dict__):
-            return module.__name__
+    if not hasattr(func, 'func_globals'): return None
+    if len(sys.modules) != _globals_index_size[0]:
+        _index_module_globals()
+    module = _globals_index.get(id(func.func_globals))
+    if module is not None and module.__dict__ is func.func_globals:
+        return module.__name__
     return None
 
+def _index_module_globals():
+    """
+    Rebuild L{_globals_index} from the modules in C{sys.modules}.
+    """
+    _globals_index.clear()
+    for module in sys.modules.values():
+        if hasattr(module, '__dict__'):
+            _globals_index[id(module.__dict__)] = module
+    _globals_index_size[0] = len(sys.modules)
+
 #////////////////////////////////////////////////////////////
 # Introspection Dispatch Table
 #////////////////////////////////////////////////////////////
@@ -799,6 +952,28 @@ except:
 # Import support
 #////////////////////////////////////////////////////////////
 
+IMPORT_TIMEOUT = None
+"""The maximum number of seconds that importing a single module may
+take, or C{None} for no limit.  If an import takes longer, then it is
+interrupted, and fails with an C{ImportError}; so the module is only
+documented by parsing its source code.  Timeouts are only supported
+on platforms that provide C{signal.setitimer()} (such as Unix), and
+only when importing from the main thread.
+
+The interrupt is an exception raised inside the imported module, so
+the module can catch it (e.g., with a bare C{except:}) and go on
+importing.  Such an import still fails once it finishes, because its
+elapsed time is checked as well; but an import that never finishes
+can't be stopped.
+@type: C{float}"""
+
+_import_stats = {}
+"""A dictionary mapping the name of each module that was imported by
+L{_import()} to a tuple C{(seconds, memory)}, where C{seconds} is the
+wall time that the import took, and C{memory} is the growth of the
+process's memory usage in kilobytes (or C{None} if it is unknown).
+See L{import_stats()}."""
+
 def get_value_from_filename(filename, context=None):
     # Normalize the filename.
     filename = os.path.normpath(os.path.abspath(filename))
@@ -894,11 +1069,67 @@ def _lookup(module, name):
             raise ImportError(exc_msg)
     return val
             
+def import_stats():
+    """
+    @return: A list of C{(name, seconds, memory)} tuples describing
+        the modules that have been imported so far, slowest first.
+        C{seconds} is the wall time that the import took, and
+        C{memory} is how much the memory used by this process grew
+        during the import, in kilobytes (or C{None} if this can't be
+        measured).  Modules that were already imported are not listed.
+    @rtype: C{list} of C{(str, float, int)}
+    """
+    stats = [(name, seconds, memory) for (name, (seconds, memory))
+             in _import_stats.items()]
+    stats.sort(key=lambda stat: (-stat[1], stat[0]))
+    return stats
+
+def clear_import_stats():
+    """
+    Discard the statistics that have been recorded by L{_import()}.
+    """
+    _import_stats.clear()
+
+class _ImportTimeout(Exception):
+    """
+    Raised by the C{SIGALRM} handler that L{_import()} installs, when
+    an import takes longer than L{IMPORT_TIMEOUT}.
+    """
+
+def _raise_import_timeout(signum, frame):
+    raise _ImportTimeout()
+
+def _memory_usage():
+    """
+    @return: The amount of memory used by this process, in kilobytes;
+        or C{None} if it can't be determined.  This is the resident
+        set size on Linux; elsewhere, it is the peak resident set size.
+    """
+    try:
+        statm = open('/proc/self/statm')
+        try: pages = int(statm.read().split()[1])
+        finally: statm.close()
+        return pages * (os.sysconf('SC_PAGE_SIZE') // 1024)
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (ImportError, AttributeError):
+        return None
+    if sys.platform == 'darwin':
+        peak_rss /= 1024 # (reported in bytes, not kilobytes)
+    return peak_rss
+
 def _import(name, filename=None):
     """
     Run the given callable in a 'sandboxed' environment.
     Currently, this includes saving and restoring the contents of
     sys and __builtins__; and suppressing stdin, stdout, and stderr.
+
+    The time and memory used by the import are recorded (see
+    L{import_stats()}); and if L{IMPORT_TIMEOUT} is set, then imports
+    that take longer than that fail with an C{ImportError}.
     """
     # Note that we just do a shallow copy of sys.  In particular,
     # any changes made to sys.modules will be kept.  But we do
@@ -921,15 +1152,36 @@ def _import(name, filename=None):
     # Remove any command-line arguments
     sys.argv = ['(imported)']
 
+    # Only record statistics for modules that aren't imported yet.
+    if filename is not None or name not in sys.modules:
+        stats_name = name
+    else:
+        stats_name = None
+    start_time = time.time()
+    start_memory = _memory_usage()
+
     try:
         try:
-            if filename is None:
-                return __import__(name)
-            else:
-                # For importing scripts:
-                return imp.load_source(name, filename)
+            old_handler = _start_import_timer()
+            try:
+                if filename is None:
+                    module = __import__(name)
+                else:
+                    # For importing scripts:
+                    module = imp.load_source(name, filename)
+            finally:
+                _stop_import_timer(old_handler)
+            # The module may have caught the _ImportTimeout itself.
+            if _import_timed_out(start_time): raise _ImportTimeout()
+            return module
         except KeyboardInterrupt: raise
+        except _ImportTimeout:
+            raise ImportError('import timed out after %s seconds' %
+                              IMPORT_TIMEOUT)
         except:
+            if _import_timed_out(start_time):
+                raise ImportError('import timed out after %s seconds' %
+                                  IMPORT_TIMEOUT)
             exc_typ, exc_val, exc_tb = sys.exc_info()
             if exc_val is None:
                 estr = '%s' % (exc_typ,)
@@ -945,7 +1197,46 @@ def _import(name, filename=None):
         sys.__dict__.clear()
         sys.__dict__.update(old_sys)
         sys.path = old_sys_path
-        
+        if stats_name is not None:
+            end_memory = _memory_usage()
+            if start_memory is None or end_memory is None: memory = None
+            else: memory = max(0, end_memory-start_memory)
+            _import_stats[stats_name] = (time.time()-start_time, memory)
+
+def _start_import_timer():
+    """
+    If L{IMPORT_TIMEOUT} is set, then arrange for L{_ImportTimeout} to
+    be raised when it expires, and return the C{SIGALRM} handler that
+    was replaced.  Otherwise, or if timeouts are not supported, return
+    C{None}.
+    """
+    if not IMPORT_TIMEOUT or not hasattr(signal, 'setitimer'):
+        return None
+    try:
+        old_handler = signal.signal(signal.SIGALRM, _raise_import_timeout)
+    except ValueError:
+        return None # We're not in the main thread.
+    if old_handler is None: # (The handler wasn't installed by python.)
+        old_handler = signal.SIG_DFL
+    signal.setitimer(signal.ITIMER_REAL, IMPORT_TIMEOUT)
+    return old_handler
+
+def _import_timed_out(start_time):
+    """
+    Return true if an import that started at C{start_time} has taken
+    longer than L{IMPORT_TIMEOUT}.
+    """
+    return IMPORT_TIMEOUT and time.time()-start_time >= IMPORT_TIMEOUT
+
+def _stop_import_timer(old_handler):
+    """
+    Cancel the timer that was started by L{_start_import_timer()},
+    and restore the C{SIGALRM} handler that it replaced.
+    """
+    if old_handler is None: return
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, old_handler)
+
 def introspect_docstring_lineno(api_doc):
     """
     Try to determine the line number on which the given item's
@@ -957,7 +1248,7 @@ def introspect_docstring_lineno(api_doc):
         return api_doc.docstring_lineno
     if isinstance(api_doc, ValueDoc) and api_doc.pyval is not UNKNOWN:
         try:
-            lines, lineno = inspect.findsource(api_doc.pyval)
+            lines, lineno = _findsource(api_doc.pyval)
             if not isinstance(api_doc, ModuleDoc): lineno += 1
             for lineno in range(lineno, len(lines)):
                 if lines[lineno].split('#', 1)[0].strip():
@@ -970,6 +1261,40 @@ def introspect_docstring_lineno(api_doc):
                         % api_doc.canonical_name)
     return None
 
+_FUNCTION_START_RE = re.compile(r'^(\s*def\s)|(.*(?<!\w)lambda(:|\s))|^(\s*@)')
+"""The regular expression that C{inspect.findsource()} uses to find
+the first line of a function definition."""
+
+def _findsource(obj):
+    """
+    Return the lines of the source file that defines C{obj}, and the
+    index of the line where its definition starts, like
+    C{inspect.findsource()} does.  For modules and functions (the
+    common cases), the lines are read from the shared source cache
+    (see L{epydoc.sourcecache}), rather than being read again by
+    C{linecache}.
+
+    @raise IOError: If the source can not be found.
+    """
+    if inspect.ismethod(obj): func = obj.im_func
+    else: func = obj
+    if inspect.ismodule(obj) or inspect.isfunction(func):
+        try:
+            filename = inspect.getsourcefile(obj)
+            if filename is not None:
+                lines = get_source_file(filename).lines()
+                if inspect.ismodule(obj):
+                    return lines, 0
+                lineno = func.func_code.co_firstlineno - 1
+                while lineno > 0:
+                    if _FUNCTION_START_RE.match(lines[lineno]): break
+                    lineno -= 1
+                return lines, lineno
+        except (IOError, LookupError, UnicodeError, IndexError):
+            pass
+    # Anything else (e.g., classes): let inspect find it.
+    return inspect.findsource(obj)
+
 class _DevNull:
     """
     A "file-like" object that discards anything that is written and
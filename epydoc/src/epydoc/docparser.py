@@ -58,9 +58,11 @@ import token, tokenize
 # Finding modules:
 import imp
 # File services:
-import os, os.path, sys
-# Unicode:
-import codecs
+import os, os.path, sys, gc
+# Searching sorted lists of line numbers:
+import bisect
+# Reading (and tokenizing) source files:
+from epydoc.sourcecache import get_source_file, split_source_lines
 # API documentation encoding:
 from epydoc.apidoc import *
 # For looking up the docs of builtins:
@@ -70,6 +72,13 @@ import epydoc.docintrospecter
 from epydoc.util import *
 # Backwards compatibility
 from epydoc.compat import *
+# Abstract syntax trees (python 2.6+), used by process_file_ast():
+try: import ast
+except ImportError: ast = None
+# Persistent parse cache:
+import cPickle
+try: from hashlib import sha1
+except ImportError: from sha import new as sha1
 
 ######################################################################
 ## Doc Parser
@@ -88,6 +97,16 @@ C{_moduledoc_cache} is a dictionary mapping from filenames to
 C{ValueDoc} objects.
 @type: C{dict}"""
 
+def clear_cache():
+    """
+    Discard any cached C{ModuleDoc}s that have been created by
+    parsing.  (Entries in the persistent parse cache are kept.)
+    """
+    _moduledoc_cache.clear()
+    _parse_dependencies.clear()
+    _module_index.clear()
+    _directory_index.clear()
+
 #////////////////////////////////////////////////////////////
 # Configuration Constants
 #////////////////////////////////////////////////////////////
@@ -108,6 +127,19 @@ PARSE_WHILE_BLOCKS = False
 PARSE_FOR_BLOCKS = False
 """Should the contents of C{for} blocks be examined?"""
 
+#{ Configuration Constants: Function Bodies
+PARSE_FUNCTION_BODIES = 'all'
+"""Which function bodies should be examined for instance variables
+(assignments to C{self.M{x}}, with comment docstrings or variable
+docstrings)?
+  - C{'all'}: The bodies of all functions and methods.
+  - C{'init'}: Only the bodies of C{__init__} methods.  The tokens of
+    other bodies are skipped, which makes parsing faster.
+  - C{'none'}: No function bodies.  This is the fastest option, for
+    projects that document their instance variables with fields
+    (C{@ivar}).
+The docstrings of functions are found in any case."""
+
 #{ Configuration Constants: Imports
 IMPORT_HANDLING = 'link'
 """What should C{docparser} do when it encounters an import
@@ -179,6 +211,36 @@ END_GROUP_MARKER = '#}'
 """The prefix used to mark a comment that ends a group.  See
 L{START_GROUP_MARKER}."""
 
+#{ Configuration Constants: Parser Backend
+PARSER_BACKEND = 'tokenize'
+"""How should C{docparser} read a module's source file?
+  - C{'tokenize'}: Tokenize the whole file, and process it one
+    logical line at a time (see L{process_file()}).
+  - C{'ast'}: Compile the file to an abstract syntax tree, and build
+    the C{APIDoc}s from the tree (see L{process_file_ast()}).  Only
+    the source code of values is tokenized, and most function bodies
+    are skipped.  This produces the same C{APIDoc}s, and is usually
+    faster; but compiling the file still takes a large part of the
+    time, so the difference depends on the source code.  (On epydoc's
+    own source, it takes about half as long; see
+    C{tools/bench_parse.py}.)
+"""
+
+#{ Configuration Constants: Parse Cache
+PARSE_CACHE_DIR = None
+"""The name of a directory where the C{ModuleDoc}s created by
+L{parse_docs()} should be saved, so that later runs can load them
+instead of re-parsing modules whose source code has not changed; or
+C{None} to disable the persistent parse cache.  Cache entries are
+keyed on the module's filename and contents, the epydoc version, and
+the parser's configuration constants.  The persistent parse cache is
+only used when L{IMPORT_HANDLING} is C{'link'}."""
+
+PARSE_CACHE_SIZE = 64*1024*1024
+"""The maximum total size, in bytes, of the entries in
+L{PARSE_CACHE_DIR}.  When the cache grows larger than this, the least
+recently used entries are deleted."""
+
 #/////////////////////////////////////////////////////////////////
 #{ Module parser
 #/////////////////////////////////////////////////////////////////
@@ -222,6 +284,7 @@ def parse_docs(filename=None, name=None, context=None, is_script=False):
         name = DottedName(name)
         val_doc = _find(name)
         if val_doc.canonical_name is UNKNOWN:
+            _check_cached_parse_change(val_doc)
             val_doc.canonical_name = name
         return val_doc
 
@@ -235,7 +298,9 @@ def parse_docs(filename=None, name=None, context=None, is_script=False):
 
         # Check the cache, first.
         if filename in _moduledoc_cache:
+            _note_parse_dependency(filename)
             return _moduledoc_cache[filename]
+        message_index = _cached_parse_message_index()
         
         log.info("Parsing %s" % filename)
 
@@ -260,6 +325,14 @@ def parse_docs(filename=None, name=None, context=None, is_script=False):
             module_name = DottedName(munge_script_name(filename))
             is_pkg = False
 
+        # Check the persistent parse cache.
+        cache_key = _parse_cache_key(filename, module_name, is_pkg, context)
+        if cache_key is not None:
+            module_doc = _load_cached_parse(cache_key, filename, context)
+            if module_doc is not None:
+                _note_parse_dependency(filename, message_index)
+                return module_doc
+
         # Create a new ModuleDoc for the module, & add it to the cache.
         module_doc = ModuleDoc(canonical_name=module_name, variables={},
                                sort_spec=[], imports=[],
@@ -278,19 +351,30 @@ def parse_docs(filename=None, name=None, context=None, is_script=False):
             context.submodules.append(module_doc)
 
         # Tokenize & process the contents of the module's source file.
+        cache_record = _start_cached_parse(module_doc, cache_key, context,
+                                           message_index)
         try:
-            process_file(module_doc)
-        except tokenize.TokenError, e:
-            msg, (srow, scol) = e.args
-            raise ParseError('Error during parsing: %s '
-                             '(%s, line %d, char %d)' %
-                             (msg, module_doc.filename, srow, scol))
-        except (IndentationError, UnicodeDecodeError), e:
-            raise ParseError('Error during parsing: %s (%s)' %
-                             (e, module_doc.filename))
-
-        # Handle any special variables (__path__, __docformat__, etc.)
-        handle_special_module_vars(module_doc)
+            try:
+                if PARSER_BACKEND == 'ast':
+                    process_file_ast(module_doc)
+                else:
+                    process_file(module_doc)
+            except tokenize.TokenError, e:
+                msg, (srow, scol) = e.args
+                raise ParseError('Error during parsing: %s '
+                                 '(%s, line %d, char %d)' %
+                                 (msg, module_doc.filename, srow, scol))
+            except (IndentationError, UnicodeDecodeError), e:
+                raise ParseError('Error during parsing: %s (%s)' %
+                                 (e, module_doc.filename))
+
+            # Handle any special variables (__path__, __docformat__, etc.)
+            handle_special_module_vars(module_doc)
+        finally:
+            _finish_cached_parse(cache_record)
+
+        # Save the completed ModuleDoc in the persistent parse cache.
+        _store_cached_parse(cache_record)
 
         # Return the completed ModuleDoc
         return module_doc
@@ -358,6 +442,425 @@ def _module_var_toktree(module_doc, name):
     else:
         return var_doc.value.toktree
 
+#////////////////////////////////////////////////////////////
+#{ Persistent Parse Cache
+#////////////////////////////////////////////////////////////
+
+class _CachedParse:
+    """
+    Bookkeeping for a module that is being parsed while the persistent
+    parse cache is enabled.
+
+    @ivar module_doc: The C{ModuleDoc} that is being parsed.
+    @ivar cache_key: The key for the module's cache entry.
+    @ivar context: The package containing the module.
+    @ivar dependencies: The filenames of the other modules whose
+        docs were used while parsing the module.
+    @ivar subclasses: A list of C{(base_doc, class_doc)} tuples for
+        the classes that were registered as subclasses while parsing
+        the module.
+    @ivar cacheable: False if parsing the module modified the docs of
+        some other module, in which case the module can not be loaded
+        from the cache by itself.
+    @ivar parse_index: The index in L{_cached_parse_logger} of the
+        first message reported by the call to L{parse_docs()} that is
+        parsing the module.
+    @ivar message_index: The index in L{_cached_parse_logger} of the
+        first message reported while parsing the module.
+    @ivar nested_messages: A list of C{(start, end)} index ranges of
+        the messages in L{_cached_parse_logger} that were reported
+        while parsing or loading other modules.
+    @ivar messages: The messages that were reported while parsing the
+        module, so that they can be reported again when the module is
+        loaded from the cache.
+    """
+    def __init__(self, module_doc, cache_key, context, parse_index):
+        self.module_doc = module_doc
+        self.cache_key = cache_key
+        self.context = context
+        self.dependencies = set()
+        self.subclasses = []
+        self.cacheable = True
+        self.parse_index = parse_index
+        self.message_index = len(_cached_parse_logger.messages)
+        self.nested_messages = []
+        self.messages = []
+
+_cached_parse_stack = []
+"""The stack of L{_CachedParse}s for the modules that are currently
+being parsed (innermost last).
+@type: C{list}"""
+
+_cached_parse_logger = log.RecordingLogger()
+"""A logger that records the messages that are reported while
+L{_cached_parse_stack} is not empty."""
+
+_parse_dependencies = {}
+"""A dictionary mapping from the filename of each module that was
+parsed or loaded from the persistent parse cache to the filenames of
+the other modules whose docs were used to parse it.
+@type: C{dict}"""
+
+_file_digests = {}
+"""A dictionary mapping from filenames to C{((mtime, size), digest)}
+tuples, used to avoid re-reading source files whose modification time
+and size have not changed.
+@type: C{dict}"""
+
+_loading_cached_parses = set()
+"""The filenames of the modules that are currently being loaded from
+the persistent parse cache.
+@type: C{set}"""
+
+_parse_cache_total_size = None
+"""The total size of the entries in L{PARSE_CACHE_DIR}, or C{None}
+if it has not been computed yet."""
+
+def _parse_cache_key(filename, module_name, is_pkg, context):
+    """
+    Return the persistent parse cache key for the given module, or
+    C{None} if the persistent parse cache should not be used.  The
+    key covers the module's filename, size, and contents; its name
+    and context; the epydoc and python versions; and the parser's
+    configuration constants.  (The modification time is deliberately
+    left out, so that fresh checkouts of unchanged source files can
+    still use the cache.)
+    """
+    if PARSE_CACHE_DIR is None or IMPORT_HANDLING != 'link':
+        return None
+    digest = _file_digest(filename)
+    if digest is None:
+        return None
+    if context is None:
+        context_info = None
+    else:
+        context_info = (str(context.canonical_name), context.path)
+    key = (epydoc.__version__, sys.version_info[:2],
+           os.path.abspath(filename), os.path.getsize(filename), digest,
+           str(module_name), is_pkg, context_info,
+           PARSE_TRY_BLOCKS, PARSE_EXCEPT_BLOCKS, PARSE_FINALLY_BLOCKS,
+           PARSE_IF_BLOCKS, PARSE_ELSE_BLOCKS, PARSE_WHILE_BLOCKS,
+           PARSE_FOR_BLOCKS, PARSE_FUNCTION_BODIES, IMPORT_HANDLING,
+           IMPORT_STAR_HANDLING,
+           DEFAULT_DECORATOR_BEHAVIOR, PUBLIC_DECORATOR_APPENDS_TO_ALL,
+           BASE_HANDLING, COMMENT_DOCSTRING_MARKER, START_GROUP_MARKER,
+           END_GROUP_MARKER, PARSER_BACKEND)
+    return sha1(repr(key)).hexdigest()
+
+def _file_digest(filename):
+    """
+    Return a hex digest of the contents of the given file, or C{None}
+    if it can not be read.
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    stamp = (st.st_mtime, st.st_size)
+    if filename in _file_digests and _file_digests[filename][0] == stamp:
+        return _file_digests[filename][1]
+    try:
+        digest = sha1(get_source_file(filename).source).hexdigest()
+    except IOError:
+        return None
+    _file_digests[filename] = (stamp, digest)
+    return digest
+
+def _cached_parse_message_index():
+    """
+    Return the number of messages recorded by L{_cached_parse_logger},
+    or C{None} if no module is being parsed.
+    """
+    if _cached_parse_stack:
+        return len(_cached_parse_logger.messages)
+    return None
+
+def _note_parse_dependency(filename, message_index=None):
+    """
+    Record the fact that the docs for the module in C{filename} were
+    used by the module that is currently being parsed.  If
+    C{message_index} is not C{None}, then the messages that were
+    recorded since then were reported while parsing or loading
+    C{filename}, so they don't belong to the current module.
+    """
+    if _cached_parse_stack:
+        record = _cached_parse_stack[-1]
+        if filename != record.module_doc.filename:
+            record.dependencies.add(filename)
+            record.dependencies.update(_parse_dependencies.get(filename, ()))
+        if message_index is not None:
+            record.nested_messages.append(
+                (message_index, len(_cached_parse_logger.messages)))
+
+def _note_parse_subclass(base_doc, class_doc):
+    """
+    Record the fact that C{class_doc} was registered as a subclass
+    of C{base_doc} while parsing the current module.
+    """
+    if _cached_parse_stack:
+        _cached_parse_stack[-1].subclasses.append( (base_doc, class_doc) )
+
+def _check_cached_parse_change(api_doc):
+    """
+    Called before the parser modifies C{api_doc}.  If C{api_doc} does
+    not belong to the module that is currently being parsed, then that
+    module is not saved in the persistent parse cache, since loading
+    it would not reproduce the modification.
+    """
+    if not _cached_parse_stack: return
+    record = _cached_parse_stack[-1]
+    if api_doc.docs_extracted_by == 'introspecter':
+        record.cacheable = False
+    elif isinstance(api_doc, ValueDoc):
+        defining_module = api_doc.defining_module
+        if (defining_module is not UNKNOWN and
+            defining_module is not record.module_doc):
+            record.cacheable = False
+
+def _start_cached_parse(module_doc, cache_key, context, parse_index):
+    """
+    If C{cache_key} is not C{None}, then start keeping track of the
+    messages and dependencies of the given module while it is parsed,
+    and return a new L{_CachedParse}; otherwise, return C{None}.
+    """
+    if cache_key is None: return None
+    if not _cached_parse_stack:
+        log.register_logger(_cached_parse_logger)
+    record = _CachedParse(module_doc, cache_key, context, parse_index)
+    _cached_parse_stack.append(record)
+    return record
+
+def _finish_cached_parse(record):
+    """
+    Stop keeping track of the messages and dependencies of the module
+    described by C{record}.
+    """
+    if record is None: return
+    all_messages = _cached_parse_logger.messages
+    start = record.message_index
+    for (end, next_start) in record.nested_messages:
+        record.messages.extend(all_messages[start:end])
+        start = next_start
+    record.messages.extend(all_messages[start:])
+
+    _cached_parse_stack.pop()
+    if not _cached_parse_stack:
+        log.remove_logger(_cached_parse_logger)
+        del all_messages[:]
+    filename = record.module_doc.filename
+    record.dependencies.discard(filename)
+    _parse_dependencies[filename] = record.dependencies
+    _note_parse_dependency(filename, record.parse_index)
+
+def _store_cached_parse(record):
+    """
+    Save the module described by C{record} in the persistent parse
+    cache.  The docs of other modules are saved as references, which
+    are resolved when the entry is loaded.  If the module can't be
+    loaded by itself (e.g., because it refers to docs that are not
+    reachable from any module's namespace), then it is not saved.
+    """
+    if record is None or not record.cacheable: return
+    module_doc = record.module_doc
+    filename = module_doc.filename
+
+    # Find the references to the docs of other modules.
+    refs = {}
+    if record.context is not None:
+        refs[id(record.context)] = 'context'
+    refs.update(_namespace_refs(
+        epydoc.docintrospecter.introspect_docs(__builtin__),
+        'builtin', '__builtin__'))
+    refs.update(_namespace_refs(
+        epydoc.docintrospecter.introspect_docs(exceptions),
+        'builtin', 'exceptions'))
+    in_progress = [r.module_doc.filename for r in _cached_parse_stack]
+    dependencies = []
+    for dep_filename in sorted(record.dependencies):
+        digest = _file_digest(dep_filename)
+        dep_doc = _moduledoc_cache.get(dep_filename)
+        if digest is None or dep_doc is None: return
+        dependencies.append( (dep_filename, digest) )
+        if dep_filename in in_progress:
+            refs[id(dep_doc)] = ('module', dep_filename, ())
+        else:
+            refs.update(_namespace_refs(dep_doc, 'module', dep_filename))
+
+    # Values pickle the state returned by ValueDoc.__getstate__(),
+    # which caches it (along with the value's repr) in the doc; so
+    # give each value we save a temporary pickle state, rather than
+    # letting the cache entry modify it.
+    pickled_values = []
+    def persistent_id(obj):
+        if obj is UNKNOWN: return 'UNKNOWN'
+        if not isinstance(obj, APIDoc): return None
+        if id(obj) in refs: return refs[id(obj)]
+        if obj.docs_extracted_by == 'introspecter':
+            raise ValueError('%r is not reachable from a namespace' % obj)
+        if isinstance(obj, ValueDoc):
+            if (obj.defining_module is not UNKNOWN and
+                obj.defining_module is not module_doc):
+                raise ValueError('%r is not reachable from a namespace' %
+                                 obj)
+            if '_ValueDoc__pickle_state' not in obj.__dict__:
+                state = obj.__dict__.copy()
+                state['pyval'] = UNKNOWN
+                obj._ValueDoc__pickle_state = state
+                pickled_values.append(obj)
+        return None
+
+    path = os.path.join(PARSE_CACHE_DIR, record.cache_key + '.pickle')
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        try:
+            if not os.path.isdir(PARSE_CACHE_DIR):
+                os.makedirs(PARSE_CACHE_DIR)
+            f = open(tmp_path, 'wb')
+            try:
+                pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+                pickler.persistent_id = persistent_id
+                pickler.dump(dependencies)
+                pickler.dump(module_doc)
+                # Record the classes that we registered as subclasses
+                # of other modules' classes, so we can do it again
+                # when the entry is loaded.
+                subclasses = [(base_doc, class_doc) for
+                              (base_doc, class_doc) in record.subclasses
+                              if id(base_doc) in refs]
+                pickler.dump( (subclasses, record.messages) )
+            finally:
+                f.close()
+                for val_doc in pickled_values:
+                    del val_doc.__dict__['_ValueDoc__pickle_state']
+            if os.path.exists(path): os.remove(path)
+            os.rename(tmp_path, path)
+        except (KeyboardInterrupt, SystemExit): raise
+        except Exception, e:
+            log.debug('Not caching the parse of %s: %s' % (filename, e))
+            return
+    finally:
+        if os.path.exists(tmp_path):
+            try: os.remove(tmp_path)
+            except OSError: pass
+
+    _add_to_parse_cache_size(os.path.getsize(path))
+
+def _load_cached_parse(cache_key, filename, context):
+    """
+    Load the C{ModuleDoc} for the module in C{filename} from the
+    persistent parse cache, and return it; or return C{None} if it
+    is not in the cache (or any of its dependencies have changed).
+    """
+    if filename in _loading_cached_parses: return None
+    path = os.path.join(PARSE_CACHE_DIR, cache_key + '.pickle')
+    if not os.path.exists(path): return None
+
+    def persistent_load(identifier):
+        if identifier == 'UNKNOWN': return UNKNOWN
+        if identifier == 'context': return context
+        kind, name, var_path = identifier
+        if kind == 'builtin':
+            val_doc = epydoc.docintrospecter.introspect_docs(
+                {'__builtin__':__builtin__, 'exceptions':exceptions}[name])
+        else:
+            val_doc = _moduledoc_cache[name]
+        for var_name in var_path:
+            val_doc = val_doc.variables[var_name].value
+        return val_doc
+
+    _loading_cached_parses.add(filename)
+    try:
+        try:
+            f = open(path, 'rb')
+            try:
+                unpickler = cPickle.Unpickler(f)
+                unpickler.persistent_load = persistent_load
+                dependencies = unpickler.load()
+                for (dep_filename, digest) in dependencies:
+                    if _file_digest(dep_filename) != digest:
+                        return None
+                for (dep_filename, digest) in dependencies:
+                    parse_docs(filename=dep_filename)
+                module_doc = unpickler.load()
+                subclasses, messages = unpickler.load()
+            finally:
+                f.close()
+        except (KeyboardInterrupt, SystemExit): raise
+        except Exception, e:
+            log.debug('Unable to load the cached parse of %s: %s' %
+                      (filename, e))
+            return None
+    finally:
+        _loading_cached_parses.discard(filename)
+
+    # If loading the dependencies parsed this module, then use that.
+    if filename in _moduledoc_cache:
+        return _moduledoc_cache[filename]
+
+    # Add the module to the caches, and repeat the changes that
+    # parsing it made to other modules' docs.
+    _moduledoc_cache[filename] = module_doc
+    _parse_dependencies[filename] = set([d for (d, _) in dependencies])
+    if context is not None:
+        context.submodules.append(module_doc)
+    for (base_doc, class_doc) in subclasses:
+        base_doc.subclasses.append(class_doc)
+    log.replay_messages(messages)
+
+    # Mark the entry as recently used.
+    try: os.utime(path, None)
+    except OSError: pass
+    return module_doc
+
+def _namespace_refs(root_doc, kind, name):
+    """
+    Return a dictionary mapping from the ids of C{root_doc} and the
+    values in its namespace (and their namespaces, recursively) to
+    the persistent parse cache references that are used to find them
+    again when a cache entry is loaded.
+    """
+    refs = {id(root_doc): (kind, name, ())}
+    queue = [(root_doc, ())]
+    for (namespace_doc, var_path) in queue:
+        if namespace_doc.variables in (None, UNKNOWN): continue
+        for (var_name, var_doc) in namespace_doc.variables.items():
+            val_doc = var_doc.value
+            if val_doc is UNKNOWN or id(val_doc) in refs: continue
+            refs[id(val_doc)] = (kind, name, var_path+(var_name,))
+            if (isinstance(val_doc, NamespaceDoc) and
+                not isinstance(val_doc, ModuleDoc)):
+                queue.append( (val_doc, var_path+(var_name,)) )
+    return refs
+
+def _add_to_parse_cache_size(size):
+    """
+    Add C{size} bytes to the total size of the persistent parse cache;
+    and if it is now larger than L{PARSE_CACHE_SIZE}, then delete the
+    least recently used entries until it has shrunk to three quarters
+    of that size.
+    """
+    global _parse_cache_total_size
+    if _parse_cache_total_size is not None:
+        _parse_cache_total_size += size
+        if _parse_cache_total_size <= PARSE_CACHE_SIZE: return
+
+    entries = []
+    for entry in os.listdir(PARSE_CACHE_DIR):
+        if not entry.endswith('.pickle'): continue
+        path = os.path.join(PARSE_CACHE_DIR, entry)
+        try: st = os.stat(path)
+        except OSError: continue
+        entries.append( (st.st_mtime, st.st_size, path) )
+    entries.sort()
+    total_size = sum([size for (mtime, size, path) in entries])
+    if total_size > PARSE_CACHE_SIZE:
+        while entries and total_size > PARSE_CACHE_SIZE*3/4:
+            (mtime, size, path) = entries.pop(0)
+            try: os.remove(path)
+            except OSError: pass
+            total_size -= size
+    _parse_cache_total_size = total_size
+
 #////////////////////////////////////////////////////////////
 #{ Module Lookup
 #////////////////////////////////////////////////////////////
@@ -442,27 +945,22 @@ def _find_in_namespace(name, namespace_doc):
     
 def _get_filename(identifier, path=None):
     if path is UNKNOWN: path = None
-    try:
-        fp, filename, (s,m,typ) = imp.find_module(identifier, path)
-        if fp is not None: fp.close()
-    except ImportError:
-        raise ImportError, 'No Python source file found.'
+    filename, typ = _find_module(identifier, path)
 
     if typ == imp.PY_SOURCE:
         return filename
     elif typ == imp.PY_COMPILED:
         # See if we can find a corresponding non-compiled version.
         filename = re.sub('.py\w$', '.py', filename)
-        if not os.path.exists(filename):
+        if not _module_file_exists(filename):
             raise ImportError, 'No Python source file found.'
         return filename
     elif typ == imp.PKG_DIRECTORY:
-        filename = os.path.join(filename, '__init__.py')
-        if not os.path.exists(filename):
-            filename = os.path.join(filename, '__init__.pyw')
-            if not os.path.exists(filename):
-                raise ImportError, 'No package file found.'
-        return filename
+        for init_name in ('__init__.py', '__init__.pyw'):
+            init_filename = os.path.join(filename, init_name)
+            if _module_file_exists(init_filename):
+                return init_filename
+        raise ImportError, 'No package file found.'
     elif typ == imp.C_BUILTIN:
         raise ImportError, 'No Python source file for builtin modules.'
     elif typ == imp.C_EXTENSION:
@@ -470,6 +968,87 @@ def _get_filename(identifier, path=None):
     else:
         raise ImportError, 'No Python source file found.'
 
+_module_index = {}
+"""A cache of the results of L{_find_module()}.  C{_module_index} is a
+dictionary mapping from C{(directory, identifier)} pairs to the
+C{(filename, type)} of the module named C{identifier} in that
+directory, or C{None} if there is no such module.
+@type: C{dict}"""
+
+_directory_index = {}
+"""A cache of the directories searched by L{_find_module()}.
+C{_directory_index} is a dictionary mapping from directory names to
+the set of file names in that directory.  Each directory is only read
+once per run (until L{clear_cache()} is called).
+@type: C{dict}"""
+
+def _find_module(identifier, path=None):
+    """
+    Find the module named C{identifier}, in the same way as
+    C{imp.find_module()}; but look for it in L{_directory_index},
+    rather than asking the file system about each candidate file.
+
+    @param path: A list of directories; or C{None} to find a top-level
+        module (on C{sys.path}).
+    @return: A C{(filename, type)} pair, where C{type} is one of the
+        C{imp} module's module types (e.g. C{imp.PY_SOURCE}).
+    @raise ImportError: If no module named C{identifier} is found.
+    """
+    if path is None:
+        if identifier in sys.builtin_module_names:
+            return identifier, imp.C_BUILTIN
+        if imp.is_frozen(identifier):
+            return identifier, imp.PY_FROZEN
+        path = sys.path
+    for dirname in path:
+        if not isinstance(dirname, basestring): continue
+        key = (dirname, identifier)
+        if key not in _module_index:
+            _module_index[key] = _find_module_in_dir(identifier, dirname)
+        if _module_index[key] is not None:
+            return _module_index[key]
+    raise ImportError, 'No Python source file found.'
+
+def _find_module_in_dir(identifier, dirname):
+    """
+    @return: The C{(filename, type)} of the module named C{identifier}
+        in the directory C{dirname}, or C{None} if there is none.
+        Like C{imp.find_module()}, a package takes precedence over a
+        module with the same name; and modules are found in the order
+        of the suffixes returned by C{imp.get_suffixes()}.
+    """
+    filenames = _list_directory(dirname)
+    if identifier in filenames:
+        subdir = os.path.join(dirname, identifier)
+        init_filenames = _list_directory(subdir)
+        if ('__init__.py' in init_filenames or
+            '__init__.pyc' in init_filenames):
+            return subdir, imp.PKG_DIRECTORY
+    for (suffix, mode, typ) in imp.get_suffixes():
+        if identifier+suffix in filenames:
+            return os.path.join(dirname, identifier+suffix), typ
+    return None
+
+def _list_directory(dirname):
+    """
+    @return: The set of file names in the directory C{dirname}; or
+        an empty set if it is not a readable directory.
+    """
+    filenames = _directory_index.get(dirname)
+    if filenames is None:
+        try: filenames = set(os.listdir(dirname or os.curdir))
+        except (OSError, UnicodeError): filenames = set()
+        _directory_index[dirname] = filenames
+    return filenames
+
+def _module_file_exists(filename):
+    """
+    @return: True if the file C{filename} exists (according to
+        L{_directory_index}).
+    """
+    dirname, basename = os.path.split(filename)
+    return basename in _list_directory(dirname)
+
 #/////////////////////////////////////////////////////////////////
 #{ File tokenization loop
 #/////////////////////////////////////////////////////////////////
@@ -524,19 +1103,29 @@ def process_file(module_doc):
     # inside that block, not outside it.
     start_group = None
 
-    # Check if the source file declares an encoding.
-    encoding = get_module_encoding(module_doc.filename)
+    # When we encounter the body of a function that should not be
+    # parsed (see PARSE_FUNCTION_BODIES), set this to True until we
+    # reach the end of the body's first line.  If that line is the
+    # function's docstring, then it is processed; but the rest of
+    # the body is skipped.
+    skip_body = False
+
+    # Read the source file (or get it from the source cache, along
+    # with its tokens), and check if it declares an encoding.
+    source_file = get_source_file(module_doc.filename)
+    encoding = source_file.encoding
 
     # The token-eating loop:
     try:
-        module_file = codecs.open(module_doc.filename, 'rU', encoding)
+        source_file.lines()
+        tok_iter = source_file.generate_tokens()
     except LookupError:
         log.warning("Unknown encoding %r for %s; using the default"
                     "encoding instead (iso-8859-1)" %
                     (encoding, module_doc.filename))
         encoding = 'iso-8859-1'
-        module_file = codecs.open(module_doc.filename, 'rU', encoding)
-    tok_iter = tokenize.generate_tokens(module_file.readline)
+        lines = split_source_lines(source_file.source.decode(encoding))
+        tok_iter = tokenize.generate_tokens(iter(lines).next)
     for toktype, toktext, (srow,scol), (erow,ecol), line_str in tok_iter:
         # BOM encoding marker: ignore.
         if (toktype == token.ERRORTOKEN and
@@ -557,6 +1146,7 @@ def process_file(module_doc):
             else:
                 parent_docs.append(prev_line_doc)
             groups.append(None)
+            skip_body = skip_function_body(prev_line_doc)
                 
         # Dedent token: update the parent_doc stack.
         elif toktype == token.DEDENT:
@@ -572,9 +1162,11 @@ def process_file(module_doc):
         # Line-internal newline token: if we're still at the start of
         # the logical line, and we've seen one or more comment lines,
         # then discard them: blank lines are not allowed between a
-        # comment block and the thing it describes.
+        # comment block and the thing it describes.  (The tokenizer
+        # also generates an NL token at the end of each comment line,
+        # which should not discard the comment.)
         elif toktype == tokenize.NL:
-            if comments and not line_toks:
+            if comments and not line_toks and not line_str.strip():
                 log.warning('Ignoring docstring comment block followed by '
                             'a blank line in %r on line %r' %
                             (module_doc.filename, srow-1))
@@ -628,6 +1220,12 @@ def process_file(module_doc):
                 groups[-1] = start_group
                 start_group = None
 
+            # Skip the body of a function that should not be parsed,
+            # except for its docstring (see PARSE_FUNCTION_BODIES).
+            if skip_body and not (len(line_toks) == 1 and
+                                  line_toks[0][0] == token.STRING):
+                parent_docs[-1] = 'skip_block'
+
             if parent_docs[-1] != 'skip_block':
                 try:
                     prev_line_doc = process_line(
@@ -644,32 +1242,56 @@ def process_file(module_doc):
                     raise
 
                 # grouping...
-                if groups[-1] and prev_line_doc not in (None, 'skip_block'):
-                    if isinstance(prev_line_doc, VariableDoc):
-                        # prev_line_doc's container will only be
-                        # UNKNOWN if it's an instance variable that
-                        # didn't have a doc-comment, but might still
-                        # be followed by a docstring.  Since we
-                        # tokenize in order, we can't do lookahead to
-                        # see if the variable will have a comment; but
-                        # it should only be added to the container if
-                        # it does.  So we defer the grouping of that
-                        # to be handled by process_docstring instead.
-                        if prev_line_doc.container is not UNKNOWN:
-                            add_to_group(prev_line_doc.container,
-                                         prev_line_doc, groups[-1])
-                    elif isinstance(parent_docs[-1], NamespaceDoc):
-                        add_to_group(parent_docs[-1], prev_line_doc,
-                                     groups[-1])
+                if groups[-1]:
+                    group_line_doc(prev_line_doc, parent_docs, groups[-1])
             else:
                 prev_line_doc = None
 
+            # Skip the rest of the function body.
+            if skip_body:
+                parent_docs[-1] = 'skip_block'
+                skip_body = False
+
             # Reset line contents.
             line_toks = []
             lineno = None
             comments = []
             decorators = []
             
+def skip_function_body(line_doc):
+    """
+    Return true if C{line_doc} is the C{RoutineDoc} for a function
+    whose body should not be examined, other than its docstring (see
+    L{PARSE_FUNCTION_BODIES}).
+    """
+    if PARSE_FUNCTION_BODIES == 'all' or not isinstance(line_doc, RoutineDoc):
+        return False
+    elif PARSE_FUNCTION_BODIES == 'init':
+        name = line_doc.canonical_name
+        return name is UNKNOWN or name[-1] != '__init__'
+    else:
+        return True
+
+def group_line_doc(line_doc, parent_docs, group_name):
+    """
+    Add C{line_doc}, the C{APIDoc} that was defined by a logical
+    line, to the group named C{group_name}.
+    """
+    if line_doc in (None, 'skip_block'):
+        return
+    if isinstance(line_doc, VariableDoc):
+        # line_doc's container will only be UNKNOWN if it's an
+        # instance variable that didn't have a doc-comment, but might
+        # still be followed by a docstring.  Since we tokenize in
+        # order, we can't do lookahead to see if the variable will
+        # have a comment; but it should only be added to the
+        # container if it does.  So we defer the grouping of that to
+        # be handled by process_docstring instead.
+        if line_doc.container is not UNKNOWN:
+            add_to_group(line_doc.container, line_doc, group_name)
+    elif isinstance(parent_docs[-1], NamespaceDoc):
+        add_to_group(parent_docs[-1], line_doc, group_name)
+
 def add_to_group(container, api_doc, group_name):
     if container.group_specs is UNKNOWN:
         container.group_specs = []
@@ -696,6 +1318,1100 @@ def script_guard(line):
         and line[4][1] == ':'
         and line[3][1][1:-1] == '__main__')
 
+#/////////////////////////////////////////////////////////////////
+#{ AST-based file processing
+#/////////////////////////////////////////////////////////////////
+
+def process_file_ast(module_doc):
+    """
+    Read the given C{ModuleDoc}'s file, and add variables
+    corresponding to any objects defined in that file.  This is the
+    L{PARSER_BACKEND} C{'ast'} alternative to L{process_file()}:
+    instead of tokenizing the whole file, compile it to an abstract
+    syntax tree, and build the C{APIDoc}s from the tree's statements
+    (see L{_ASTWalker}).  The names that are defined, imported and
+    assigned, the arguments of functions, the bases of classes, and
+    docstrings are read from the tree.  Only the source code of
+    values (such as the right hand side of an assignment, or a
+    default argument value) is tokenized, since their token trees
+    and C{parse_repr}s are recorded.  Function bodies are skipped,
+    unless they might document an instance variable.  Both backends
+    create the same C{APIDoc}s.
+
+    If the file can't be compiled by this version of python, then
+    fall back on L{process_file()}.
+    """
+    source_file = get_source_file(module_doc.filename)
+    # The syntax tree for a large module has a lot of nodes, and none
+    # of them are garbage until we're done with it; so don't let the
+    # cyclic garbage collector keep rescanning them.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            if ast is None:
+                raise SyntaxError('the ast module is not available')
+            walker = _ASTWalker(module_doc, source_file)
+        except (SyntaxError, TypeError, LookupError), e:
+            log.debug('Unable to compile %s (%s); tokenizing it instead' %
+                      (module_doc.filename, e))
+            process_file(module_doc)
+        else:
+            walker.process_body(walker.tree.body, [module_doc], None)
+    finally:
+        if gc_was_enabled: gc.enable()
+
+#: A regular expression that matches a token (and any whitespace
+#: before it), for L{_ASTWalker.line_tokens()}.  This matches the
+#: same tokens as C{tokenize.PseudoToken}, but it has a single group,
+#: so C{findall()} returns a list of token strings; and names (the most
+#: common tokens) are tried early.  The start of a triple-quoted
+#: string is matched, but not the rest of the string.
+_LINE_TOKEN_RE = re.compile(r"""
+    [ \f\t]*(
+      [uUbB]?[rR]?(?:\'\'\'|\"\"\"|                          # strings
+                     '[^\n'\\]*(?:\\.[^\n'\\]*)*(?:'|\\\r?\n)|
+                     "[^\n"\\]*(?:\\.[^\n"\\]*)*(?:"|\\\r?\n))
+    | [a-zA-Z_]\w*                                       # names
+    | \d+[jJ] | (?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?[jJ]? # numbers
+    | \d+[eE][-+]?\d+[jJ]? | 0[xX][\da-fA-F]+[lL]?
+    | 0[bB][01]+[lL]? | 0[oO][0-7]+ | 0[0-7]*[lL]? | [1-9]\d*[lL]?
+    | \*\*=? | >>=? | <<=? | <> | != | //=?               # operators
+    | [+\-*/%&|^=<>]=? | [~()[\]{}:;.,`@]
+    | \#[^\r\n]*                                         # comments
+    | \\?\r?\n                                           # line ends
+    )""", re.VERBOSE)
+
+#: The type of the tokens that start with each character, for
+#: L{_ASTWalker.line_tokens()}.  (Tokens that start with any other
+#: character are operators.)  C{tokenize.NL} is used for the tokens
+#: that end a physical line.
+_LINE_TOKEN_TYPES = dict(
+    [(c, token.NAME) for c in 'abcdefghijklmnopqrstuvwxyz'
+                              'ABCDEFGHIJKLMNOPQRSTUVWXYZ_'] +
+    [(c, token.NUMBER) for c in '0123456789'] +
+    [(c, token.STRING) for c in '\'"'] +
+    [('#', tokenize.COMMENT)] +
+    [(c, tokenize.NL) for c in '\\\r\n'])
+
+#: A regular expression that matches a line that starts with a string
+#: (see L{_ASTWalker.may_define_instvars()}).
+_STRING_LINE_RE = re.compile(r'[ \t\f]*[uUbBrR]{0,2}[\'"]')
+
+class _ASTWalker:
+    """
+    The state that L{process_file_ast()} uses while it walks the
+    abstract syntax tree of a module.  The attributes
+    C{prev_line_doc}, C{comments}, C{groups}, and C{start_group}
+    play the same roles as the variables with the same names in
+    L{process_file()}; and the C{parent_docs} lists that are passed
+    to the C{process_*} methods are C{process_file()}'s stack of
+    C{APIDoc}s, one for each indentation level.
+
+    The methods named C{process_I{NodeType}} handle a statement of
+    the given node type.  They are responsible for processing the
+    statement's logical line (and any blocks that it contains), and
+    for updating C{prev_line_doc} by calling L{end_line()}.  Most
+    statements are handled directly from the syntax tree.  Rare
+    statements whose meaning depends on the details of their
+    tokens (such as one-line blocks, semicolon-separated statements,
+    assignments to subscripts or tuples, and C{del} statements) are
+    tokenized and processed with L{process_line()}, just as
+    C{process_file()} does.
+    """
+    def __init__(self, module_doc, source_file):
+        self.module_doc = module_doc
+        self.encoding = source_file.encoding
+
+        # Compile the source.  Compiling the encoded source lets
+        # python handle the encoding declaration.
+        source = source_file.source
+        source = source.replace('\r\n', '\n').replace('\r', '\n')
+        self.tree = compile(source, module_doc.filename, 'exec',
+                            ast.PyCF_ONLY_AST, True)
+
+        # The source file's lines are shared, so copy them before
+        # removing the byte order mark (if any).
+        self.lines = source_file.lines()
+        if self.lines and self.lines[0].startswith(u'\ufeff'):
+            self.lines = [self.lines[0][1:]] + self.lines[1:]
+
+        self.prev_line_doc = module_doc
+        self.comments = []
+        self.groups = [None]
+        self.start_group = None
+
+        #: The last line whose comments have been processed.
+        self.last_lineno = 0
+        #: The statement that follows the one being processed (if any).
+        self.next_stmt = None
+        #: The lines that contain comment docstring markers or group
+        #: markers (see L{marker_linenos()}), or C{None} if they have
+        #: not been found yet.
+        self._marker_linenos = None
+
+    #/////////////////////////////////////////////////////////////
+    # Blocks
+    #/////////////////////////////////////////////////////////////
+
+    def process_body(self, stmts, parent_docs, end_lineno):
+        """
+        Process a list of statements, which are contained in
+        C{parent_docs[-1]}.
+        @param end_lineno: The first line of the statement that
+            follows C{stmts}, or C{None} if they end the file.
+        """
+        for i, stmt in enumerate(stmts):
+            lineno = self.first_lineno(stmt)
+            # Skip statements that were already processed as part of
+            # an earlier logical line (e.g., "x=1; y=2").
+            if lineno <= self.last_lineno: continue
+            if i+1 < len(stmts):
+                self.next_stmt = stmts[i+1]
+                next_lineno = self.first_lineno(self.next_stmt)
+            else:
+                self.next_stmt = None
+                next_lineno = end_lineno
+            self.start_line(lineno)
+            handler = getattr(self, 'process_'+stmt.__class__.__name__,
+                              self.process_other)
+            handler(stmt, parent_docs, next_lineno)
+
+    def process_block(self, stmts, parent_docs, end_lineno):
+        """
+        Process an indented block of statements, which follows a line
+        that has already been processed.
+        """
+        if self.prev_line_doc is None:
+            parent_docs = parent_docs + [parent_docs[-1]]
+        else:
+            parent_docs = parent_docs + [self.prev_line_doc]
+        self.groups.append(None)
+        if parent_docs[-1] == 'skip_block':
+            self.prev_line_doc = None
+        else:
+            self.process_body(stmts, parent_docs, end_lineno)
+        # Comments that come before the end of the block belong to the
+        # block (e.g., for END_GROUP_MARKER).
+        if end_lineno is not None:
+            self.scan_comments(end_lineno)
+        self.groups.pop()
+
+    def process_clause(self, line_doc, stmts, parent_docs, end_lineno):
+        """
+        Process a control flow clause, such as an C{if} or C{else}
+        clause.  C{line_doc} is the result of processing its line.
+        """
+        self.end_line(line_doc, parent_docs)
+        if not self.is_one_line_block(stmts):
+            self.process_block(stmts, parent_docs, end_lineno)
+
+    def process_function_body(self, stmt, parent_docs, end_lineno):
+        """
+        Process the body of the function definition C{stmt}, whose
+        line has already been processed.  If the body can't define
+        any instance variables, or if it should not be examined (see
+        L{PARSE_FUNCTION_BODIES}), then only its docstring (if any)
+        is processed.
+        """
+        body = stmt.body
+        if (skip_function_body(self.prev_line_doc) or
+            not self.may_define_instvars(stmt, end_lineno)):
+            if _is_ast_docstring(body[0]):
+                body = body[:1]
+            else:
+                body = []
+        self.process_block(body, parent_docs, end_lineno)
+        if body is not stmt.body:
+            self.prev_line_doc = None
+
+    def may_define_instvars(self, stmt, end_lineno):
+        """
+        Return true if the body of the function definition C{stmt}
+        might define an instance variable.  Instance variables are
+        only added if they have a comment docstring or a string
+        docstring, so the body can be skipped unless it contains a
+        comment docstring or a string statement (other than its own
+        docstring), or it is followed by a string statement (which
+        would document an instance variable that is assigned on the
+        body's last line).  A body that contains a group marker is
+        never skipped.
+        """
+        start = self.last_lineno
+        body = stmt.body
+        if _is_ast_docstring(body[0]):
+            body = body[1:]
+        if end_lineno is None:
+            end_lineno = len(self.lines)+1
+        # If the next statement is a multi-line string, then its first
+        # line may not be known yet (see first_lineno()).
+        elif end_lineno <= start:
+            return True
+        if (end_lineno <= len(self.lines) and
+            _STRING_LINE_RE.match(self.lines[end_lineno-1])):
+            return True
+        marker_linenos = self.marker_linenos()
+        i = bisect.bisect_right(marker_linenos, start)
+        if i < len(marker_linenos) and marker_linenos[i] <= end_lineno:
+            return True
+        return _ast_contains_string_stmt(body)
+
+    def marker_linenos(self):
+        """
+        Return a sorted list of the line numbers of the lines that
+        contain a comment docstring marker or a group marker.
+        """
+        if self._marker_linenos is None:
+            markers = [re.escape(marker) for marker in
+                       (COMMENT_DOCSTRING_MARKER, START_GROUP_MARKER,
+                        END_GROUP_MARKER)]
+            # Search the whole file at once, and then count the
+            # newlines before each match.
+            self._marker_linenos = _match_linenos(
+                re.compile('|'.join(markers)), u''.join(self.lines))
+        return self._marker_linenos
+
+    def is_one_line_block(self, stmts):
+        """
+        Return true if the block C{stmts} starts on the same line as
+        the statement that contains it.  (The contents of a one-line
+        block are processed together with its first line, just as
+        they are by L{process_one_line_block()}.)
+        """
+        stmt = stmts[0]
+        return (stmt.col_offset > 0 and
+                self.lines[stmt.lineno-1][:stmt.col_offset].strip() != '')
+
+    def first_lineno(self, stmt):
+        """
+        Return the line number where C{stmt} starts.
+        """
+        if stmt.col_offset >= 0 or stmt.lineno <= self.last_lineno:
+            return stmt.lineno
+        # For a multi-line string, the syntax tree gives the line
+        # where the string ends.  The string starts on the first line
+        # after the last line that was processed that isn't blank or
+        # a comment.  (That is always correct when the string is a
+        # docstring, since the line that it documents was processed.)
+        lineno = self.last_lineno + 1
+        while lineno < stmt.lineno:
+            line = self.lines[lineno-1].strip()
+            if line and not line.startswith('#'): break
+            lineno += 1
+        return lineno
+
+    #/////////////////////////////////////////////////////////////
+    # Logical lines & comments
+    #/////////////////////////////////////////////////////////////
+
+    def start_line(self, lineno):
+        """
+        Prepare to process the logical line that starts on line
+        C{lineno} (or on an unknown line, if C{lineno} is C{None}).
+        """
+        if lineno is not None:
+            self.scan_comments(lineno)
+        if self.start_group:
+            self.groups[-1] = self.start_group
+            self.start_group = None
+
+    def end_line(self, line_doc, parent_docs):
+        """
+        Record C{line_doc} as the C{APIDoc} that was defined by the
+        logical line that was just processed.
+        """
+        self.prev_line_doc = line_doc
+        if self.groups[-1]:
+            group_line_doc(line_doc, parent_docs, self.groups[-1])
+        self.comments = []
+
+    def scan_comments(self, lineno):
+        """
+        Process the comments and blank lines that come directly
+        before line C{lineno}, and have not been processed yet.
+        """
+        if lineno-1 <= self.last_lineno: return
+        start = lineno-1
+        while start > self.last_lineno:
+            line = self.lines[start-1].strip()
+            if line and not line.startswith('#'): break
+            start -= 1
+        for i in range(start+1, lineno):
+            line = self.lines[i-1].strip()
+            if line: self.comment(line, i)
+            else: self.blank_line(i)
+        self.last_lineno = max(self.last_lineno, lineno-1)
+
+    def next_code_lineno(self):
+        """
+        Process the comments and blank lines that follow the last
+        line that was processed, and return the number of the line
+        after them.
+        """
+        lineno = self.last_lineno + 1
+        while lineno <= len(self.lines):
+            line = self.lines[lineno-1].strip()
+            if line and not line.startswith('#'): break
+            lineno += 1
+        self.scan_comments(lineno)
+        return lineno
+
+    def comment(self, comment, lineno):
+        """Handle a comment, as L{process_file()} does."""
+        if comment.startswith(COMMENT_DOCSTRING_MARKER):
+            comment_line = comment[len(COMMENT_DOCSTRING_MARKER):].rstrip()
+            if comment_line.startswith(" "):
+                comment_line = comment_line[1:]
+            self.comments.append( [comment_line, lineno])
+        elif comment.startswith(START_GROUP_MARKER):
+            self.start_group = comment[len(START_GROUP_MARKER):].strip()
+        elif comment.startswith(END_GROUP_MARKER):
+            for i in range(len(self.groups)-1, -1, -1):
+                if self.groups[i]:
+                    self.groups[i] = None
+                    break
+            else:
+                log.warning("Got group end marker without a corresponding "
+                            "start marker in %r on line %r" %
+                            (self.module_doc.filename, lineno))
+
+    def blank_line(self, lineno):
+        """Handle a blank line, as L{process_file()} does."""
+        if self.comments:
+            log.warning('Ignoring docstring comment block followed by '
+                        'a blank line in %r on line %r' %
+                        (self.module_doc.filename, lineno-1))
+            self.comments = []
+
+    def line_tokens(self, lineno):
+        """
+        Tokenize the logical line that starts on line C{lineno}, and
+        return its token tree (see L{shallow_parse()}).  This is much
+        faster than L{logical_lines()}, since all of the tokens on a
+        physical line are found by a single regular expression
+        search.  But it only handles lines that contain a single
+        statement (or the first line of a compound statement), and
+        no strings that span more than one line; for any other line,
+        return C{None} without processing anything, and leave the
+        line to L{process_tokenized()}.  Comments are handled once
+        the line has been read.
+        """
+        lines = self.lines
+        findall = _LINE_TOKEN_RE.findall
+        token_types = _LINE_TOKEN_TYPES
+        NAME, STRING, OP = token.NAME, token.STRING, token.OP
+        stack = [[]]
+        comments = []
+        i = lineno-1
+        while i < len(lines):
+            continued = False
+            for toktext in findall(lines[i]):
+                c = toktext[0]
+                toktype = token_types.get(c, OP)
+                if toktype == OP:
+                    if c in '([{':
+                        stack.append([(OP, toktext)])
+                        continue
+                    elif c in ')]}':
+                        group = stack.pop()
+                        group.append((OP, toktext))
+                        stack[-1].append(group)
+                        continue
+                    elif c == '.' and len(toktext) > 1:
+                        toktype = token.NUMBER
+                elif toktype == NAME:
+                    # String prefixes (e.g., u'...') look like names.
+                    if toktext[-1] in '\'"\n':
+                        toktype = STRING
+                elif toktype == tokenize.COMMENT:
+                    comments.append( (toktext, i+1) )
+                    continue
+                elif toktype == tokenize.NL:
+                    continued = (c == '\\')
+                    continue
+                if toktype == STRING:
+                    # Give up on multi-line strings.
+                    if (toktext[-1] == '\n' or
+                        toktext in tokenize.triple_quoted):
+                        return None
+                    # As in logical_lines(), re-encode non-unicode
+                    # strings.  (Only a 'u' prefix can come first.)
+                    if c != 'u':
+                        s = toktext.encode(self.encoding)
+                        toktext = decode_with_backslashreplace(s)
+                stack[-1].append( (toktype, toktext) )
+            i += 1
+            if len(stack) == 1 and not continued: break
+        line = stack[0]
+        if (len(stack) != 1 or (OP, ';') in line or
+            (OP, ':') in line[:-1]):
+            return None
+        for comment, comment_lineno in comments:
+            self.comment(comment, comment_lineno)
+        self.last_lineno = max(self.last_lineno, i)
+        return line
+
+    def logical_lines(self, lineno):
+        """
+        Tokenize the source, starting with line C{lineno}, and
+        generate a C{(line_toks, lineno)} tuple for each logical line,
+        where C{line_toks} is a flat list of the line's tokens (in the
+        same form as in L{process_file()}).  Comments are handled as
+        they are read.
+        """
+        lines = self.lines
+        line_index = [lineno-1]
+        def readline():
+            i = line_index[0]
+            line_index[0] = i+1
+            if i < len(lines): return lines[i]
+            else: return u''
+        line_toks = []
+        tok_iter = tokenize.generate_tokens(readline)
+        for toktype, toktext, (srow,scol), _, line_str in tok_iter:
+            srow += lineno-1
+            if toktype == tokenize.COMMENT:
+                self.comment(toktext, srow)
+            elif toktype == tokenize.NL:
+                if not line_toks and not line_str.strip():
+                    self.blank_line(srow)
+            elif toktype == token.NEWLINE or toktype == token.ENDMARKER:
+                if line_toks:
+                    self.last_lineno = max(self.last_lineno, srow)
+                    yield line_toks, first_lineno
+                    line_toks = []
+            elif toktype != token.INDENT and toktype != token.DEDENT:
+                if not line_toks: first_lineno = srow
+                if toktype == token.STRING:
+                    str_prefixes = re.match('[^\'"]*', toktext).group()
+                    if 'u' not in str_prefixes:
+                        s = toktext.encode(self.encoding)
+                        toktext = decode_with_backslashreplace(s)
+                line_toks.append( (toktype, toktext) )
+
+    def process_line(self, line, lineno, parent_docs, decorators=()):
+        """
+        Process a (shallow parsed) logical line with L{process_line()}
+        (the module function), and return its result.
+        """
+        return self.call(lineno, process_line, line, parent_docs,
+                         self.prev_line_doc, lineno, self.comments,
+                         list(decorators), self.encoding)
+
+    def process_tokenized(self, stmt, parent_docs, next_lineno):
+        """
+        Handle a statement by tokenizing its logical line, and
+        processing it with L{process_line()}.
+        """
+        for line_toks, lineno in self.logical_lines(stmt.lineno):
+            line = self.call(lineno, shallow_parse, line_toks)
+            self.end_line(self.process_line(line, lineno, parent_docs),
+                          parent_docs)
+            break
+
+    def call(self, lineno, func, *args):
+        """
+        Return C{func(*args)}, reporting any errors as
+        L{process_file()} does.
+        """
+        try:
+            return func(*args)
+        except ParseError, e:
+            raise ParseError('Error during parsing: invalid '
+                             'syntax (%s, line %d) -- %s' %
+                             (self.module_doc.filename, lineno, e))
+        except KeyboardInterrupt, e: raise
+        except Exception, e:
+            log.error('Internal error during parsing (%s, line '
+                      '%s):\n%s' % (self.module_doc.filename, lineno, e))
+            raise
+
+    #/////////////////////////////////////////////////////////////
+    # Statement handlers
+    #/////////////////////////////////////////////////////////////
+
+    def process_other(self, stmt, parent_docs, next_lineno):
+        # Statements that don't define anything (e.g. "pass").
+        self.end_line(None, parent_docs)
+
+    def process_Expr(self, stmt, parent_docs, next_lineno):
+        # Docstrings: the string literal's value is already known.
+        if isinstance(stmt.value, ast.Str):
+            if self.prev_line_doc in (None, 'skip_block'):
+                line_doc = None
+            else:
+                lineno = self.first_lineno(stmt)
+                line_doc = self.call(lineno, add_docstring, stmt.value.s,
+                                     parent_docs, self.prev_line_doc,
+                                     lineno, self.encoding)
+            self.end_line(line_doc, parent_docs)
+        # __all__.append(...)
+        elif (isinstance(stmt.value, ast.Call) and
+              isinstance(stmt.value.func, ast.Attribute) and
+              stmt.value.func.attr == 'append' and
+              _is_ast_name(stmt.value.func.value, '__all__')):
+            self.process_tokenized(stmt, parent_docs, next_lineno)
+        else:
+            self.end_line(None, parent_docs)
+
+    def process_Assign(self, stmt, parent_docs, next_lineno):
+        # Assignments define variables in namespaces, and instance
+        # variables (self.x=...) in methods.
+        parent_doc = parent_docs[-1]
+        if not (isinstance(parent_doc, NamespaceDoc) or
+                (isinstance(parent_doc, RoutineDoc) and
+                 len(stmt.targets) == 1 and
+                 isinstance(stmt.targets[0], ast.Attribute) and
+                 isinstance(stmt.targets[0].value, ast.Name) and
+                 self.may_document_instvar(stmt, next_lineno))):
+            self.end_line(None, parent_docs)
+            return
+        # Only assignments to dotted names are handled here.  The
+        # right hand side is tokenized, since a GenericValueDoc
+        # records its tokens.
+        lhs_names = [_ast_dotted_name(target) for target in stmt.targets]
+        for lhs_name in lhs_names:
+            if lhs_name is None: line = None; break
+        else:
+            line = self.line_tokens(stmt.lineno)
+        if line is None:
+            self.process_tokenized(stmt, parent_docs, next_lineno)
+        else:
+            self.end_line(self.call(stmt.lineno, self.assign, stmt, line,
+                                    lhs_names, parent_docs), parent_docs)
+
+    def may_document_instvar(self, stmt, next_lineno):
+        """
+        Return true if the assignment C{stmt} (in a method) might
+        document an instance variable.  Instance variables are only
+        added if they have a comment docstring or a string docstring,
+        so most assignments in method bodies can be skipped without
+        tokenizing them.
+        """
+        if self.comments or next_lineno is None: return True
+        if _is_ast_docstring(self.next_stmt):
+            return True
+        for line in self.lines[stmt.lineno-1:next_lineno-1]:
+            if '#' in line: return True
+        return False
+
+    def assign(self, stmt, line, lhs_names, parent_docs):
+        """
+        Handle an assignment to one or more dotted names, as
+        L{process_assignment()} does, and return the new
+        C{prev_line_doc}.  C{line} is the assignment's token tree.
+        """
+        pieces = split_on(line, (token.OP, '='))
+        lhs_pieces = pieces[:-1]
+        rhs = pieces[-1]
+
+        # Decide whether the variable is an instance variable or not.
+        # If it's an instance var, then discard the value.
+        is_instvar = lhs_is_instvar(lhs_pieces, parent_docs)
+        if not (is_instvar or isinstance(parent_docs[-1], NamespaceDoc)):
+            return None
+        if not is_instvar:
+            rhs_val, is_alias = rhs_to_valuedoc(rhs, parent_docs,
+                                                stmt.lineno)
+        else:
+            rhs_val, is_alias = UNKNOWN, False
+
+        # Assign the right hand side value to each left hand side.
+        # (Do the rightmost assignment first)
+        for lhs_name in lhs_names[::-1]:
+            lhs_parent = get_lhs_parent(lhs_name, parent_docs)
+            if lhs_parent is None: continue
+
+            # Skip a special class variable.
+            if lhs_name[-1] == '__slots__':
+                continue
+
+            # Handle metaclass assignment
+            if (lhs_name[-1] == '__metaclass__' and
+                isinstance(parent_docs[-1], ClassDoc)):
+                parent_docs[-1].metaclass = rhs_val
+                continue
+
+            var_doc = VariableDoc(name=lhs_name[-1], value=rhs_val,
+                                  is_imported=False, is_alias=is_alias,
+                                  is_instvar=is_instvar,
+                                  docs_extracted_by='parser')
+            if len(lhs_names) == 1:
+                add_docstring_from_comments(var_doc, self.comments)
+
+            # An instance variable without a comment docstring is only
+            # added if it's followed by a string docstring (see
+            # process_assignment()).
+            if (not is_instvar) or self.comments:
+                set_variable(lhs_parent, var_doc, True)
+
+            if (len(lhs_names) == 1 and
+                (len(lhs_name) == 1 or is_instvar)):
+                return var_doc
+
+            # If we have multiple left-hand-sides, then all but the
+            # rightmost one are considered aliases.
+            is_alias = True
+
+    def process_AugAssign(self, stmt, parent_docs, next_lineno):
+        # __all__ += [...]
+        if _is_ast_name(stmt.target, '__all__'):
+            self.process_tokenized(stmt, parent_docs, next_lineno)
+        else:
+            self.end_line(None, parent_docs)
+
+    def process_Import(self, stmt, parent_docs, next_lineno):
+        # Relative "import *" statements are left to process_line(),
+        # which reports them as errors.
+        if not isinstance(parent_docs[-1], NamespaceDoc):
+            self.end_line(None, parent_docs)
+        elif ((isinstance(stmt, ast.ImportFrom) and stmt.level and
+               stmt.names[0].name == '*') or
+              self.line_tokens(stmt.lineno) is None):
+            self.process_tokenized(stmt, parent_docs, next_lineno)
+        else:
+            self.call(stmt.lineno, self.import_names, stmt, parent_docs)
+            self.end_line(None, parent_docs)
+    process_ImportFrom = process_Import
+
+    def import_names(self, stmt, parent_docs):
+        """
+        Handle an C{import} or C{from ... import} statement, as
+        L{process_import()} and L{process_from_import()} do.
+        """
+        # >>> import os.path, sys as system
+        if isinstance(stmt, ast.Import):
+            for alias in stmt.names:
+                src_name = _ast_module_name(alias.name)
+                if alias.asname is None:
+                    _import_var(src_name, parent_docs)
+                else:
+                    _import_var_as(src_name, unicode(alias.asname),
+                                   parent_docs)
+            return
+
+        # >>> from __future__ import nested_scopes
+        if stmt.module == '__future__' and not stmt.level:
+            return
+
+        # >>> from sys import *
+        if stmt.names[0].name == '*':
+            _process_fromstar_import(_ast_module_name(stmt.module),
+                                     parent_docs)
+            return
+
+        # >>> from os.path import join, split
+        # Relative imports are resolved as in parse_dotted_name().
+        if stmt.level:
+            src_name = parent_docs[-1].canonical_name[:-stmt.level]
+            if stmt.module is not None:
+                src_name = src_name + _ast_module_name(stmt.module)
+            elif src_name == []:
+                raise ParseError("Attempted relative import in non-package, "
+                                 "or beyond toplevel package")
+        else:
+            src_name = _ast_module_name(stmt.module)
+        for alias in stmt.names:
+            orig_name = unicode(alias.name)
+            if alias.asname is None: var_name = orig_name
+            else: var_name = unicode(alias.asname)
+            _import_var_as(DottedName(src_name, orig_name), var_name,
+                           parent_docs)
+
+    def process_Delete(self, stmt, parent_docs, next_lineno):
+        if isinstance(parent_docs[-1], NamespaceDoc):
+            self.process_tokenized(stmt, parent_docs, next_lineno)
+        else:
+            self.end_line(None, parent_docs)
+
+    def process_FunctionDef(self, stmt, parent_docs, next_lineno):
+        # Definitions outside of namespaces don't define anything,
+        # but their bodies may still define instance variables.
+        if not isinstance(parent_docs[-1], NamespaceDoc):
+            self.end_line(None, parent_docs)
+            if not self.is_one_line_block(stmt.body):
+                self.process_function_body(stmt, parent_docs, next_lineno)
+            return
+        header = None
+        if not self.is_one_line_block(stmt.body):
+            header = self.read_header(stmt)
+        if header is None:
+            self.process_tokenized_def(stmt, parent_docs, next_lineno)
+            return
+        func_doc = self.call(stmt.lineno, self.define_function, stmt,
+                             header[0], header[1], parent_docs)
+        self.end_line(func_doc, parent_docs)
+        self.process_function_body(stmt, parent_docs, next_lineno)
+
+    def process_ClassDef(self, stmt, parent_docs, next_lineno):
+        if not isinstance(parent_docs[-1], NamespaceDoc):
+            self.end_line(None, parent_docs)
+            if not self.is_one_line_block(stmt.body):
+                self.process_block(stmt.body, parent_docs, next_lineno)
+            return
+        header = None
+        if not self.is_one_line_block(stmt.body):
+            header = self.read_header(stmt)
+        if header is None:
+            self.process_tokenized_def(stmt, parent_docs, next_lineno)
+            return
+        class_doc = self.call(stmt.lineno, self.define_class, stmt,
+                              parent_docs)
+        self.end_line(class_doc, parent_docs)
+        self.process_block(stmt.body, parent_docs, next_lineno)
+
+    def read_header(self, stmt):
+        """
+        Read the decorators and the definition line of the function
+        or class definition C{stmt}, and return a tuple C{(line,
+        decorators)}, where C{line} is the definition line's token
+        tree, and C{decorators} is a list of token trees, one for
+        each decorator.  The definition line is only tokenized if it
+        is needed: if there are decorators, default argument values
+        (whose C{parse_repr}s are read from the tokens), or comments,
+        or if the line is continued.  Otherwise, C{line} is C{None}.
+        Return C{None} if the lines can't be tokenized by
+        L{line_tokens()}.
+        """
+        lineno = stmt.lineno
+        line = self.lines[lineno-1]
+        if not (stmt.decorator_list or '#' in line or
+                not line.rstrip().endswith(':') or
+                (isinstance(stmt, ast.FunctionDef) and stmt.args.defaults)):
+            self.last_lineno = max(self.last_lineno, lineno)
+            return None, []
+        decorators = []
+        while True:
+            line = self.line_tokens(lineno)
+            if line is None: return None
+            if line[0] != (token.OP, '@'): return line, decorators
+            decorators.append(line)
+            lineno = self.next_code_lineno()
+
+    def define_function(self, stmt, line, decorators, parent_docs):
+        """
+        Create a C{RoutineDoc} for the function definition C{stmt},
+        and add it to C{parent_docs[-1]}, as L{process_funcdef()}
+        does; and return it.  C{line} and C{decorators} are the token
+        trees of the definition line and its decorators (see
+        L{read_header()}).
+        """
+        parent_doc = parent_docs[-1]
+        func_name = unicode(stmt.name)
+        canonical_name = DottedName(parent_doc.canonical_name, func_name)
+        func_doc = RoutineDoc(canonical_name=canonical_name,
+                              defining_module=parent_docs[0],
+                              lineno=stmt.lineno, docs_extracted_by='parser')
+
+        # Process the signature.  The default values' reprs come from
+        # the definition line's tokens.
+        args = stmt.args
+        func_doc.posargs = [_ast_funcdef_arg(arg) for arg in args.args]
+        func_doc.posarg_defaults = [None] * (len(args.args) -
+                                             len(args.defaults))
+        if args.defaults:
+            for arg in split_on(line[2][1:-1], (token.OP, ',')):
+                if len(arg) > 2 and arg[1] == (token.OP, '='):
+                    default_repr = pp_toktree(arg[2:], 'tight')
+                    func_doc.posarg_defaults.append(GenericValueDoc(
+                        parse_repr=default_repr, docs_extracted_by='parser'))
+        func_doc.vararg = args.vararg and unicode(args.vararg)
+        func_doc.kwarg = args.kwarg and unicode(args.kwarg)
+
+        # If the preceeding comment includes a docstring, then add it.
+        add_docstring_from_comments(func_doc, self.comments)
+
+        # Apply any decorators (innermost first).
+        func_doc.decorators = [pp_toktree(deco[1:]) for deco in decorators]
+        for deco_node, decorator in zip(stmt.decorator_list,
+                                        decorators)[::-1]:
+            if func_doc.canonical_name is not UNKNOWN:
+                deco_repr = '%s(%s)' % (pp_toktree(decorator[1:]),
+                                        func_doc.canonical_name)
+            elif func_doc.parse_repr not in (None, UNKNOWN):
+                deco_repr = '%s(%s)' % (pp_toktree(decorator[1:]),
+                                        func_doc.parse_repr)
+            else:
+                deco_repr = UNKNOWN
+            func_doc = apply_decorator(_ast_dotted_name(deco_node), func_doc,
+                                       parent_docs, stmt.lineno)
+            func_doc.parse_repr = deco_repr
+
+        # Add a variable to the containing namespace.
+        var_doc = VariableDoc(name=func_name, value=func_doc,
+                              is_imported=False, is_alias=False,
+                              docs_extracted_by='parser')
+        set_variable(parent_doc, var_doc)
+        return func_doc
+
+    def define_class(self, stmt, parent_docs):
+        """
+        Create a C{ClassDoc} for the class definition C{stmt}, and
+        add it to C{parent_docs[-1]}, as L{process_classdef()} does;
+        and return it.
+        """
+        parent_doc = parent_docs[-1]
+        class_name = unicode(stmt.name)
+        canonical_name = DottedName(parent_doc.canonical_name, class_name)
+        class_doc = ClassDoc(variables={}, sort_spec=[],
+                             bases=[], subclasses=[],
+                             canonical_name=canonical_name,
+                             defining_module=parent_docs[0],
+                             docs_extracted_by='parser')
+        var_doc = VariableDoc(name=class_name, value=class_doc,
+                              is_imported=False, is_alias=False,
+                              docs_extracted_by='parser')
+
+        # Add the bases.  Only dotted names can be found.
+        base_names = [_ast_dotted_name(base) for base in stmt.bases]
+        for base_name in base_names:
+            if base_name is None:
+                log.warning("Parsing %s (line %s): Unable to extract "
+                            "the base list for class '%s'." %
+                            (parent_docs[0].filename, stmt.lineno,
+                             canonical_name))
+                class_doc.bases = UNKNOWN
+                break
+        else:
+            for base_name in base_names:
+                class_doc.bases.append(find_base(base_name, parent_docs))
+
+        # Register ourselves as a subclass to our bases.
+        if class_doc.bases is not UNKNOWN:
+            for basedoc in class_doc.bases:
+                if isinstance(basedoc, ClassDoc):
+                    basedoc.subclasses.append(class_doc)
+                    _note_parse_subclass(basedoc, class_doc)
+
+        # If the preceeding comment includes a docstring, then add it.
+        add_docstring_from_comments(class_doc, self.comments)
+
+        # Add the VariableDoc to our container.
+        set_variable(parent_doc, var_doc)
+        return class_doc
+
+    def process_tokenized_def(self, stmt, parent_docs, next_lineno):
+        """
+        Handle a function or class definition by tokenizing its
+        decorators and its definition line, and processing them with
+        L{process_line()}.  This is used for one-line blocks (such
+        as C{class A: pass}) and for definitions whose lines can't be
+        read by L{line_tokens()}.
+        """
+        # Read the decorators (if any), and the definition line.  As
+        # in process_file(), the line number of a decorated definition
+        # is the line number of its first decorator.
+        decorators = []
+        for line_toks, lineno in self.logical_lines(stmt.lineno):
+            line = self.call(lineno, shallow_parse, line_toks)
+            if line[0] == (token.OP, '@'):
+                decorators.append(line)
+            else:
+                break
+        self.end_line(self.process_line(line, stmt.lineno, parent_docs,
+                                        decorators), parent_docs)
+        # If the body is on the same line, then process_line() has
+        # already processed it.
+        if (token.OP, ':') in line[:-1]:
+            return
+        if isinstance(stmt, ast.ClassDef):
+            self.process_block(stmt.body, parent_docs, next_lineno)
+        else:
+            self.process_function_body(stmt, parent_docs, next_lineno)
+
+    def process_If(self, stmt, parent_docs, next_lineno):
+        if _is_ast_script_guard(stmt.test):
+            line_doc = 'skip_block'
+        else:
+            line_doc = control_flow_block_doc('if')
+        while True:
+            if stmt.orelse:
+                end_lineno = self.first_lineno(stmt.orelse[0])
+            else:
+                end_lineno = next_lineno
+            self.process_clause(line_doc, stmt.body, parent_docs, end_lineno)
+            if not stmt.orelse:
+                break
+            # "elif" clauses are represented as nested If statements.
+            elif (len(stmt.orelse) == 1 and isinstance(stmt.orelse[0], ast.If)
+                  and self.lines[stmt.orelse[0].lineno-1].lstrip()
+                      .startswith('elif')):
+                stmt = stmt.orelse[0]
+                self.start_line(stmt.lineno)
+                line_doc = control_flow_block_doc('elif')
+            else:
+                self.start_line(None)
+                self.process_clause(control_flow_block_doc('else'),
+                                    stmt.orelse, parent_docs, next_lineno)
+                break
+
+    def process_For(self, stmt, parent_docs, next_lineno):
+        if stmt.orelse:
+            end_lineno = self.first_lineno(stmt.orelse[0])
+        else:
+            end_lineno = next_lineno
+        if PARSE_FOR_BLOCKS:
+            # Tokenize the line, to define the loop variable.
+            for line_toks, lineno in self.logical_lines(stmt.lineno):
+                line = self.call(lineno, shallow_parse, line_toks)
+                self.end_line(self.process_line(line, lineno, parent_docs),
+                              parent_docs)
+                break
+            if (token.OP, ':') not in line[:-1]:
+                self.process_block(stmt.body, parent_docs, end_lineno)
+        else:
+            self.process_clause('skip_block', stmt.body, parent_docs,
+                                end_lineno)
+        self.process_else(stmt, parent_docs, next_lineno)
+
+    def process_While(self, stmt, parent_docs, next_lineno):
+        if stmt.orelse:
+            end_lineno = self.first_lineno(stmt.orelse[0])
+        else:
+            end_lineno = next_lineno
+        self.process_clause(control_flow_block_doc('while'), stmt.body,
+                            parent_docs, end_lineno)
+        self.process_else(stmt, parent_docs, next_lineno)
+
+    def process_else(self, stmt, parent_docs, next_lineno):
+        if stmt.orelse:
+            self.start_line(None)
+            self.process_clause(control_flow_block_doc('else'), stmt.orelse,
+                                parent_docs, next_lineno)
+
+    def process_TryExcept(self, stmt, parent_docs, next_lineno):
+        if stmt.handlers:
+            end_lineno = stmt.handlers[0].lineno
+        elif stmt.orelse:
+            end_lineno = self.first_lineno(stmt.orelse[0])
+        else:
+            end_lineno = next_lineno
+        self.process_clause(control_flow_block_doc('try'), stmt.body,
+                            parent_docs, end_lineno)
+        for i, handler in enumerate(stmt.handlers):
+            if i+1 < len(stmt.handlers):
+                end_lineno = stmt.handlers[i+1].lineno
+            elif stmt.orelse:
+                end_lineno = self.first_lineno(stmt.orelse[0])
+            else:
+                end_lineno = next_lineno
+            self.start_line(handler.lineno)
+            self.process_clause(control_flow_block_doc('except'),
+                                handler.body, parent_docs, end_lineno)
+        self.process_else(stmt, parent_docs, next_lineno)
+
+    def process_TryFinally(self, stmt, parent_docs, next_lineno):
+        end_lineno = self.first_lineno(stmt.finalbody[0])
+        # "try/except/finally" is represented as a TryExcept
+        # statement inside a TryFinally statement.
+        if (len(stmt.body) == 1 and isinstance(stmt.body[0], ast.TryExcept)
+            and stmt.body[0].lineno == stmt.lineno):
+            self.process_TryExcept(stmt.body[0], parent_docs, end_lineno)
+        else:
+            self.process_clause(control_flow_block_doc('try'), stmt.body,
+                                parent_docs, end_lineno)
+        self.start_line(None)
+        self.process_clause(control_flow_block_doc('finally'),
+                            stmt.finalbody, parent_docs, next_lineno)
+
+    def process_With(self, stmt, parent_docs, next_lineno):
+        # "with a, b:" is represented as nested With statements.
+        while (len(stmt.body) == 1 and isinstance(stmt.body[0], ast.With)
+               and stmt.body[0].lineno == stmt.lineno):
+            stmt = stmt.body[0]
+        # The block is processed in the same context, since "with"
+        # is not one of the CONTROL_FLOW_KEYWORDS.
+        self.process_clause(None, stmt.body, parent_docs, next_lineno)
+
+def _ast_dotted_name(node):
+    """
+    If the syntax tree C{node} is a dotted name (a name, or an
+    attribute of a dotted name), then return it as a L{DottedName};
+    otherwise, return C{None}.
+    """
+    identifiers = []
+    while isinstance(node, ast.Attribute):
+        identifiers.append(unicode(node.attr))
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    identifiers.append(unicode(node.id))
+    identifiers.reverse()
+    return DottedName(tuple(identifiers))
+
+def _ast_module_name(name):
+    """Return the module name C{name} (a string) as a L{DottedName}."""
+    return DottedName(tuple(unicode(name).split('.')))
+
+def _ast_funcdef_arg(node):
+    """
+    Return the name of the function argument C{node}, or a nested
+    list of names if it is a tuple (as L{parse_funcdef_arg()} does).
+    """
+    if isinstance(node, ast.Name):
+        return unicode(node.id)
+    else:
+        return [_ast_funcdef_arg(elt) for elt in node.elts]
+
+def _match_linenos(regexp, text):
+    """
+    Return a sorted list of the line numbers of the lines in C{text}
+    that contain a match for C{regexp}.
+    """
+    linenos = []
+    lineno, pos = 1, 0
+    for m in regexp.finditer(text):
+        lineno += text.count(u'\n', pos, m.start())
+        pos = m.start()
+        if not linenos or linenos[-1] != lineno:
+            linenos.append(lineno)
+    return linenos
+
+def _ast_contains_string_stmt(stmts):
+    """
+    Return true if the list of statements C{stmts}, or any block that
+    they contain, includes a statement that is a string literal.
+    """
+    for stmt in stmts:
+        cls = stmt.__class__
+        if cls is ast.Expr and stmt.value.__class__ is ast.Str:
+            return True
+        for field in _AST_BLOCK_FIELDS.get(cls, ()):
+            if _ast_contains_string_stmt(getattr(stmt, field)):
+                return True
+    return False
+
+if ast is not None:
+    #: The fields that contain blocks of statements, for each type
+    #: of syntax tree node that has any.
+    _AST_BLOCK_FIELDS = {
+        ast.FunctionDef: ('body',), ast.ClassDef: ('body',),
+        ast.If: ('body', 'orelse'), ast.For: ('body', 'orelse'),
+        ast.While: ('body', 'orelse'), ast.With: ('body',),
+        ast.TryExcept: ('body', 'handlers', 'orelse'),
+        ast.ExceptHandler: ('body',),
+        ast.TryFinally: ('body', 'finalbody')}
+
+def _is_ast_docstring(stmt):
+    """Return true if the statement C{stmt} is a string literal."""
+    return isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Str)
+
+def _is_ast_name(node, name):
+    """Return true if the syntax tree C{node} is the name C{name}."""
+    return isinstance(node, ast.Name) and node.id == name
+
+def _is_ast_script_guard(test):
+    """
+    Return true if the syntax tree C{test} is the condition of the
+    idiomatic trick C{if __name__ == "__main__":}.  (See
+    L{script_guard()}.)
+    """
+    return (isinstance(test, ast.Compare) and
+            _is_ast_name(test.left, '__name__') and
+            len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq) and
+            isinstance(test.comparators[0], ast.Str) and
+            test.comparators[0].s == '__main__')
+
 #/////////////////////////////////////////////////////////////////
 #{ Shallow parser
 #/////////////////////////////////////////////////////////////////
@@ -802,7 +2518,20 @@ def process_control_flow_line(line, parent_docs, prev_line_doc,
                                   docs_extracted_by='parser')
             set_variable(parent, var_doc)
     
-    if ((keyword == 'if' and PARSE_IF_BLOCKS and not script_guard(line)) or
+    if keyword == 'if' and script_guard(line):
+        return 'skip_block'
+    return control_flow_block_doc(keyword)
+
+def control_flow_block_doc(keyword):
+    """
+    Return the value that should be used as the C{prev_line_doc}
+    for a control flow block that starts with C{keyword}: C{None}
+    to indicate that we should process the block using the same
+    context that we were already in; or C{'skip_block'} to indicate
+    that we should ignore the contents of this block.  This is
+    decided by the C{PARSE_*_BLOCKS} configuration constants.
+    """
+    if ((keyword == 'if' and PARSE_IF_BLOCKS) or
         (keyword == 'elif' and PARSE_ELSE_BLOCKS) or
         (keyword == 'else' and PARSE_ELSE_BLOCKS) or
         (keyword == 'while' and PARSE_WHILE_BLOCKS) or
@@ -810,12 +2539,8 @@ def process_control_flow_line(line, parent_docs, prev_line_doc,
         (keyword == 'try' and PARSE_TRY_BLOCKS) or
         (keyword == 'except' and PARSE_EXCEPT_BLOCKS) or
         (keyword == 'finally' and PARSE_FINALLY_BLOCKS)):
-        # Return "None" to indicate that we should process the
-        # block using the same context that we were already in.
         return None
     else:
-        # Return 'skip_block' to indicate that we should ignore
-        # the contents of this block.
         return 'skip_block'
 
 #/////////////////////////////////////////////////////////////////
@@ -1073,8 +2798,7 @@ def _global_name(name, parent_docs):
     # relative to that package.
     while package not in (None, UNKNOWN):
         try:
-            fp = imp.find_module(name[0], package.path)[0]
-            if fp is not None: fp.close()
+            _find_module(name[0], package.path)
         except ImportError:
             # No submodule found here; try the next package up.
             package = package.package
@@ -1223,6 +2947,7 @@ def rhs_to_valuedoc(rhs, parent_docs, lineno):
         if isinstance(arg_val, RoutineDoc):
             doc = apply_decorator(DottedName(rhs[0][1]), arg_val,
                                   parent_docs, lineno)
+            _check_cached_parse_change(doc)
             doc.canonical_name = UNKNOWN
             doc.parse_repr = pp_toktree(rhs)
             return doc, False
@@ -1339,8 +3064,15 @@ def process_docstring(line, parent_docs, prev_line_doc, lineno,
     will be appended to the old one.
     """
     if prev_line_doc is None: return
-    docstring = parse_string(line)
+    return add_docstring(parse_string(line), parent_docs, prev_line_doc,
+                         lineno, encoding)
 
+def add_docstring(docstring, parent_docs, prev_line_doc, lineno, encoding):
+    """
+    Add the string C{docstring} to C{prev_line_doc} as a docstring.
+    This does the work of L{process_docstring()}, once the string
+    literal has been evaluated.
+    """
     # If the docstring is a str, then convert it to unicode.
     # According to a strict reading of PEP 263, this might not be the
     # right thing to do; but it will almost always be what the
@@ -1583,6 +3315,7 @@ def process_classdef(line, parent_docs, prev_line_doc, lineno,
         for basedoc in class_doc.bases:
             if isinstance(basedoc, ClassDoc):
                 basedoc.subclasses.append(class_doc)
+                _note_parse_subclass(basedoc, class_doc)
     
     # If the preceeding comment includes a docstring, then add it.
     add_docstring_from_comments(class_doc, comments)
@@ -1924,6 +3657,7 @@ def set_variable(namespace, var_doc, preserve_docstring=False):
     # Choose which dictionary we'll be storing the variable in.
     if not isinstance(namespace, NamespaceDoc):
         return
+    _check_cached_parse_change(namespace)
 
     # This happens when the class definition has not been parsed, e.g. in
     # sf bug #1693253 on ``Exception.x = y``
@@ -1938,6 +3672,7 @@ def set_variable(namespace, var_doc, preserve_docstring=False):
         old_var_doc = namespace.variables[var_doc.name]
         if (old_var_doc.is_alias == False and
             old_var_doc.value is not UNKNOWN):
+            _check_cached_parse_change(old_var_doc.value)
             old_var_doc.value.canonical_name = UNKNOWN
         if (preserve_docstring and var_doc.docstring in (None, UNKNOWN) and
             old_var_doc.docstring not in (None, UNKNOWN)):
@@ -1952,6 +3687,7 @@ def set_variable(namespace, var_doc, preserve_docstring=False):
 def del_variable(namespace, name):
     if not isinstance(namespace, NamespaceDoc):
         return
+    _check_cached_parse_change(namespace)
 
     if name[0] in namespace.variables:
         if len(name) == 1:
@@ -2129,20 +3865,7 @@ def get_module_encoding(filename):
     """
     @see: U{PEP 263<http://www.python.org/peps/pep-0263.html>}
     """
-    module_file = open(filename, 'rU')
-    try:
-        lines = [module_file.readline() for i in range(2)]
-        if lines[0].startswith('\xef\xbb\xbf'):
-            return 'utf-8'
-        else:
-            for line in lines:
-                m = re.search("coding[:=]\s*([-\w.]+)", line)
-                if m: return m.group(1)
-                
-        # Fall back on Python's default encoding.
-        return 'iso-8859-1' # aka 'latin-1'
-    finally:
-        module_file.close()
+    return get_source_file(filename).encoding
         
 def _get_module_name(filename, package_doc):
     """
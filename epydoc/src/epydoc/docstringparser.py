@@ -29,7 +29,7 @@ __docformat__ = 'epytext en'
 ## Imports
 ######################################################################
 
-import re, sys
+import re, sys, cPickle
 from epydoc import markup
 from epydoc.markup import epytext
 from epydoc.apidoc import *
@@ -192,7 +192,7 @@ def parse_docstring(api_doc, docindex, suppress_warnings=[]):
     # __version__), and then return -- there's nothing else to do.
     if (api_doc.docstring in (None, UNKNOWN)):
         if isinstance(api_doc, NamespaceDoc):
-            for field in STANDARD_FIELDS + user_docfields(api_doc, docindex):
+            for field in _docfield_table(api_doc, docindex)[1]:
                 add_metadata_from_var(api_doc, field)
         return
 
@@ -210,14 +210,11 @@ def parse_docstring(api_doc, docindex, suppress_warnings=[]):
     if isinstance(api_doc, RoutineDoc):
         parse_function_signature(api_doc, None, docformat, parse_errors)
 
-    # Parse the docstring.  Any errors encountered are stored as
+    # Parse the docstring, and divide it into a description and a
+    # list of fields.  Any errors encountered are stored as
     # `ParseError` objects in the errors list.
-    parsed_docstring = markup.parse(api_doc.docstring, docformat,
-                                    parse_errors)
-        
-    # Divide the docstring into a description and a list of
-    # fields.
-    descr, fields = parsed_docstring.split_fields(parse_errors)
+    descr, fields = _parse_and_split(api_doc.docstring, docformat,
+                                     parse_errors)
     api_doc.descr = descr
 
     field_warnings = []
@@ -257,7 +254,7 @@ def parse_docstring(api_doc, docindex, suppress_warnings=[]):
 
     # Check for special variables (e.g., __version__)
     if isinstance(api_doc, NamespaceDoc):
-        for field in STANDARD_FIELDS + user_docfields(api_doc, docindex):
+        for field in _docfield_table(api_doc, docindex)[1]:
             add_metadata_from_var(api_doc, field)
 
     # Extract a summary
@@ -284,6 +281,91 @@ def parse_docstring(api_doc, docindex, suppress_warnings=[]):
     else:
         report_errors(api_doc, docindex, parse_errors, field_warnings)
 
+def defer_docstring_parsing(api_doc, docindex, suppress_warnings=[]):
+    """
+    Arrange for the given C{APIDoc}'s docstring to be processed by
+    L{parse_docstring()} the first time that one of the attributes
+    that are extracted from it (such as C{descr}, C{summary} or
+    C{metadata}) is read, rather than now.  Docstrings that can
+    affect other C{APIDoc}s are processed immediately.  These are
+    the docstrings of modules and classes; routine docstrings that
+    begin with a signature; and variable docstrings that contain
+    C{ivar} or C{cvar} fields.
+
+    Any warnings for a deferred docstring are reported when it is
+    processed.
+
+    @param docindex: A DocIndex, used to find the containing
+        module (to look up the docformat); and to find any
+        user docfields defined by containing objects.
+    @param suppress_warnings: A set of objects for which docstring
+        warnings should be suppressed.
+    """
+    if (api_doc.metadata is UNKNOWN and
+        api_doc.docstring not in (None, UNKNOWN) and
+        not isinstance(api_doc, NamespaceDoc)):
+        docstring = unindent_docstring(api_doc.docstring)
+        if not ((isinstance(api_doc, RoutineDoc) and
+                 _SIGNATURE_RE.match(docstring)) or
+                (isinstance(api_doc, VariableDoc) and
+                 _VARIABLE_FIELD_RE.search(docstring))):
+            api_doc._deferred_docstring = (docindex,
+                                           api_doc in suppress_warnings)
+            return
+    parse_docstring(api_doc, docindex, suppress_warnings)
+
+_VARIABLE_FIELD_RE = re.compile(r'[@:][ic]var(iable)?\b')
+"""A regular expression matching the C{ivar} and C{cvar} fields that
+a variable's docstring can use to mark it as an instance or a class
+variable.  See L{defer_docstring_parsing()}."""
+
+_preparsed_docstrings = {}
+"""A dictionary mapping from C{(docstring, docformat)} pairs to the
+results of parsing those docstrings in advance, in worker processes.
+Each value is a pickled tuple C{(descr, fields, parse_errors,
+messages)}, where C{messages} is the list of messages that were
+logged while parsing the docstring (see L{log.RecordingLogger}).
+This dictionary is filled in by L{epydoc.docbuilder}, and is only
+used while the docstrings are being parsed.
+@type: C{dict}"""
+
+def _parse_and_split(docstring, docformat, parse_errors):
+    """
+    Parse the given docstring, and divide it into a description and a
+    list of fields.  If the docstring was already parsed by a worker
+    process, then use its results (see L{_preparsed_docstrings}), and
+    report the messages that were logged while parsing it.
+
+    @return: A tuple C{(descr, fields)}.
+    """
+    pickled_result = _preparsed_docstrings.get( (docstring, docformat) )
+    if pickled_result is None:
+        parsed_docstring = markup.parse(docstring, docformat, parse_errors)
+        return parsed_docstring.split_fields(parse_errors)
+
+    descr, fields, errors, messages = cPickle.loads(pickled_result)
+    markup.MARKUP_LANGUAGES_USED.add(docformat)
+    log.replay_messages(messages)
+    parse_errors.extend(errors)
+    return descr, fields
+
+def _parse_key(api_doc, docformat):
+    """
+    Return the C{(docstring, docformat)} pair that L{parse_docstring()}
+    will pass to the markup parser when it processes the given
+    C{APIDoc}'s docstring, assuming that the docstring's format is
+    C{docformat}; or C{None} if it will not parse the docstring.
+    """
+    if (api_doc.metadata is not UNKNOWN or
+        api_doc.docstring in (None, UNKNOWN)):
+        return None
+    docstring = unindent_docstring(api_doc.docstring)
+    # See parse_function_signature().
+    if isinstance(api_doc, RoutineDoc) and docstring:
+        m = _SIGNATURE_RE.match(docstring)
+        if m is not None: docstring = docstring[m.end():]
+    return (docstring, docformat)
+
 def add_metadata_from_var(api_doc, field):
     for varname in field.varnames:
         # Check if api_doc has a variable w/ the given name.
@@ -583,13 +665,13 @@ def process_field(api_doc, docindex, tag, arg, descr):
         return
 
     # standard simple fields & user-defined fields
-    for field in STANDARD_FIELDS + user_docfields(api_doc, docindex):
-        if tag in field.tags:
-            # [xx] check if it's redefined if it's not multivalue??
-            if not field.takes_arg:
-                _check(api_doc, tag, arg, expect_arg=False)
-            api_doc.metadata.append((field, arg, descr))
-            return
+    field = _docfield_table(api_doc, docindex)[2].get(tag)
+    if field is not None:
+        # [xx] check if it's redefined if it's not multivalue??
+        if not field.takes_arg:
+            _check(api_doc, tag, arg, expect_arg=False)
+        api_doc.metadata.append((field, arg, descr))
+        return
 
     # If we didn't handle the field, then report a warning.
     raise ValueError(UNKNOWN_TAG % tag)
@@ -607,17 +689,61 @@ def user_docfields(api_doc, docindex):
         yet have had its C{extra_docstring_fields} attribute
         initialized.
     """
-    docfields = []
+    return list(_docfield_table(api_doc, docindex)[0])
+
+_docfield_generation = 0
+"""A counter that is incremented whenever a new docstring field is
+defined (by L{process_deffield_field()}).  This invalidates all the
+tables that were cached by L{_docfield_table()}."""
+
+def _docfield_table(api_doc, docindex, name=None):
+    """
+    Return a tuple C{(user_fields, fields, tags)} describing the
+    fields that can be used by the given object, where C{user_fields}
+    is the list returned by L{user_docfields()}; C{fields} is
+    L{STANDARD_FIELDS} followed by C{user_fields}; and C{tags} is a
+    dictionary mapping each field tag to the first field in
+    C{fields} that accepts it.
+
+    The table is built from C{api_doc}'s own C{extra_docstring_fields}
+    and the table of its nearest ancestor in C{docindex}.  Each
+    C{NamespaceDoc} caches its table, so the ancestors are only looked
+    up once per namespace, rather than once per docstring.
+
+    @param name: The name whose ancestors should be searched, if it
+        is not C{api_doc}'s canonical name.
+    """
+    if name is None: name = api_doc.canonical_name
+    cacheable = (isinstance(api_doc, NamespaceDoc) and
+                 name == api_doc.canonical_name)
+    key = (_docfield_generation, len(STANDARD_FIELDS))
+    if cacheable:
+        table = api_doc._docfield_table
+        if table is not None and table[0] == key:
+            return table[1]
+
     # Get any docfields from `api_doc` itself
+    user_fields = []
     if api_doc.extra_docstring_fields not in (None, UNKNOWN):
-        docfields += api_doc.extra_docstring_fields
+        user_fields += api_doc.extra_docstring_fields
     # Get any docfields from `api_doc`'s ancestors
-    for i in range(len(api_doc.canonical_name)-1, 0, -1):
-        ancestor = docindex.get_valdoc(api_doc.canonical_name[:i])
-        if ancestor is not None \
-        and ancestor.extra_docstring_fields not in (None, UNKNOWN):
-            docfields += ancestor.extra_docstring_fields
-    return docfields
+    if isinstance(name, DottedName):
+        for i in range(len(name)-1, 0, -1):
+            ancestor = docindex.get_valdoc(name[:i])
+            if ancestor is not None:
+                user_fields += _docfield_table(ancestor, docindex,
+                                               name[:i])[0]
+                break
+
+    fields = STANDARD_FIELDS + user_fields
+    tags = {}
+    for field in fields:
+        for tag in field.tags:
+            tags.setdefault(tag, field)
+    table = (user_fields, fields, tags)
+    if cacheable:
+        api_doc._docfield_table = (key, table)
+    return table
 
 _field_dispatch_table = {}
 def register_field_handler(handler, *field_tags):
@@ -700,6 +826,7 @@ def process_group_field(api_doc, docindex, tag, arg, descr):
 
 def process_deffield_field(api_doc, docindex, tag, arg, descr):
     """Define a new custom field."""
+    global _docfield_generation
     _check(api_doc, tag, arg, expect_arg=True)
     if api_doc.extra_docstring_fields is UNKNOWN:
         api_doc.extra_docstring_fields = []
@@ -709,6 +836,8 @@ def process_deffield_field(api_doc, docindex, tag, arg, descr):
         api_doc.extra_docstring_fields.append(docstring_field)
     except ValueError, e:
         raise ValueError('Bad %s: %s' % (tag, e))
+    # The cached field tables don't include the new field.
+    _docfield_generation += 1
 
 def process_raise_field(api_doc, docindex, tag, arg, descr):
     """Record the fact that C{api_doc} can raise the exception named
@@ -15,7 +15,8 @@ this module is the L{HTMLWriter} class.
 __docformat__ = 'epytext en'
 
 import re, os, sys, codecs, sre_constants, pprint, base64
-import urllib
+import urllib, cPickle
+from cStringIO import StringIO
 import __builtin__
 from epydoc.apidoc import *
 import epydoc.docstringparser
@@ -28,6 +29,8 @@ from epydoc.docwriter.dotgraph import *
 from epydoc import log
 from epydoc.util import plaintext_to_html, is_src_filename
 from epydoc.compat import * # Backwards compatibility
+try: from hashlib import sha1
+except ImportError: from sha import new as sha1
 
 ######################################################################
 ## Template Compiler
@@ -297,6 +300,12 @@ class HTMLWriter:
         @type src_code_tab_width: C{int}
         @keyword src_code_tab_width: Number of spaces to replace each tab
             with in source code listings.
+        @type incremental: C{boolean}
+        @keyword incremental: If true, then record the objects that
+            each page depends on in a manifest file, and use the
+            manifest from the previous run to avoid rewriting pages
+            whose inputs have not changed.  Pages for objects that
+            are no longer documented are deleted.
         """
         self.docindex = docindex
 
@@ -379,6 +388,15 @@ class HTMLWriter:
         self._show_submodule_list = kwargs.get('show_submodule_list', True)
         """If true, the include a list of submodules on the package
         documentation page."""
+
+        self._incremental = kwargs.get('incremental', False)
+        """If true, then only rewrite pages whose inputs have changed
+        since the manifest was written by the previous run."""
+
+        self._page_record = None
+        """The L{_PageRecord} for the page that is currently being
+        written, or C{None} if page dependencies are not being
+        recorded."""
         
         # For use with select_variables():
         if self._show_private:
@@ -558,6 +576,9 @@ class HTMLWriter:
         self._mkdir(directory)
         self._directory = directory
 
+        # Load the manifest from the previous run.
+        self._read_manifest(directory)
+
         # Write the CSS file.
         self._files_written += 1
         log.progress(self._files_written/self._num_files, 'epydoc.css')
@@ -664,6 +685,7 @@ class HTMLWriter:
             # Sort each entry of the name_to_docs list.
             for doc_list in name_to_docs.values():
                 doc_list.sort()
+            self._name_to_docs = name_to_docs
             # Write the source code for each module.
             for doc in self.modules_with_sourcecode:
                 filename = urllib.unquote(self.pysrc_url(doc))
@@ -675,6 +697,9 @@ class HTMLWriter:
 
         # Write the mapping object name -> URL
         self._write(self.write_api_list, directory, 'api-objects.txt')
+
+        # Remove stale pages, and record what each page depends on.
+        self._write_manifest(directory)
         
         # Write the index.html files.
         # (this must be done last, since it might copy another file)
@@ -718,9 +743,15 @@ class HTMLWriter:
         log.progress(self._files_written/self._num_files, filename)
         
         path = os.path.join(directory, filename)
+        if self._incremental:
+            if self._page_is_current(filename, path):
+                return
+            self._page_record = _PageRecord(args)
         f = codecs.open(path, 'w', 'ascii', errors='xmlcharrefreplace')
         write_func(f.write, *args)
         f.close()
+        if self._incremental:
+            self._record_page(filename)
 
     def _mkdir(self, directory):
         """
@@ -804,6 +835,8 @@ class HTMLWriter:
         
         filename = doc.filename
         name = str(doc.canonical_name)
+        self._note_page_dependency(('file', filename))
+        self._note_page_dependency(('global', 'names'))
         
         # Header
         self.write_header(out, name)
@@ -879,7 +912,11 @@ class HTMLWriter:
                 len(doc.subclasses) > 0):
                 out('<dl><dt>Known Subclasses:</dt>\n<dd>\n    ')
                 out('  <ul class="subclass-list">\n')
-                for i, subclass in enumerate(doc.subclasses):
+                # The subclasses are listed in the order that they were
+                # found in, which depends on the order of the imports.
+                subclasses = sorted(doc.subclasses,
+                                    key=lambda c:c.canonical_name)
+                for i, subclass in enumerate(subclasses):
                     href = self.href(subclass, context=doc)
                     if self._val_is_public(subclass): css = ''
                     else: css = ' class="private"'
@@ -1008,7 +1045,10 @@ class HTMLWriter:
 
         
         out('<ul class="nomargin-top">\n')
-        for doc in sorted(class_set, key=lambda c:c.canonical_name[-1]):
+        # Classes with the same name are ordered by their full names,
+        # so the order does not depend on the order of class_set.
+        for doc in sorted(class_set, key=lambda c:(c.canonical_name[-1],
+                                                   c.canonical_name)):
             # If doc is a subclass of anything that's documented, then
             # we don't need to list it separately; it will be listed
             # under that base.
@@ -1196,6 +1236,7 @@ class HTMLWriter:
         
         # Get the contents of the help file.
         if self._helpfile:
+            self._note_page_dependency(('file', self._helpfile))
             if os.path.exists(self._helpfile):
                 try: help = open(self._helpfile).read()
                 except: raise IOError("Can't open help file: %r" %
@@ -1643,6 +1684,8 @@ class HTMLWriter:
     def render_graph(self, graph):
         if graph is None: return ''
         graph.caption = graph.title = None
+        if self._page_record is not None:
+            self._page_record.graph_uids.append(graph.uid)
         return graph.to_html(self._directory) or ''
     
     RE_CALLGRAPH_ID = re.compile(r"""["'](.+-div)['"]""")
@@ -2826,7 +2869,7 @@ class HTMLWriter:
         >>> # endif
         >>> if doc.subclasses:
             <ul>
-        >>>   for subclass in sorted(set(doc.subclasses), key=lambda c:c.canonical_name[-1]):
+        >>>   for subclass in sorted(set(doc.subclasses), key=lambda c:(c.canonical_name[-1], c.canonical_name)):
         >>>     if subclass in class_set:
         >>>       self.write_class_tree_item(out, subclass, class_set)
         >>>     #endif
@@ -3096,13 +3139,13 @@ class HTMLWriter:
         skip = (ModuleDoc, ClassDoc, type(UNKNOWN))
         for val_doc in self.module_list:
             self.write_url_record(out, val_doc)
-            for var in val_doc.variables.itervalues():
+            for (name, var) in sorted(val_doc.variables.items()):
                 if not isinstance(var.value, skip):
                     self.write_url_record(out, var)
 
         for val_doc in self.class_list:
             self.write_url_record(out, val_doc)
-            for var in val_doc.variables.itervalues():
+            for (name, var) in sorted(val_doc.variables.items()):
                 self.write_url_record(out, var)
 
     def write_url_record(self, out, obj):
@@ -3110,6 +3153,368 @@ class HTMLWriter:
         if url is not None:
             out("%s\t%s\n" % (obj.canonical_name, url))
 
+    #////////////////////////////////////////////////////////////
+    #{ Incremental Regeneration
+    #////////////////////////////////////////////////////////////
+
+    MANIFEST_FILENAME = 'api-objects.manifest'
+    """The name of the file (in the output directory, next to
+    C{api-objects.txt}) that records which objects each page depends
+    on.  It is used by incremental runs to decide which pages need to
+    be rewritten."""
+
+    _UNFINGERPRINTED_ATTRIBS = set([
+        'pyval', 'callgraph_uid', '_APIDoc__has_been_hashed',
+        '_APIDoc__mergeset', '_ValueDoc__pickle_state',
+        '_ValueDoc__pyval_repr', '_ValueDoc__summary_pyval_repr',
+        '_variable_index', '_docfield_table'])
+    """The names of C{APIDoc} attributes that are not included in
+    fingerprints: either they can't be pickled, or they are caches
+    that get filled in while the pages are being written."""
+
+    _MAX_DIGEST_DEPTH = 2
+    """How deeply unnamed C{APIDoc}s are followed when computing the
+    digest of an C{APIDoc}."""
+
+    _ADDRESS_RE = re.compile(r' at 0x[0-9a-fA-F]+')
+    """A regular expression matching the object addresses in default
+    reprs (with line wrapping removed), which change from one run to
+    the next."""
+
+    def _read_manifest(self, directory):
+        """
+        Initialize the state used for incremental regeneration.  If
+        incremental regeneration is turned off, then delete any
+        manifest left by a previous run, since the pages that it
+        describes are about to be overwritten.
+        """
+        path = os.path.join(directory, self.MANIFEST_FILENAME)
+        if not self._incremental:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        self._old_pages = {}
+        """The page records from the previous run's manifest."""
+        self._old_fingerprints = {}
+        """The dependency fingerprints from the previous run's manifest."""
+        self._new_pages = {}
+        """The page records for the manifest written by this run.  A
+        record of C{None} means that the page should always be
+        rewritten."""
+        self._new_fingerprints = {}
+        """The dependency fingerprints for the manifest written by
+        this run."""
+        self._fingerprints = {}
+        """Cache mapping dependency keys to their fingerprints."""
+        self._doc_digests = {}
+        """Cache mapping C{id(api_doc.__dict__)} to the digest of its
+        state."""
+        self._name_to_docs = {}
+        """The name map used to link names in source code pages."""
+
+        # Build a table that lets us find the APIDocs that a page
+        # depended on.  If several APIDocs share a key (e.g., the
+        # placeholders for an external base class), then the key's
+        # fingerprint covers all of them.
+        self._docs_by_key = {}
+        """Table mapping dependency keys to lists of C{APIDoc}s."""
+        for val_doc in self.docindex.reachable_valdocs():
+            self._add_doc_by_key(val_doc)
+            if isinstance(val_doc, NamespaceDoc):
+                for var_doc in val_doc.variables.values():
+                    self._add_doc_by_key(var_doc)
+
+        if os.path.exists(path):
+            try:
+                manifest = cPickle.load(open(path, 'rb'))
+                self._old_pages = manifest['pages']
+                if manifest['context'] == self._manifest_context():
+                    self._old_fingerprints = manifest['fingerprints']
+            except KeyboardInterrupt:
+                raise
+            except Exception, e:
+                log.warning('Ignoring bad manifest file %r: %s' % (path, e))
+
+    def _write_manifest(self, directory):
+        """
+        Delete any pages that were written by the previous run but
+        were not generated by this run, and write the manifest
+        describing the pages generated by this run.
+        """
+        if not self._incremental: return
+        for filename in self._old_pages:
+            if filename not in self._new_pages:
+                path = os.path.join(directory, filename)
+                if os.path.exists(path):
+                    log.info('Removing stale page %s' % filename)
+                    os.remove(path)
+
+        manifest = {'context': self._manifest_context(),
+                    'pages': self._new_pages,
+                    'fingerprints': self._new_fingerprints}
+        out = open(os.path.join(directory, self.MANIFEST_FILENAME), 'wb')
+        cPickle.dump(manifest, out, cPickle.HIGHEST_PROTOCOL)
+        out.close()
+
+    def _manifest_context(self):
+        """
+        Return a string describing the settings that affect every
+        page.  If this changes between runs, then every page is
+        rewritten.
+        """
+        return repr((epydoc.__version__, self._show_private,
+                     self._prj_name, self._prj_url, self._prj_link,
+                     self._top_page_url, self._trees_url, self._css,
+                     self._helpfile, self._frames_index,
+                     self._show_imports, self._variable_maxlines,
+                     self._variable_linelen, self._variable_summary_linelen,
+                     self._variable_tooltip_linelen, self._inheritance,
+                     self._incl_sourcecode, self._mark_docstrings,
+                     tuple(self._graph_types), self._include_log,
+                     self._include_timestamp, self._src_code_tab_width,
+                     self._redundant_details, self._show_submodule_list,
+                     self._split_ident_index,
+                     sorted(DotGraph.DEFAULT_NODE_DEFAULTS.items()),
+                     sorted(DotGraph.DEFAULT_EDGE_DEFAULTS.items()),
+                     DotGraph.DEFAULT_HTML_SIZE,
+                     DotGraph.DEFAULT_HTML_IMAGE_FORMAT))
+
+    def _page_is_current(self, filename, path):
+        """
+        Return true if the page that was written to C{path} by the
+        previous run is still up to date.  In that case, the page's
+        record is carried over to this run's manifest, and the failed
+        crossreferences that were found when writing it are reported
+        again.
+        """
+        record = self._old_pages.get(filename)
+        if record is None or not os.path.exists(path):
+            return False
+        (keys, xrefs, failed_xrefs, graph_uids) = record
+        for key in keys:
+            fingerprint = self._fingerprint(key)
+            if (fingerprint is None or
+                fingerprint != self._old_fingerprints.get(key)):
+                return False
+        for (identifier, container_key, is_xref, target) in xrefs:
+            if container_key is None:
+                container = None
+            else:
+                containers = self._docs_by_key.get(container_key, ())
+                if len(containers) != 1: return False
+                container = containers[0]
+            linker = _HTMLDocstringLinker(self, container)
+            if is_xref: doc = linker.find_xref_target(identifier)
+            else: doc = self.docindex.find(identifier, container)
+            if self._xref_target(doc) != target:
+                return False
+
+        # The page is up to date.
+        self._new_pages[filename] = record
+        for key in keys:
+            self._new_fingerprints[key] = self._fingerprints[key]
+        for (identifier, context) in failed_xrefs:
+            self._failed_xrefs.setdefault(identifier,{})[context] = 1
+        DotGraph._uids.update(graph_uids)
+        return True
+
+    def _record_page(self, filename):
+        """
+        Add the page that was just written to this run's manifest,
+        using the dependencies collected in L{_page_record}.
+        """
+        record, self._page_record = self._page_record, None
+        self._new_pages[filename] = None
+        if not record.recordable: return
+
+        keys = set(record.keys)
+        for api_doc in record.docs.values():
+            key = self._dependency_key(api_doc)
+            if key is None: continue
+            for doc in self._docs_by_key.get(key, ()):
+                if doc.__dict__ is api_doc.__dict__: break
+            else:
+                return
+            keys.add(key)
+        for key in keys:
+            if self._fingerprint(key) is None: return
+        for key in keys:
+            self._new_fingerprints[key] = self._fingerprints[key]
+        self._new_pages[filename] = (sorted(keys), record.xrefs,
+                                     record.failed_xrefs, record.graph_uids)
+
+    def _note_page_dependency(self, key):
+        """
+        Record that the page that is currently being written depends
+        on the given dependency key (a file or a global table).
+        """
+        if self._page_record is not None:
+            self._page_record.keys.add(key)
+
+    def _note_xref(self, identifier, container, doc, is_xref):
+        """
+        Record that the page that is currently being written resolved
+        C{identifier} in the context of C{container} to C{doc}.  The
+        identifier is resolved again when checking whether the page is
+        up to date, since a new object could change what it refers to.
+        """
+        record = self._page_record
+        if record is None: return
+        if container is None:
+            container_key = None
+        else:
+            container_key = self._dependency_key(container)
+            if container_key is None:
+                record.recordable = False
+                return
+            record.docs[id(container)] = container
+        record.xrefs.append((identifier, container_key, is_xref,
+                             self._xref_target(doc)))
+
+    def _xref_target(self, doc):
+        """
+        Return a value describing the result of resolving a
+        crossreference, which can be compared between runs.
+        """
+        if isinstance(doc, APIDoc):
+            return ('doc', self.url(doc))
+        else:
+            return doc
+
+    def _dependency_key(self, api_doc):
+        """
+        Return the key used to identify C{api_doc} in the manifest, or
+        C{None} if it does not have a stable name.
+        """
+        name = api_doc.canonical_name
+        if (not isinstance(name, DottedName) or
+            name[0].startswith(DottedName.UNREACHABLE)):
+            return None
+        if isinstance(api_doc, VariableDoc):
+            return ('var', str(name))
+        else:
+            return ('val', str(name))
+
+    def _add_doc_by_key(self, api_doc):
+        key = self._dependency_key(api_doc)
+        if key is not None:
+            docs = self._docs_by_key.setdefault(key, [])
+            # APIDocs that have been merged share a single __dict__.
+            for doc in docs:
+                if doc.__dict__ is api_doc.__dict__: return
+            docs.append(api_doc)
+
+    def _fingerprint(self, key):
+        """
+        Return a fingerprint for the given dependency key, or C{None}
+        if no reliable fingerprint can be computed.  Keys have one of
+        the following forms:
+            - C{('val', name)} or C{('var', name)}: an C{APIDoc}.
+            - C{('file', filename)}: the contents of a file.
+            - C{('global', 'names')}: the name map used for source
+              code pages.
+            - C{('global', 'all')}: every C{APIDoc}; used by pages,
+              such as indices, that list the entire project.
+        """
+        if key in self._fingerprints:
+            return self._fingerprints[key]
+
+        fingerprint = None
+        (kind, name) = key
+        if kind == 'file':
+            try: fingerprint = sha1(open(name, 'rb').read()).hexdigest()
+            except IOError: pass
+        elif key == ('global', 'names'):
+            names = [(name, [(str(d.canonical_name), self.url(d))
+                             for d in docs])
+                     for (name, docs) in sorted(self._name_to_docs.items())]
+            fingerprint = sha1(repr(names)).hexdigest()
+        elif key == ('global', 'all'):
+            digest = sha1()
+            for doc_key in sorted(self._docs_by_key):
+                doc_fingerprint = self._fingerprint(doc_key)
+                if doc_fingerprint is None: break
+                digest.update('%r %s\n' % (doc_key, doc_fingerprint))
+            else:
+                fingerprint = digest.hexdigest()
+        else:
+            digests = [self._doc_digest(api_doc) for api_doc
+                       in self._docs_by_key.get(key, ())]
+            if len(digests) == 1:
+                fingerprint = digests[0]
+            elif digests and None not in digests:
+                fingerprint = sha1(' '.join(sorted(digests))).hexdigest()
+
+        self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def _doc_digest(self, api_doc, depth=0):
+        """
+        Return a digest of the given C{APIDoc}'s attributes, or C{None}
+        if they can't be pickled.  Other C{APIDoc}s that it refers to
+        are represented by their dependency key; or, if they don't have
+        a stable name, by their own digest (up to a fixed depth, so the
+        result does not depend on which C{APIDoc} was digested first).
+        A variable's digest also covers its value, since the two are
+        displayed together.
+        """
+        if depth == 0 and id(api_doc.__dict__) in self._doc_digests:
+            return self._doc_digests[id(api_doc.__dict__)]
+
+        # Make sure that the digest covers the information that is
+        # extracted from the docstring.
+        api_doc._parse_deferred_docstring()
+        state = []
+        for (attr, val) in sorted(api_doc.__dict__.items()):
+            if attr in self._UNFINGERPRINTED_ATTRIBS: continue
+            if isinstance(val, dict): val = sorted(val.items())
+            state.append((attr, val))
+        if isinstance(api_doc, VariableDoc):
+            if isinstance(api_doc.value, APIDoc) and depth == 0:
+                state.append(('value', self._doc_digest(api_doc.value, 1)))
+        elif (api_doc.pyval is not UNKNOWN and not
+              isinstance(api_doc, (NamespaceDoc, RoutineDoc, PropertyDoc))):
+            pyval_repr = api_doc.pyval_repr().to_plaintext(None)
+            pyval_repr = pyval_repr.replace('\\\n', '')
+            state.append(('pyval', self._ADDRESS_RE.sub('', pyval_repr)))
+        state.append(('url', self.url(api_doc)))
+
+        def persistent_id(obj):
+            if obj is UNKNOWN:
+                return 'UNKNOWN'
+            elif isinstance(obj, APIDoc):
+                key = self._dependency_key(obj)
+                if key is not None:
+                    return '%s %s' % key
+                elif depth >= self._MAX_DIGEST_DEPTH:
+                    return obj.__class__.__name__
+                digest = self._doc_digest(obj, depth+1)
+                if digest is None:
+                    raise ValueError('%r can not be fingerprinted' % obj)
+                return digest
+            else:
+                return None
+
+        out = StringIO()
+        pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        # Don't use the memo: cPickle only memoizes objects that have
+        # other references, so the pickle would depend on refcounts.
+        pickler.fast = True
+        try:
+            pickler.dump(state)
+            digest = sha1(out.getvalue()).hexdigest()
+        except KeyboardInterrupt:
+            raise
+        except Exception, e:
+            log.debug('Unable to fingerprint %s: %s' %
+                      (api_doc.canonical_name, e))
+            digest = None
+        if depth == 0:
+            self._doc_digests[id(api_doc.__dict__)] = digest
+        return digest
+
     #////////////////////////////////////////////////////////////
     #{ Helper functions
     #////////////////////////////////////////////////////////////
@@ -3118,7 +3523,13 @@ class HTMLWriter:
         """Make a best-guess as to whether the given class is public."""
         container = self.docindex.container(valdoc)
         if isinstance(container, NamespaceDoc):
-            for vardoc in container.variables.values():
+            # If the value has several names (e.g., a class with a
+            # private alias), then use the one it's named after.
+            if isinstance(valdoc.canonical_name, DottedName):
+                vardoc = container.variables.get(valdoc.canonical_name[-1])
+                if vardoc not in (UNKNOWN, None) and vardoc.value is valdoc:
+                    return vardoc.is_public
+            for name, vardoc in sorted(container.variables.items()):
                 if vardoc in (UNKNOWN, None): continue
                 if vardoc.value is valdoc:
                     return vardoc.is_public
@@ -3189,6 +3600,8 @@ class HTMLWriter:
         Return the URL for the given object, which can be a
         C{VariableDoc}, a C{ValueDoc}, or a C{DottedName}.
         """
+        if self._page_record is not None and isinstance(obj, APIDoc):
+            self._page_record.docs[id(obj)] = obj
         cached_url = self._url_cache.get(id(obj))
         if cached_url is not None:
             return cached_url
@@ -3468,6 +3881,22 @@ class _HTMLDocstringLinker(epydoc.markup.DocstringLinker):
         if label is None: label = plaintext_to_html(identifier)
 
         # Find the APIDoc for it (if it's available).
+        doc = self.find_xref_target(identifier)
+        self.htmlwriter._note_xref(identifier, self.container, doc, True)
+
+        # Translate it into HTML.
+        if doc in (None, 'notfound'):
+            if doc == 'notfound':
+                self._failed_xref(identifier)
+            return '<code class="link">%s</code>' % label
+        else:
+            return self.htmlwriter.href(doc, label, 'link')
+
+    def find_xref_target(self, identifier):
+        """
+        Return the C{APIDoc} that the given identifier crossreference
+        refers to; or C{None} or C{'notfound'} if no target was found.
+        """
         try: doc = self.docindex.find(identifier, self.container, True)
         except: doc = 'notfound'
 
@@ -3480,18 +3909,12 @@ class _HTMLDocstringLinker(epydoc.markup.DocstringLinker):
                    and container.overrides not in (None, UNKNOWN)):
                 container = container.overrides
                 doc = self.docindex.find(identifier, container)
-                
-        # Translate it into HTML.
-        if doc in (None, 'notfound'):
-            if doc == 'notfound':
-                self._failed_xref(identifier)
-            return '<code class="link">%s</code>' % label
-        else:
-            return self.htmlwriter.href(doc, label, 'link')
+        return doc
 
     def url_for(self, identifier):
         if isinstance(identifier, (basestring, DottedName)):
             doc = self.docindex.find(identifier, self.container)
+            self.htmlwriter._note_xref(identifier, self.container, doc, False)
             if doc:
                 return self.htmlwriter.url(doc)
             else:
@@ -3515,3 +3938,48 @@ class _HTMLDocstringLinker(epydoc.markup.DocstringLinker):
         failed_xrefs = self.htmlwriter._failed_xrefs
         context = self.container.canonical_name
         failed_xrefs.setdefault(identifier,{})[context] = 1
+        if self.htmlwriter._page_record is not None:
+            self.htmlwriter._page_record.failed_xrefs.append(
+                (identifier, context))
+
+class _PageRecord:
+    """
+    The dependencies that were used while writing a single page, for
+    the incremental regeneration manifest.
+    """
+    def __init__(self, args):
+        self.docs = {}
+        """The C{APIDoc}s used by the page, keyed by C{id}."""
+        self.keys = set()
+        """Dependency keys for inputs other than C{APIDoc}s."""
+        self.xrefs = []
+        """A list of C{(identifier, container_key, is_xref, target)}
+        tuples, for the crossreferences resolved by the page."""
+        self.failed_xrefs = []
+        """A list of C{(identifier, context)} tuples, for the
+        crossreferences that could not be resolved."""
+        self.graph_uids = []
+        """The uids of the graphs that were drawn for the page."""
+        self.recordable = True
+        """False if the page's dependencies could not be recorded; in
+        that case, it will always be rewritten."""
+
+        # Pages that aren't about a specific object (such as the
+        # indices) list the entire project.
+        for arg in args:
+            if isinstance(arg, APIDoc):
+                self.docs[id(arg)] = arg
+                # A namespace's page also describes its members (and a
+                # package's page summarizes its submodules), so it
+                # depends on them.  A variable's fingerprint covers its
+                # value.
+                if (isinstance(arg, NamespaceDoc) and
+                    arg.variables not in (None, UNKNOWN)):
+                    for var_doc in arg.variables.values():
+                        self.docs[id(var_doc)] = var_doc
+                if (isinstance(arg, ModuleDoc) and
+                    arg.submodules not in (None, UNKNOWN)):
+                    for submodule in arg.submodules:
+                        self.docs[id(submodule)] = submodule
+        if not self.docs:
+            self.keys.add(('global', 'all'))
@@ -16,6 +16,7 @@ __docformat__ = 'epytext en'
 import re, codecs
 from epydoc import log
 from epydoc.util import py_src_filename
+from epydoc.sourcecache import get_source_file
 from epydoc.apidoc import *
 import tokenize, token, cgi, keyword
 try: from cStringIO import StringIO
@@ -452,9 +453,16 @@ class PythonSourceColorizer:
         # for each variable.
         self.doclink_targets_cache = {}
 
-        # Load the module's text.
-        self.text = open(self.module_filename).read()
-        self.text = self.text.expandtabs(self.tab_width).rstrip()+'\n'
+        # Load the module's text.  If possible, reuse the tokens that
+        # the source cache has for it (e.g., because it was parsed).
+        source_file = get_source_file(self.module_filename)
+        tokens = self.shared_tokens(source_file)
+        if tokens is None:
+            self.text = source_file.source.expandtabs(self.tab_width)
+        else:
+            self.text = u''.join(source_file.lines()).expandtabs(
+                self.tab_width).encode(source_file.encoding)
+        self.text = self.text.rstrip()+'\n'
 
         # Construct the line_offsets table.
         self.find_line_offsets()
@@ -468,7 +476,11 @@ class PythonSourceColorizer:
         try:
             output = StringIO()
             self.out = output.write
-            tokenize.tokenize(StringIO(self.text).readline, self.tokeneater)
+            if tokens is None:
+                tokenize.tokenize(StringIO(self.text).readline,
+                                  self.tokeneater)
+            else:
+                self.eat_shared_tokens(tokens, source_file.encoding)
             html = output.getvalue()
             if self.has_decorators:
                 html = self._FIX_DECORATOR_RE.sub(r'\2\1', html)
@@ -500,6 +512,72 @@ class PythonSourceColorizer:
 
         return html
 
+    def shared_tokens(self, source_file):
+        """
+        Return a generator for the tokens in the given
+        L{SourceFile<epydoc.sourcecache.SourceFile>}'s shared token
+        list, if they can be used to colorize it; or C{None} if the
+        module's text must be tokenized separately.  The shared
+        tokens are only used if the file was already tokenized (e.g.,
+        by the parser), since it's faster to tokenize the text here
+        than to convert new shared tokens.  They are decoded, so they
+        can only be used if the module is decoded the same way here;
+        and only if its lines (including the last one) end with
+        C{'\\n'}, so that line numbers and offsets don't change, and
+        the same C{NEWLINE} tokens are generated.  (Empty modules
+        are not worth sharing tokens for.)
+        """
+        source = source_file.source
+        if (not source_file.is_tokenized() or '\r' in source or
+            not source.endswith('\n') or not source.strip()):
+            return None
+        m = self.UNICODE_CODING_RE.match(source)
+        if m: coding = m.group(1)
+        else: coding = 'iso-8859-1'
+        try:
+            if codecs.lookup(coding) != codecs.lookup(source_file.encoding):
+                return None
+        except LookupError:
+            return None
+        return source_file.generate_tokens()
+
+    def eat_shared_tokens(self, tokens, encoding):
+        """
+        Send the given shared tokens to L{tokeneater()}, converting
+        them to what C{tokenize} would have generated for C{self.text}:
+        token strings are encoded, tabs are expanded, and offsets are
+        converted to byte offsets.  Whitespace at the end of the
+        module (which was stripped from C{self.text}) is ignored.
+        """
+        num_lines = self.text.count('\n')
+        # Offsets only need to be converted on lines that contain tabs
+        # or non-ascii characters.
+        prev_line = simple_line = None
+        for toktype, toktext, (srow,scol), (erow,ecol), line in tokens:
+            if line is not prev_line:
+                prev_line = line
+                simple_line = ('\t' not in line and
+                               len(line.encode(encoding)) == len(line))
+            if srow > num_lines:
+                if toktype != token.DEDENT and toktype != token.ENDMARKER:
+                    continue
+                srow, scol = num_lines+1, 0
+            elif not simple_line:
+                prefix = line[:scol]
+                if '\t' in toktext:
+                    toktext = (prefix+toktext).expandtabs(self.tab_width)
+                    prefix = prefix.expandtabs(self.tab_width)
+                    toktext = toktext[len(prefix):]
+                elif '\t' in prefix:
+                    prefix = prefix.expandtabs(self.tab_width)
+                scol = len(prefix.encode(encoding))
+            toktext = toktext.encode(encoding)
+            # Whitespace at the end of the last line was stripped.
+            startpos = self.line_offsets[srow] + scol
+            if startpos+len(toktext) > len(self.text):
+                scol -= startpos + len(toktext) - len(self.text)
+            self.tokeneater(toktype, toktext, (srow,scol), (erow,ecol), line)
+
     def tokeneater(self, toktype, toktext, (srow,scol), (erow,ecol), line):
         """
         A callback function used by C{tokenize.tokenize} to handle
@@ -125,6 +125,29 @@ class SimpleLogger(Logger):
     def log(self, level, message):
         if level >= self.threshold: print message
         
+class RecordingLogger(Logger):
+    """
+    A logger that records the messages and message blocks that it
+    receives, so that they can be reported later on, using
+    L{replay_messages()}.  This is used when work is farmed out to
+    other processes, to report their messages in the same order that
+    they would have been reported had the work been done serially.
+    Progress updates are not recorded.
+
+    @ivar messages: A list of the recorded messages.  Each element is
+        a tuple C{(method, args)}, where C{method} is the name of the
+        C{Logger} method that was called, and C{args} is its argument
+        tuple.
+    """
+    def __init__(self):
+        self.messages = []
+    def log(self, level, message):
+        self.messages.append( ('log', (level, message)) )
+    def start_block(self, header):
+        self.messages.append( ('start_block', (header,)) )
+    def end_block(self):
+        self.messages.append( ('end_block', ()) )
+        
 ######################################################################
 # Logger Registry
 ######################################################################
@@ -204,3 +227,14 @@ progress.__doc__ = Logger.progress.__doc__
 
 def close():
     for logger in _loggers: logger.close()
+
+def replay_messages(messages):
+    """
+    Report each message that was recorded by a L{RecordingLogger} to
+    the registered loggers.
+
+    @param messages: The value of a C{RecordingLogger}'s C{messages}
+        instance variable.
+    """
+    for (method, args) in messages:
+        for logger in _loggers: getattr(logger, method)(*args)
@@ -55,7 +55,8 @@ each error.
 """
 __docformat__ = 'epytext en'
 
-import re, types, sys
+import re, types, sys, copy, copy_reg
+from collections import deque
 from epydoc import log
 from epydoc.util import plaintext_to_html, plaintext_to_latex
 import epydoc
@@ -111,6 +112,37 @@ def register_markup_language(name, parse_function):
 
 MARKUP_LANGUAGES_USED = set()
 
+PARSE_MEMO_SIZE = 5000
+"""The maximum number of parsed docstrings that L{parse()} remembers.
+When L{parse()} is given a docstring that is identical to one that
+it has already parsed (with the same markup language and options),
+it returns the same C{ParsedDocstring} object, along with copies of
+the errors that were found.  Set this to zero to disable the memo.
+@type: C{int}"""
+
+_parse_memo = {}
+"""A dictionary mapping C{(docstring, markup, options)} keys to
+C{(parsed_docstring, errors)} tuples, for the docstrings that have
+been parsed by L{parse()}.  See L{PARSE_MEMO_SIZE}."""
+
+_parse_memo_keys = deque()
+"""The keys of L{_parse_memo}, oldest first.  When the memo is full,
+the oldest entry is discarded."""
+
+_parse_memo_stats = [0, 0]
+"""The number of memo hits and misses in calls to L{parse()}."""
+
+def parse_memo_stats():
+    """
+    @return: A tuple C{(hits, misses, size)}, where C{hits} is the
+        number of calls to L{parse()} that reused an earlier result;
+        C{misses} is the number of calls that parsed the docstring;
+        and C{size} is the number of parsed docstrings currently
+        remembered.
+    @rtype: C{(int, int, int)}
+    """
+    return (_parse_memo_stats[0], _parse_memo_stats[1], len(_parse_memo))
+
 def parse(docstring, markup='plaintext', errors=None, **options):
     """
     Parse the given docstring, and use it to construct a
@@ -143,19 +175,67 @@ def parse(docstring, markup='plaintext', errors=None, **options):
     # Normalize the markup language name.
     markup = markup.lower()
 
+    # Check if we've already parsed an identical docstring.
+    try:
+        key = (docstring, markup, tuple(sorted(options.items())))
+        memo_entry = _parse_memo.get(key)
+    except TypeError: # unhashable docstring or option value
+        key = memo_entry = None
+
+    if memo_entry is not None:
+        _parse_memo_stats[0] += 1
+        parsed_docstring, memo_errors = memo_entry
+        # Copy the errors, since their line numbers get offset when
+        # they are reported.
+        new_errors = [copy.copy(e) for e in memo_errors]
+    else:
+        _parse_memo_stats[1] += 1
+        new_errors = []
+        parsed_docstring, memoizable = _parse(docstring, markup, new_errors,
+                                              **options)
+        if key is not None and memoizable and PARSE_MEMO_SIZE > 0:
+            while len(_parse_memo) >= PARSE_MEMO_SIZE:
+                del _parse_memo[_parse_memo_keys.popleft()]
+            parsed_docstring.is_shared = True
+            _parse_memo[key] = (parsed_docstring,
+                                [copy.copy(e) for e in new_errors])
+            _parse_memo_keys.append(key)
+    errors.extend(new_errors)
+
+    # Check for fatal errors.
+    if raise_on_error:
+        fatal_errors = [e for e in new_errors if e.is_fatal()]
+        if fatal_errors: raise fatal_errors[0]
+
+    return parsed_docstring
+
+def _parse(docstring, markup, errors, **options):
+    """
+    Parse the given docstring, using the given (lower-case) markup
+    language, and append any errors to C{errors}.  This does the
+    real work for L{parse()}, which memoizes its results.
+
+    @return: A tuple C{(parsed_docstring, memoizable)}, where
+        C{memoizable} is false if an internal error was reported
+        while parsing the docstring; in that case, the result should
+        not be memoized, so that the error is reported again for
+        each copy of the docstring.
+    """
     # Is the markup language valid?
     if not re.match(r'\w+', markup):
         _parse_warn('Bad markup language name %r.  Treating '
                     'docstrings as plaintext.' % markup)
         import epydoc.markup.plaintext as plaintext
-        return plaintext.parse_docstring(docstring, errors, **options)
+        return (plaintext.parse_docstring(docstring, errors, **options),
+                True)
 
     # Is the markup language supported?
     if markup not in _markup_language_registry:
         _parse_warn('Unsupported markup language %r.  Treating '
                     'docstrings as plaintext.' % markup)
         import epydoc.markup.plaintext as plaintext
-        return plaintext.parse_docstring(docstring, errors, **options)
+        return (plaintext.parse_docstring(docstring, errors, **options),
+                True)
 
     # Get the parse function.
     parse_docstring = _markup_language_registry[markup]
@@ -167,7 +247,8 @@ def parse(docstring, markup='plaintext', errors=None, **options):
             _parse_warn('Error importing %s for markup language %s: %s' %
                         (parse_docstring, markup, e))
             import epydoc.markup.plaintext as plaintext
-            return plaintext.parse_docstring(docstring, errors, **options)
+            return (plaintext.parse_docstring(docstring, errors, **options),
+                    True)
         _markup_language_registry[markup] = parse_docstring
 
     # Keep track of which markup languages have been used so far.
@@ -181,16 +262,16 @@ def parse(docstring, markup='plaintext', errors=None, **options):
         log.error('Internal error while parsing a docstring: %s; '
                   'treating docstring as plaintext' % e)
         import epydoc.markup.plaintext as plaintext
-        return plaintext.parse_docstring(docstring, errors, **options)
+        return (plaintext.parse_docstring(docstring, errors, **options),
+                False)
 
-    # Check for fatal errors.
-    fatal_errors = [e for e in errors if e.is_fatal()]
-    if fatal_errors and raise_on_error: raise fatal_errors[0]
-    if fatal_errors:
+    # If there were any fatal errors, then use plaintext instead.
+    if [e for e in errors if e.is_fatal()]:
         import epydoc.markup.plaintext as plaintext
-        return plaintext.parse_docstring(docstring, errors, **options)
+        parsed_docstring = plaintext.parse_docstring(docstring, errors,
+                                                     **options)
 
-    return parsed_docstring
+    return parsed_docstring, True
 
 # only issue each warning once:
 _parse_warnings = {}
@@ -239,6 +320,11 @@ class ParsedDocstring:
     methods will be added to this base class; but they will always
     be given a default implementation.
     """
+    is_shared = False
+    """True if this docstring is remembered by L{parse()}, and so may
+    be returned to several callers.  A shared docstring must not be
+    modified (e.g., by L{split_fields()})."""
+
     def split_fields(self, errors=None):
         """
         Split this docstring into its body and its fields.
@@ -517,6 +603,13 @@ class ParseError(Exception):
         self._linenum = linenum
         self._fatal = is_fatal
         self._offset = 1
+
+    def __reduce__(self):
+        # ParseError (and its subclasses) do not pass their
+        # constructor arguments on to Exception, so pickle them by
+        # their state alone.  This is used to send the errors from
+        # docstrings that were parsed by worker processes.
+        return (copy_reg.__newobj__, (self.__class__,), self.__dict__)
                  
     def is_fatal(self):
         """
@@ -1774,7 +1774,16 @@ class ParsedEpytextDocstring(ParsedDocstring):
 
     def __str__(self):
         return str(self._tree)
-        
+
+    def __getstate__(self):
+        # Don't pickle the cached output, so that a docstring pickles
+        # the same way before and after it has been written.
+        state = self.__dict__.copy()
+        state['_html'] = state['_latex'] = state['_plaintext'] = None
+        state['_terms'] = None
+        state.pop('_hyperref', None)
+        return state
+
     def to_html(self, docstring_linker, directory=None, docindex=None,
                 context=None, **options):
         if self._html is not None: return self._html
@@ -2086,19 +2095,23 @@ class ParsedEpytextDocstring(ParsedDocstring):
             del tree.children[-1]
 
             for field in field_nodes:
+                # Don't modify the field node, since this docstring
+                # may be shared (see markup.parse()).
+                children = field.children
+                
                 # Get the tag
-                tag = field.children[0].children[0].lower()
-                del field.children[0]
+                tag = children[0].children[0].lower()
+                children = children[1:]
 
                 # Get the argument.
-                if field.children and field.children[0].tag == 'arg':
-                    arg = field.children[0].children[0]
-                    del field.children[0]
+                if children and children[0].tag == 'arg':
+                    arg = children[0].children[0]
+                    children = children[1:]
                 else:
                     arg = None
 
                 # Process the field.
-                field.tag = 'epytext'
+                field = Element('epytext', *children, **field.attribs)
                 fields.append(Field(tag, arg, ParsedEpytextDocstring(field)))
 
         # Save the remaining docstring as the description..
@@ -168,12 +168,20 @@ class ParsedRstDocstring(ParsedDocstring):
     def split_fields(self, errors=None):
         # Inherit docs
         if errors is None: errors = []
-        visitor = _SplitFieldsTranslator(self._document, errors)
-        self._document.walk(visitor)
-        if len(self._document.children) > 0:
+        # The visitor removes the fields from the document; so if
+        # this docstring is shared (see markup.parse()), and it has
+        # any fields, then split a copy of it.
+        document = self._document
+        if self.is_shared and _has_fields(document):
+            document = document.deepcopy()
+        visitor = _SplitFieldsTranslator(document, errors)
+        document.walk(visitor)
+        if len(document.children) == 0:
+            return None, visitor.fields
+        elif document is self._document:
             return self, visitor.fields
         else:
-            return None, visitor.fields
+            return ParsedRstDocstring(document), visitor.fields
 
     def summary(self):
         # Inherit docs
@@ -368,6 +376,15 @@ class _TermsExtractor(NodeVisitor):
     def unknown_departure(self, node):
         'Ignore all unknown nodes'
 
+def _has_fields(document):
+    """
+    Return true if the given document contains any fields (which
+    L{_SplitFieldsTranslator} would remove).
+    """
+    for node in document.traverse(docutils.nodes.field):
+        return True
+    return False
+
 class _SplitFieldsTranslator(NodeVisitor):
     """
     A docutils translator that removes all fields from a document, and
@@ -792,6 +809,12 @@ class dotgraph(docutils.nodes.image):
         self.args = generate_graph_args
     def graph(self, docindex, context, linker):
         return self.graph_func(docindex, context, linker, *self.args)
+    def copy(self):
+        # Used by deepcopy(), when a shared document is split.
+        obj = self.__class__(self.graph_func, *self.args)
+        obj.attributes.update(self.attributes)
+        obj.source, obj.line = self.source, self.line
+        return obj
 
 def _dir_option(argument):
     """A directive option spec for the orientation of a graph."""
@@ -0,0 +1,462 @@
+# epydoc -- Sharded DocIndex snapshots
+#
+# Copyright (C) 2005 Edward Loper
+# Author: Edward Loper <edloper@loper.org>
+# URL: <http://epydoc.sf.net>
+#
+# $Id$
+
+"""
+Sharded snapshots of a L{DocIndex}, which can be loaded lazily.
+
+A snapshot is a directory that contains a header file
+(L{HEADER_FILENAME}) and one shard file for each top-level module
+(or package) in the index.  Each shard contains the C{APIDoc}s whose
+canonical name begins with that module's name, along with any unnamed
+C{APIDoc}s that are first reached from them.  The header contains the
+index's root list and its other attributes.
+
+Every reference from one C{APIDoc} to another is written as a small
+persistent id, rather than as a nested pickle.  So shards can be read
+independently, and a shard is only read when one of its C{APIDoc}s is
+first used.  Until then, the C{APIDoc} is a I{placeholder}: an
+instance of a subclass of its real class, which reads its shard the
+first time that any of its attributes is read or written.  (The
+placeholders for the index's root values also know their canonical
+names, so L{DocIndex.get_valdoc()} only reads the shard for the name
+that it is looking up.)  Reading the shard gives the placeholder its real class and attributes, so
+code that uses the index does not need to know that it was loaded
+from a snapshot.
+
+C{DottedName}s are also written as persistent ids, and are
+interned (see L{DottedName.intern()}) when they are read; so each
+name is stored once per shard, and loaded once per snapshot.
+
+Use L{write_snapshot()} to write a snapshot, and L{read_snapshot()}
+to read one.
+"""
+__docformat__ = 'epytext en'
+
+import os, os.path, re, cPickle
+from cStringIO import StringIO
+from epydoc.apidoc import *
+from epydoc import log
+from epydoc.compat import *
+
+######################################################################
+#{ Configuration Constants
+######################################################################
+
+SNAPSHOT_VERSION = 1
+"""The version of the snapshot format.  L{read_snapshot()} refuses to
+read snapshots that were written with a different version."""
+
+HEADER_FILENAME = 'index.pickle'
+"""The name of a snapshot's header file."""
+
+SHARD_FILENAME = 'shard-%d.pickle'
+"""The name of a snapshot's shard files; C{%d} is replaced by the
+shard's number."""
+
+_SHARD_FILENAME_RE = re.compile(r'^shard-\d+\.pickle$')
+
+_UNSAVED_ATTRIBS = ('_ValueDoc__pickle_state', '_variable_index',
+                    '_docfield_table')
+"""The names of C{APIDoc} attributes that are not saved in snapshots,
+because they are caches."""
+
+_DOCINDEX_ATTRIBS = ('root', 'mlclasses', 'callers', 'callees',
+                     '_funcid_to_doc')
+"""The names of the L{DocIndex} attributes that are saved in a
+snapshot's header.  The index's other attributes are caches."""
+
+_UNNAMED_SHARD = '??'
+"""The name of the shard that holds unnamed C{APIDoc}s that are only
+reached from the header."""
+
+######################################################################
+#{ Writing Snapshots
+######################################################################
+
+def write_snapshot(docindex, dirname):
+    """
+    Write a snapshot of the given L{DocIndex} to the directory
+    C{dirname}.  The directory is created if it does not exist; any
+    shard files left in it by a previous snapshot are removed.
+    """
+    _SnapshotWriter(docindex, dirname).write()
+
+class _SnapshotWriter:
+    """
+    A helper class for L{write_snapshot()}.  Each C{APIDoc} is given
+    a number, and assigned to a shard, when it is I{claimed}: either
+    when it is found in the index (in which case it is assigned to
+    the shard for its top-level module), or when it is first
+    referenced while a shard (or the header) is being written (in
+    which case it is assigned to the shard being written).  C{APIDoc}s
+    that share an instance dictionary (because they have been merged)
+    are always assigned to the same shard.  Each shard's C{APIDoc}s
+    are written in the order they were claimed; since a shard never
+    claims C{APIDoc}s for another shard while it is being written,
+    shards can be written one at a time.
+    """
+    def __init__(self, docindex, dirname):
+        self.docindex = docindex
+        self.dirname = dirname
+
+        self.shard_names = []
+        """The name of each shard, indexed by shard number."""
+        self.shard_queues = []
+        """The C{APIDoc}s that have been claimed by each shard, in
+        the order they should be written."""
+        self._shard_nums = {}
+        """A dictionary mapping shard names to shard numbers."""
+
+        self.classes = []
+        """The C{APIDoc} classes used by the snapshot."""
+        self._class_nums = {}
+
+        self._docs = {}
+        """A dictionary mapping C{id(api_doc)} to C{(num, shard_num)}
+        for each claimed C{APIDoc}."""
+        self._dict_shards = {}
+        """A dictionary mapping C{id(api_doc.__dict__)} to the number
+        of the shard that holds that C{APIDoc}."""
+        self._claimed = []
+        """The claimed C{APIDoc}s (which keeps their ids valid)."""
+        self._states = {}
+        """A dictionary mapping C{id(api_doc.__dict__)} to the state
+        that is written for that C{APIDoc}."""
+
+        self._current_shard = None
+        """The number of the shard that is being written, or C{None}
+        while the header is being written."""
+
+    def write(self):
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+
+        # Assign each documented APIDoc to its module's shard.
+        for val_doc in self.docindex.reachable_valdocs():
+            self._claim(val_doc)
+            if (isinstance(val_doc, NamespaceDoc) and
+                val_doc.variables not in (None, UNKNOWN)):
+                for var_doc in val_doc.variables.values():
+                    self._claim(var_doc)
+
+        # Pickle the index's attributes, and the canonical names of
+        # its root values.  (This can claim unnamed APIDocs for the
+        # unnamed shard, so it is done before the shards are written.)
+        attribs = StringIO()
+        self._dump(attribs, [dict([(attr, getattr(self.docindex, attr))
+                                   for attr in _DOCINDEX_ATTRIBS]),
+                             [val_doc.canonical_name
+                              for val_doc in self.docindex.root]])
+
+        # Write the shards.
+        for shard_num, shard_name in enumerate(self.shard_names):
+            log.progress(float(shard_num)/len(self.shard_names), shard_name)
+            self._write_shard(shard_num)
+        self._remove_old_shards()
+
+        # Write the header.  The list of classes is only complete
+        # once all the shards have been written.
+        out = open(os.path.join(self.dirname, HEADER_FILENAME), 'wb')
+        try:
+            cPickle.dump((SNAPSHOT_VERSION, self.shard_names, self.classes,
+                          attribs.getvalue()),
+                         out, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            out.close()
+
+    def _write_shard(self, shard_num):
+        self._current_shard = shard_num
+        filename = os.path.join(self.dirname, SHARD_FILENAME % shard_num)
+        out = open(filename, 'wb')
+        try:
+            self._dump(out, self._shard_entries(shard_num))
+        finally:
+            out.close()
+
+    def _shard_entries(self, shard_num):
+        """
+        Generate an entry C{(num, class_num, state)} for each
+        C{APIDoc} in the given shard, including any that are claimed
+        while the shard is being written.
+        """
+        queue = self.shard_queues[shard_num]
+        i = 0
+        while i < len(queue):
+            api_doc = queue[i]
+            i += 1
+            num = self._docs[id(api_doc)][0]
+            yield (num, self._class_num(api_doc.__class__),
+                   self._state(api_doc))
+        # Free the memory used by the queue.
+        self.shard_queues[shard_num] = None
+
+    def _dump(self, out, entries):
+        """
+        Write each of the given entries to C{out} as a separate
+        pickle, followed by C{None}.  All the pickles share a single
+        memo, so objects (such as strings) that are shared by several
+        entries are only written once.
+        """
+        pickler = cPickle.Pickler(out, cPickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = self._persistent_id
+        for entry in entries:
+            pickler.dump(entry)
+        pickler.dump(None)
+
+    def _remove_old_shards(self):
+        for filename in os.listdir(self.dirname):
+            if (_SHARD_FILENAME_RE.match(filename) and
+                int(filename[6:-7]) >= len(self.shard_names)):
+                os.remove(os.path.join(self.dirname, filename))
+
+    def _persistent_id(self, obj):
+        if obj is UNKNOWN:
+            return 'UNKNOWN'
+        elif isinstance(obj, APIDoc):
+            info = self._docs.get(id(obj))
+            if info is None:
+                if self._current_shard is None:
+                    shard_num = self._shard_num(_UNNAMED_SHARD)
+                else:
+                    shard_num = self._current_shard
+                info = self._claim(obj, shard_num)
+            return (info[0], info[1], self._class_num(obj.__class__))
+        elif isinstance(obj, DottedName):
+            return ('.', obj._identifiers)
+        else:
+            return None
+
+    def _claim(self, api_doc, shard_num=None):
+        """
+        Claim C{api_doc} (and any C{APIDoc}s that it has been merged
+        with) for a shard, and return C{(num, shard_num)}.  If
+        C{api_doc} has already been claimed, then just return its
+        C{(num, shard_num)}.  If C{api_doc} has not been claimed, and
+        its shard can't be determined (because it has no canonical
+        name, and C{shard_num} is C{None}), then return C{None}.
+        """
+        info = self._docs.get(id(api_doc))
+        if info is not None: return info
+
+        if id(api_doc.__dict__) in self._dict_shards:
+            shard_num = self._dict_shards[id(api_doc.__dict__)]
+        elif shard_num is None:
+            name = api_doc.canonical_name
+            if (not isinstance(name, DottedName) or
+                name[0].startswith(DottedName.UNREACHABLE)):
+                return None
+            shard_num = self._shard_num(name[0])
+        self._dict_shards[id(api_doc.__dict__)] = shard_num
+
+        mergeset = api_doc.__dict__.get('_APIDoc__mergeset') or [api_doc]
+        for doc in [api_doc] + mergeset:
+            if id(doc) not in self._docs:
+                self._docs[id(doc)] = (len(self._claimed), shard_num)
+                self._claimed.append(doc)
+                self.shard_queues[shard_num].append(doc)
+        return self._docs[id(api_doc)]
+
+    def _shard_num(self, name):
+        shard_num = self._shard_nums.get(name)
+        if shard_num is None:
+            shard_num = self._shard_nums[name] = len(self.shard_names)
+            self.shard_names.append(name)
+            self.shard_queues.append([])
+        return shard_num
+
+    def _class_num(self, cls):
+        class_num = self._class_nums.get(cls)
+        if class_num is None:
+            class_num = self._class_nums[cls] = len(self.classes)
+            self.classes.append(cls)
+        return class_num
+
+    def _state(self, api_doc):
+        """
+        Return the state that should be written for C{api_doc}: a
+        copy of its instance dictionary, without its C{pyval} and
+        without any caches.  C{APIDoc}s that share an instance
+        dictionary get the same state object, so they will share it
+        again when they are read.
+        """
+        state = self._states.get(id(api_doc.__dict__))
+        if state is None:
+            api_doc._parse_deferred_docstring()
+            if isinstance(api_doc, ValueDoc):
+                # Cache the value's representation before dropping it.
+                api_doc.pyval_repr(), api_doc.summary_pyval_repr()
+            state = api_doc.__dict__.copy()
+            for attr in _UNSAVED_ATTRIBS:
+                state.pop(attr, None)
+            if 'pyval' in state:
+                state['pyval'] = UNKNOWN
+            self._states[id(api_doc.__dict__)] = state
+        return state
+
+######################################################################
+#{ Reading Snapshots
+######################################################################
+
+def read_snapshot(dirname):
+    """
+    Read the snapshot in the directory C{dirname}, and return its
+    L{DocIndex}.  Only the header is read; each shard is read when
+    one of its C{APIDoc}s is first used.
+
+    @raise ValueError: If C{dirname} does not contain a snapshot, or
+        if it was written with a different version of the format.
+    """
+    return _SnapshotReader(dirname).read()
+
+class _SnapshotReader:
+    """
+    A helper class for L{read_snapshot()}, which reads a snapshot's
+    shards on demand.  Each placeholder C{APIDoc} refers to the
+    reader that will load it.
+    """
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.docs = {}
+        """A dictionary mapping numbers to the C{APIDoc}s (loaded or
+        placeholders) that have been read so far."""
+        self.loaded = set()
+        """The numbers of the shards that have been read."""
+
+    def read(self):
+        filename = os.path.join(self.dirname, HEADER_FILENAME)
+        if not os.path.exists(filename):
+            raise ValueError('%s is not an epydoc snapshot' % self.dirname)
+        infile = open(filename, 'rb')
+        try:
+            header = cPickle.load(infile)
+        finally:
+            infile.close()
+        if header[0] != SNAPSHOT_VERSION:
+            raise ValueError('%s was written by an incompatible '
+                             'version of epydoc' % self.dirname)
+        version, self.shard_names, self.classes, attribs = header
+
+        attribs, root_names = self._load(StringIO(attribs))
+        docindex = DocIndex([])
+        for attr, val in attribs.items():
+            setattr(docindex, attr, val)
+
+        # Let the root placeholders report their names without being
+        # loaded, so that looking up a name only loads its own shard.
+        for val_doc, name in zip(docindex.root, root_names):
+            if isinstance(val_doc, _Placeholder):
+                object.__getattribute__(val_doc, '__dict__')[
+                    'canonical_name'] = name
+        return docindex
+
+    def _load(self, infile):
+        """
+        Read the entries that were written by L{_SnapshotWriter._dump}
+        from C{infile}, and return them as a list.
+        """
+        unpickler = cPickle.Unpickler(infile)
+        unpickler.persistent_load = self._persistent_load
+        entries = []
+        while True:
+            entry = unpickler.load()
+            if entry is None: return entries
+            entries.append(entry)
+
+    def _persistent_load(self, pid):
+        if pid == 'UNKNOWN':
+            return UNKNOWN
+        elif pid[0] == '.':
+            return DottedName.intern(pid[1])
+        num, shard_num, class_num = pid
+        api_doc = self.docs.get(num)
+        if api_doc is None:
+            api_doc = _placeholder(self.classes[class_num], self, shard_num)
+            self.docs[num] = api_doc
+        return api_doc
+
+    def load_shard(self, shard_num):
+        """
+        Read the given shard (if it has not been read yet), and fill
+        in the placeholders for its C{APIDoc}s.
+        """
+        if shard_num in self.loaded: return
+        self.loaded.add(shard_num)
+        log.debug('Loading snapshot shard for %s' %
+                  self.shard_names[shard_num])
+        filename = os.path.join(self.dirname, SHARD_FILENAME % shard_num)
+        infile = open(filename, 'rb')
+        try:
+            entries = self._load(infile)
+        finally:
+            infile.close()
+        for (num, class_num, state) in entries:
+            api_doc = self._persistent_load((num, shard_num, class_num))
+            object.__setattr__(api_doc, '__dict__', state)
+            object.__setattr__(api_doc, '__class__', self.classes[class_num])
+
+######################################################################
+#{ Placeholders
+######################################################################
+
+class _Placeholder(object):
+    """
+    A mix-in class for placeholder C{APIDoc}s.  For each C{APIDoc}
+    class C{cls}, L{_placeholder_class()} creates a subclass of
+    C{_Placeholder} and C{cls}; so C{isinstance()} works for
+    placeholders without reading their shard.  Reading or writing any
+    attribute reads the shard, which replaces the placeholder's class
+    with C{cls}.  (The C{__class__} attribute is the exception: it
+    returns C{cls}, without reading the shard.  So is C{canonical_name},
+    if the placeholder was given a name when it was created.)
+    """
+    def __getattribute__(self, attr):
+        if attr == '__class__':
+            return type(self).__bases__[1]
+        if attr == 'canonical_name':
+            state = object.__getattribute__(self, '__dict__')
+            if 'canonical_name' in state: return state['canonical_name']
+        _load_placeholder(self)
+        return object.__getattribute__(self, attr)
+
+    def __setattr__(self, attr, val):
+        _load_placeholder(self)
+        setattr(self, attr, val)
+
+    def __delattr__(self, attr):
+        _load_placeholder(self)
+        delattr(self, attr)
+
+_placeholder_classes = {}
+"""A dictionary mapping each C{APIDoc} class to its placeholder
+class."""
+
+def _placeholder_class(cls):
+    placeholder_class = _placeholder_classes.get(cls)
+    if placeholder_class is None:
+        placeholder_class = type('_Placeholder%s' % cls.__name__,
+                                 (_Placeholder, cls), {})
+        _placeholder_classes[cls] = placeholder_class
+    return placeholder_class
+
+def _placeholder(cls, reader, shard_num):
+    """
+    Return a new placeholder for an C{APIDoc} of class C{cls}, which
+    is in the given shard of the snapshot read by C{reader}.
+    """
+    api_doc = object.__new__(_placeholder_class(cls))
+    object.__setattr__(api_doc, '__dict__',
+                       {'_snapshot_shard': (reader, shard_num)})
+    return api_doc
+
+def _load_placeholder(api_doc):
+    reader, shard_num = object.__getattribute__(
+        api_doc, '__dict__')['_snapshot_shard']
+    reader.load_shard(shard_num)
+    if issubclass(type(api_doc), _Placeholder):
+        raise ValueError('Snapshot shard %s is missing an APIDoc' %
+                         reader.shard_names[shard_num])
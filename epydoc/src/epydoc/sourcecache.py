@@ -0,0 +1,256 @@
+# epydoc -- Source file cache
+#
+# Copyright (C) 2005 Edward Loper
+# Author: Edward Loper <edloper@loper.org>
+# URL: <http://epydoc.sf.net>
+#
+# $Id$
+
+"""
+A cache of python source files, shared by the modules that need to
+read them.  During a single run, the same source file is used by the
+parser (L{epydoc.docparser}), by the introspecter (to find docstring
+line numbers), and by the source code colorizer
+(L{epydoc.docwriter.html_colorize}).  L{get_source_file()} returns a
+L{SourceFile} that reads the file once, and decodes and tokenizes it
+at most once, no matter how many of these consumers use it.
+
+The cache's total (estimated) size is limited by L{SOURCE_CACHE_SIZE};
+when it grows larger than that, the least recently used files are
+dropped.  Entries are also dropped when their file is modified.
+"""
+__docformat__ = 'epytext en'
+
+import os, os.path, re, tokenize
+from epydoc.compat import *
+
+######################################################################
+#{ Configuration Constants
+######################################################################
+
+SOURCE_CACHE_SIZE = 64*1024*1024
+"""The approximate maximum amount of memory, in bytes, that should be
+used by the L{SourceFile}s in the source cache.  When the cache grows
+larger than this, the least recently used files are dropped (but
+consumers that are still using them can keep using them).  Set this
+to zero to disable the cache.
+@type: C{int}"""
+
+TOKEN_SIZE = 280
+"""The estimated amount of memory, in bytes, used by each token in a
+L{SourceFile}'s token list.  (A token is a 5-tuple, which contains two
+tuples and a string.)  This is used to estimate the size of the
+source cache."""
+
+######################################################################
+#{ Source Files
+######################################################################
+
+class SourceFile:
+    """
+    The contents of a python source file.  The file is read when the
+    C{SourceFile} is created; it is decoded and tokenized the first
+    time that its L{lines} and L{tokens} are requested.  C{SourceFile}s
+    are shared by all consumers, so the lists returned by L{lines()}
+    and L{tokens()} must not be modified.
+
+    @ivar filename: The absolute name of the source file.
+    @ivar stamp: The C{(mtime, size)} of the file when it was read.
+    @ivar source: The contents of the file, as an (undecoded) byte
+        string.
+    @ivar encoding: The file's encoding, as declared by its encoding
+        declaration (see U{PEP 263
+        <http://www.python.org/peps/pep-0263.html>}); or C{'utf-8'} if
+        it starts with a UTF-8 byte order mark; or C{'iso-8859-1'}
+        (python's default encoding) if neither is present.
+    """
+    def __init__(self, filename, stamp, source):
+        self.filename = filename
+        self.stamp = stamp
+        self.source = source
+        self.encoding = source_encoding(source)
+        self._lines = None
+        self._tokens = None
+        self._token_error = None
+        self._last_used = 0
+
+    def lines(self):
+        """
+        @return: The decoded lines of the file, each ending with a
+            newline (except possibly the last).  Lines are only split
+            at python's line endings; see L{split_source_lines()}.  A
+            unicode byte order mark at the start of the file is kept.
+        @rtype: C{list} of C{unicode}
+        @raise LookupError: If the file's encoding is unknown.
+        @raise UnicodeError: If the file can not be decoded with its
+            encoding.
+        """
+        if self._lines is None:
+            old_size = self.size()
+            self._lines = split_source_lines(self.source.decode(self.encoding))
+            _source_cache_grew(self, old_size)
+        return self._lines
+
+    def tokens(self):
+        """
+        @return: A list of the tokens in the file, as generated by
+            C{tokenize.generate_tokens()} from L{lines()}.  If the file
+            can't be tokenized, then this list contains the tokens that
+            were generated before the error.
+        @rtype: C{list} of C{tuple}
+        @raise LookupError: See L{lines()}.
+        @raise UnicodeError: See L{lines()}.
+        """
+        if self._tokens is None:
+            lines = self.lines()
+            old_size = self.size()
+            tokens = []
+            try:
+                tokens.extend(tokenize.generate_tokens(iter(lines).next))
+            except tokenize.TokenError, e:
+                self._token_error = e
+            self._tokens = tokens
+            _source_cache_grew(self, old_size)
+        return self._tokens
+
+    def is_tokenized(self):
+        """
+        @return: True if L{tokens()} has already tokenized the file.
+        """
+        return self._tokens is not None
+
+    def generate_tokens(self):
+        """
+        Generate the tokens in the file, in the same way as
+        C{tokenize.generate_tokens()}: if the file can't be tokenized,
+        then the tokens that come before the error are generated, and
+        then the C{tokenize.TokenError} is raised.
+        """
+        for tok in self.tokens():
+            yield tok
+        if self._token_error is not None:
+            raise self._token_error
+
+    def size(self):
+        """
+        @return: An estimate of the number of bytes used by this
+            C{SourceFile}.
+        """
+        size = len(self.source)
+        # Decoded lines use about five bytes per character.
+        if self._lines is not None:
+            size += 5*len(self.source)
+        if self._tokens is not None:
+            size += TOKEN_SIZE*len(self._tokens)
+        return size
+
+def source_encoding(source):
+    """
+    @return: The encoding of the python source code C{source}, as
+        determined by its first two lines.  See L{SourceFile.encoding}.
+    @param source: The contents of a python source file.
+    @type source: C{str}
+    """
+    if source.startswith('\xef\xbb\xbf'):
+        return 'utf-8'
+    lines = source.replace('\r\n', '\n').replace('\r', '\n').split('\n', 2)
+    for line in lines[:2]:
+        m = re.search("coding[:=]\s*([-\w.]+)", line)
+        if m: return m.group(1)
+    # Fall back on Python's default encoding.
+    return 'iso-8859-1' # aka 'latin-1'
+
+def split_source_lines(text):
+    r"""
+    Split the contents of a source file into a list of lines, each
+    ending with a newline character (except possibly the last).
+    Unlike C{text.splitlines()} (and the C{readline()} method of
+    C{codecs} stream readers), this only splits lines at C{'\n'},
+    C{'\r\n'}, and C{'\r'}, which are the line endings recognized
+    by python; so e.g. form feed characters don't start a new line.
+    """
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    if lines[-1]:
+        return [line+'\n' for line in lines[:-1]] + [lines[-1]]
+    else:
+        return [line+'\n' for line in lines[:-1]]
+
+######################################################################
+#{ Source Cache
+######################################################################
+
+_source_cache = {}
+"""A dictionary mapping absolute filenames to the L{SourceFile}s that
+have been read by L{get_source_file()}."""
+
+_source_cache_size = [0, 0]
+"""The estimated total size of the entries in L{_source_cache}, and
+the number of calls to L{get_source_file()} so far (used to find the
+least recently used entries)."""
+
+def get_source_file(filename):
+    """
+    Return a L{SourceFile} for the given python source file.  If the
+    file has already been read, and it has not been modified since,
+    then the same C{SourceFile} is returned.
+
+    @raise IOError: If the file can not be read.
+    """
+    filename = os.path.abspath(filename)
+    try:
+        st = os.stat(filename)
+    except OSError, e:
+        raise IOError(e.errno, e.strerror, filename)
+    stamp = (st.st_mtime, st.st_size)
+    _source_cache_size[1] += 1
+
+    source_file = _source_cache.get(filename)
+    if source_file is not None:
+        if source_file.stamp == stamp:
+            source_file._last_used = _source_cache_size[1]
+            return source_file
+        _discard_source_file(source_file)
+
+    f = open(filename, 'rb')
+    try: source = f.read()
+    finally: f.close()
+    source_file = SourceFile(filename, stamp, source)
+    source_file._last_used = _source_cache_size[1]
+    if SOURCE_CACHE_SIZE > 0:
+        _source_cache[filename] = source_file
+        _source_cache_size[0] += source_file.size()
+        _trim_source_cache()
+    return source_file
+
+def clear_source_cache():
+    """
+    Discard all of the L{SourceFile}s in the source cache.
+    """
+    _source_cache.clear()
+    _source_cache_size[0] = 0
+
+def _source_cache_grew(source_file, old_size):
+    """
+    Update the size of the source cache after C{source_file} was
+    decoded or tokenized (when its size was C{old_size}), and drop old
+    entries if the cache is now too big.
+    """
+    if _source_cache.get(source_file.filename) is source_file:
+        _source_cache_size[0] += source_file.size() - old_size
+        _trim_source_cache()
+
+def _discard_source_file(source_file):
+    del _source_cache[source_file.filename]
+    _source_cache_size[0] -= source_file.size()
+
+def _trim_source_cache():
+    """
+    If the source cache is larger than L{SOURCE_CACHE_SIZE}, then
+    drop the least recently used entries until it is no larger than
+    three quarters of that size.
+    """
+    if _source_cache_size[0] <= SOURCE_CACHE_SIZE: return
+    entries = sorted(_source_cache.values(), key=lambda f: f._last_used)
+    for source_file in entries:
+        if _source_cache_size[0] <= SOURCE_CACHE_SIZE*3/4: break
+        _discard_source_file(source_file)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""A benchmark for L{epydoc.apidoc.APIDoc.compact}.
+
+Builds a L{DocIndex} for the given items twice, each time in a new
+process: once without compacting it, and once with
+C{build_doc_index(..., compact=True)}.  For each build, reports:
+  - the peak memory use (RSS) of the process, as reported by
+    C{resource.getrusage()}; and
+  - how much memory the index's C{APIDoc} objects and their instance
+    dictionaries use, not counting the attribute values.  Merged
+    C{APIDoc}s share a single dictionary, which is counted once.
+
+Compaction runs once the index has been built, so it only shrinks
+the finished index; the peak RSS of the build is not expected to
+change.
+
+Usage::
+
+    bench_memory.py [ITEM...]
+
+If no items are given, then the C{epydoc} package is documented.
+"""
+
+# $Id$
+
+import sys, time, resource, subprocess
+from epydoc.apidoc import *
+from epydoc.docbuilder import build_doc_index
+from epydoc import log
+
+def find_apidocs(docindex):
+    """Return a list of the C{ValueDoc}s that are reachable from
+    C{docindex}, and the C{VariableDoc}s that they contain."""
+    api_docs = []
+    for val_doc in docindex.reachable_valdocs():
+        api_docs.append(val_doc)
+        if (isinstance(val_doc, NamespaceDoc) and
+            val_doc.variables not in (None, UNKNOWN)):
+            api_docs.extend(val_doc.variables.values())
+    return api_docs
+
+def apidoc_memory(api_docs):
+    """Return C{(num_dicts, num_attribs, num_bytes)} for the given
+    C{APIDoc}s."""
+    dicts = {}
+    num_bytes = 0
+    for api_doc in api_docs:
+        num_bytes += sys.getsizeof(api_doc)
+        dicts[id(api_doc.__dict__)] = api_doc.__dict__
+    for d in dicts.values():
+        num_bytes += sys.getsizeof(d)
+    num_attribs = sum([len(d) for d in dicts.values()])
+    return len(dicts), num_attribs, num_bytes
+
+def build(items, compact):
+    """Build the index, and print C{(max_rss, num_dicts, num_attribs,
+    num_bytes, seconds)}, where C{max_rss} is in kilobytes."""
+    log.register_logger(log.SimpleLogger(log.ERROR))
+    start = time.time()
+    docindex = build_doc_index(items, compact=compact)
+    elapsed = time.time()-start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print max_rss, ' '.join(map(str, apidoc_memory(find_apidocs(docindex)))),
+    print elapsed
+
+def run(label, items, compact):
+    """Build the index in a new process, so it starts with a fresh peak
+    RSS, and report the results."""
+    args = [sys.executable, __file__, '--build=%d' % compact] + items
+    out = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+    max_rss, num_dicts, num_attribs, num_bytes, elapsed = out.split()[-5:]
+    num_dicts, num_bytes = int(num_dicts), int(num_bytes)
+    print ('%-10s peak RSS %8d KB  %7d dicts %8s attribs %10d bytes '
+           '(%.0f bytes/dict)  %.1f sec' % (
+        label, int(max_rss), num_dicts, num_attribs, num_bytes,
+        float(num_bytes)/max(num_dicts, 1), float(elapsed)))
+    return int(max_rss), num_bytes
+
+def main(items=['epydoc']):
+    rss_before, before = run('current', items, False)
+    rss_after, after = run('compact', items, True)
+    print 'APIDocs: saved %d bytes (%.1f%%)' % (
+        before-after, 100.0*(before-after)/before)
+    print 'Peak RSS: saved %d KB (%.1f%%)' % (
+        rss_before-rss_after, 100.0*(rss_before-rss_after)/rss_before)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] in (['--build=0'], ['--build=1']):
+        build(sys.argv[2:] or ['epydoc'], sys.argv[1] == '--build=1')
+    else:
+        main(sys.argv[1:] or ['epydoc'])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""A benchmark for L{epydoc.docbuilder.merge_docs}.
+
+Builds the introspected and parsed C{APIDoc} graphs for a synthetic
+package containing a large number of classes, and times how long it
+takes to merge them.  A second run merges a chain of deeply nested
+classes, which checks that merging does not depend on the depth of
+the documented code.
+
+Usage::
+
+    bench_merge.py [NUM_CLASSES [NESTING_DEPTH]]
+"""
+
+# $Id$
+
+import sys, time
+from epydoc.apidoc import *
+from epydoc.docbuilder import merge_docs
+from epydoc import log
+
+def build_module(source, num_classes, methods_per_class=3):
+    """Return a C{ModuleDoc} for a module named C{synth} that defines
+    C{num_classes} classes, each with C{methods_per_class} methods.
+    C{source} is used for the C{docs_extracted_by} attribute."""
+    mod_name = DottedName('synth')
+    mod_doc = ModuleDoc(canonical_name=mod_name, variables={},
+                        docs_extracted_by=source)
+    for i in range(num_classes):
+        class_name = DottedName(mod_name, 'C%d' % i)
+        class_doc = ClassDoc(canonical_name=class_name, variables={},
+                             bases=[], docs_extracted_by=source)
+        for j in range(methods_per_class):
+            func_doc = RoutineDoc(canonical_name=DottedName(class_name,
+                                                            'm%d' % j),
+                                  posargs=['self', 'x'],
+                                  posarg_defaults=[None, None],
+                                  docs_extracted_by=source)
+            class_doc.variables['m%d' % j] = VariableDoc(
+                name='m%d' % j, value=func_doc, container=class_doc,
+                docs_extracted_by=source)
+        mod_doc.variables['C%d' % i] = VariableDoc(
+            name='C%d' % i, value=class_doc, container=mod_doc,
+            docs_extracted_by=source)
+    return mod_doc
+
+def build_nested(source, depth):
+    """Return a C{ModuleDoc} containing a chain of C{depth} classes,
+    each one defined inside the previous one."""
+    name = DottedName('nested')
+    mod_doc = outer = ModuleDoc(canonical_name=name, variables={},
+                                docs_extracted_by=source)
+    for i in range(depth):
+        name = DottedName(name, 'N')
+        class_doc = ClassDoc(canonical_name=name, variables={}, bases=[],
+                             docs_extracted_by=source)
+        outer.variables['N'] = VariableDoc(name='N', value=class_doc,
+                                           container=outer,
+                                           docs_extracted_by=source)
+        outer = class_doc
+    return mod_doc
+
+def timed_merge(introspect_doc, parse_doc):
+    start = time.time()
+    try:
+        merge_docs(introspect_doc, parse_doc)
+    except RuntimeError, e:
+        return 'failed (%s)' % e
+    return '%.2f sec' % (time.time()-start)
+
+def main(num_classes=100000, depth=5000):
+    log.register_logger(log.SimpleLogger(log.WARNING))
+    print 'Merging %d classes:' % num_classes,
+    sys.stdout.flush()
+    print timed_merge(build_module('introspecter', num_classes),
+                      build_module('parser', num_classes))
+    print 'Merging %d nested classes:' % depth,
+    sys.stdout.flush()
+    print timed_merge(build_nested('introspecter', depth),
+                      build_nested('parser', depth))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""A benchmark for the L{epydoc.docparser} backends.
+
+Times how long it takes to parse epydoc's own source code, and a
+large synthetic module, with each of the parser backends (see
+L{epydoc.docparser.PARSER_BACKEND}); and checks that both backends
+produce the same documentation.
+
+Usage::
+
+    bench_parse.py [NUM_CLASSES]
+"""
+
+# $Id$
+
+import sys, os, os.path, time, tempfile, shutil
+import epydoc
+from epydoc import docparser
+from epydoc import log
+
+BACKENDS = ('tokenize', 'ast')
+
+def write_module(filename, num_classes, methods_per_class=5):
+    """Write a module that defines C{num_classes} classes, each with
+    C{methods_per_class} methods, to C{filename}."""
+    out = open(filename, 'w')
+    out.write('"""A synthetic module."""\n\n')
+    for i in range(num_classes):
+        out.write('#: The size of L{C%d}.\nSIZE%d = %d\n\n' % (i, i, i))
+        out.write('class C%d(object):\n' % i)
+        out.write('    """Class number %d.\n\n    @ivar x: An x.\n    """\n' % i)
+        out.write('    limit = SIZE%d * 2\n\n' % i)
+        for j in range(methods_per_class):
+            out.write('    def m%d(self, a, b=(1, 2), *args, **kw):\n' % j)
+            out.write('        """Method %d.  @param a: An a."""\n' % j)
+            out.write('        total = 0\n')
+            out.write('        for item in args:\n')
+            out.write('            if item > a:\n')
+            out.write('                total += item * b[0]\n')
+            out.write('            else:\n')
+            out.write('                total -= kw.get(str(item), 0)\n')
+            out.write('        self.result = [x for x in range(total) '
+                      'if x % 3]\n')
+            out.write('        return "%s: %d" % (self, total)\n\n')
+    out.close()
+
+def source_files(package_dir):
+    """Return the python source files in a package directory."""
+    filenames = []
+    for dirpath, dirnames, names in os.walk(package_dir):
+        filenames += [os.path.join(dirpath, name) for name in sorted(names)
+                      if name.endswith('.py')]
+    return filenames
+
+def parse(filenames, backend):
+    """Parse the given files with the given backend.  Return the
+    elapsed time, and a pretty-printed copy of each C{ModuleDoc}."""
+    docparser.PARSER_BACKEND = backend
+    docparser.clear_cache()
+    start = time.time()
+    module_docs = [docparser.parse_docs(filename) for filename in filenames]
+    elapsed = time.time() - start
+    return elapsed, [module_doc.pp(exclude=['submodules', 'subclasses'])
+                     for module_doc in module_docs]
+
+def compare(name, filenames):
+    print '%s (%d files):' % (name, len(filenames))
+    times = {}
+    outputs = {}
+    for backend in BACKENDS:
+        times[backend], outputs[backend] = parse(filenames, backend)
+        print '  %-10s %6.2f sec' % (backend, times[backend])
+    print '  speedup    %6.1fx' % (times['tokenize'] / times['ast'])
+    if outputs['tokenize'] != outputs['ast']:
+        print '  WARNING: the backends produced different output!'
+
+def main(num_classes=2000):
+    log.register_logger(log.SimpleLogger(log.ERROR))
+    # Warm up: parse_docs() introspects the builtins the first time
+    # it is called; don't count that against either backend.
+    parse([os.path.join(os.path.dirname(epydoc.__file__), '__init__.py')],
+          'tokenize')
+    compare('epydoc', source_files(os.path.dirname(epydoc.__file__)))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, 'synth.py')
+        write_module(filename, num_classes)
+        compare('synthetic module with %d classes' % num_classes,
+                [filename])
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
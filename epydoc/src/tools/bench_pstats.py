@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""A benchmark for reading profiling information (C{--pstat}).
+
+Profiles epydoc while it documents the C{epydoc.markup.epytext}
+module, and writes a number of pstat files that contain that profile
+plus C{NUM_FUNCS} synthetic functions (to make them as large as the
+profiles of a big program).  Then times how long it takes to combine
+them with L{epydoc.cli.read_pstat_files()}, using one process and
+using C{JOBS} worker processes; and times
+L{DocIndex.read_profiling_info()}, and reports the size of the
+resulting call graph.
+
+Usage::
+
+    bench_pstats.py [NUM_FILES [JOBS [NUM_FUNCS]]]
+"""
+
+# $Id$
+
+import sys, os, time, tempfile, shutil, cProfile, pstats, marshal, random
+from epydoc.apidoc import *
+from epydoc.docbuilder import build_doc_index
+from epydoc.cli import read_pstat_files
+from epydoc import log
+
+def write_pstat_files(tmp_dir, num_files, num_funcs):
+    """Write C{num_files} pstat files to C{tmp_dir}, and return their
+    names, along with the L{DocIndex} for the profiled module."""
+    profiler = cProfile.Profile()
+    docindex = profiler.runcall(build_doc_index, ['epydoc.markup.epytext'])
+    profiler.create_stats()
+    filenames = []
+    for i in range(num_files):
+        stats = dict(profiler.stats)
+        funcids = [('synth%d.py' % (n%100), n, 'f%d' % n)
+                   for n in range(num_funcs)]
+        for funcid in funcids:
+            callers = dict([(caller, (1, 1, 0.001, 0.001)) for caller
+                            in random.sample(funcids, 5)])
+            stats[funcid] = (5, 5, 0.005, 0.005, callers)
+        filename = os.path.join(tmp_dir, 'profile-%d.out' % i)
+        out = open(filename, 'wb')
+        marshal.dump(stats, out)
+        out.close()
+        filenames.append(filename)
+    return filenames, docindex
+
+def main(num_files=12, jobs=4, num_funcs=20000):
+    log.register_logger(log.SimpleLogger(log.ERROR))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filenames, docindex = write_pstat_files(tmp_dir, num_files,
+                                                num_funcs)
+        for n in (1, jobs):
+            start = time.time()
+            profile_stats = read_pstat_files(filenames, n)
+            print 'Read %d pstat files with %d job(s): %.2f sec' % (
+                num_files, n, time.time()-start)
+        start = time.time()
+        docindex.read_profiling_info(profile_stats)
+        print 'Read profiling info: %.2f sec' % (time.time()-start)
+        print '%d routines with callees, %d calls' % (
+            len(docindex.callees), len(docindex.callees.edges()))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
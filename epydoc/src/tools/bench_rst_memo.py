@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""A benchmark for splitting reStructuredText docstrings with and
+without the parse memo (see L{epydoc.markup.PARSE_MEMO_SIZE}).
+
+Parses C{NUM_DOCSTRINGS} distinct reStructuredText docstrings (each
+with a few fields) C{REPEAT} times, and splits each result into its
+body and fields, as the docstring parser does:
+  - with the memo disabled, so every docstring is parsed and split in
+    place;
+  - with the memo disabled, but copying each document before it is
+    split (as C{split_fields()} used to do for every docstring);
+  - with the memo enabled, so repeated docstrings are only parsed
+    once, and the shared documents that have fields are copied before
+    they are split.
+
+Usage::
+
+    bench_rst_memo.py [NUM_DOCSTRINGS [REPEAT]]
+"""
+
+# $Id$
+
+import sys, time
+from epydoc import markup
+from epydoc.markup import restructuredtext
+
+DOCSTRING = '''\
+Function number %d.
+
+This function does something *useful* with `x` and `y`.
+
+:param x: The first argument.
+:param y: The second argument.
+:return: The result.
+'''
+
+def run(docstrings, memo_size, always_copy=False):
+    """Parse and split each docstring, and return the time taken."""
+    markup.PARSE_MEMO_SIZE = memo_size
+    markup._parse_memo.clear()
+    markup._parse_memo_keys.clear()
+    start = time.time()
+    for docstring in docstrings:
+        parsed_docstring = markup.parse(docstring, 'restructuredtext', [])
+        if always_copy:
+            parsed_docstring.is_shared = True
+        parsed_docstring.split_fields([])
+    return time.time() - start
+
+def main(num_docstrings=300, repeat=3):
+    docstrings = [DOCSTRING % i for i in range(num_docstrings)] * repeat
+    memo_size = markup.PARSE_MEMO_SIZE
+    try:
+        print 'Memo disabled:              %.2f sec' % run(docstrings, 0)
+        print 'Memo disabled, always copy: %.2f sec' % run(docstrings, 0,
+                                                           True)
+        print 'Memo enabled:               %.2f sec' % run(docstrings,
+                                                           memo_size)
+    finally:
+        markup.PARSE_MEMO_SIZE = memo_size
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])